@@ -1,26 +1,29 @@
 # astar.py
 import pandas as pd
-import joblib
 import heapq
 import sys
 import os
 
+from compiled_forest import load_model
+
 # --------------------------
 # Config
 # --------------------------
 DATA_FILE = "data/sample.csv"
 WEIGHT_MODEL_FILE = "model/weight.joblib"
+WEIGHT_FOREST_FILE = "model/weight_forest.npz"
+WEIGHT_BUNDLE_DIR = "model/weight_bundle"
 
 if not os.path.exists(DATA_FILE):
     raise FileNotFoundError(f"{DATA_FILE} not found. Generate it first using generate_sample_data.py")
 
-if not os.path.exists(WEIGHT_MODEL_FILE):
+if not os.path.exists(WEIGHT_MODEL_FILE) and not os.path.exists(WEIGHT_BUNDLE_DIR):
     raise FileNotFoundError(f"{WEIGHT_MODEL_FILE} not found. Train the weight model first using trainer_real.py")
 
 # --------------------------
 # Load model & data
 # --------------------------
-weight_model = joblib.load(WEIGHT_MODEL_FILE)
+weight_model = load_model(WEIGHT_MODEL_FILE, WEIGHT_FOREST_FILE, WEIGHT_BUNDLE_DIR)
 df = pd.read_csv(DATA_FILE)
 
 # --------------------------
@@ -0,0 +1,564 @@
+"""
+compiled_forest.py
+
+Array-based inference for the trained sklearn pipelines (ColumnTransformer of
+StandardScaler + OneHotEncoder, followed by a RandomForestRegressor).
+
+compile_pipeline() flattens a fitted pipeline into plain NumPy arrays:
+
+  preprocessing  per numeric column mean / scale, per categorical column its
+                 category list and the offset of its one-hot block
+  forest         all trees concatenated: feature, threshold, left, right and
+                 leaf value per node, plus the root offset of every tree
+
+and save_compiled() writes them to one .npz (metadata as a JSON string, so
+loading needs no pickle).
+
+save_bundle() writes the same arrays as a model bundle: a directory with one
+.npy file per array and a manifest.json holding the metadata, the bundle format,
+a schema hash (input columns, categories and feature layout) and a content
+version. The bundle path is a symlink to a directory named after that version
+(model/weight_bundle -> weight_bundle.<version>-<schema>), so publishing a new bundle is
+one atomic symlink replace and readers never see the path missing; the previous
+version is kept for readers still loading it. load_bundle() memory-maps the
+arrays read-only, so worker processes loading the same bundle share one copy of
+the forest in the page cache instead of each unpickling a private one.
+
+The schema hash is checked on load, against the bundle's own metadata and
+against the hash the training manifest (model/manifest.json) recorded for that
+model, so a model whose inputs differ from what it was trained and published
+with is refused instead of silently mis-predicting.
+
+CompiledForest evaluates every tree for a batch of
+rows at once, one vectorized step per tree level, and reproduces
+Pipeline.predict to float tolerance. Loading and predicting import neither
+sklearn nor joblib, so the routing/API process stays light.
+
+Usage:
+  python compiled_forest.py [model/weight.joblib] [model/weight_forest.npz]   # compile + check
+  python compiled_forest.py model/weight.joblib --bundle model/weight_bundle     # also write a bundle
+  python compiled_forest.py --bench-load [model/weight.joblib] [model/weight_bundle]
+  model = load_model()   # bundle / compiled forest if up to date, else the joblib pipeline
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import multiprocessing
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+MODEL_FILE = "model/weight.joblib"
+COMPILED_FILE = "model/weight_forest.npz"
+BUNDLE_DIR = "model/weight_bundle"
+TRAINING_MANIFEST = "model/manifest.json"   # written by training.py; holds each model's schema_hash
+BUNDLE_FORMAT = 1
+KEEP_BUNDLE_VERSIONS = 2   # the live version and the one before it (readers may still be loading it)
+BUNDLE_ARRAYS = ("mean", "scale", "feature", "threshold", "children", "is_leaf", "value", "roots")
+BENCH_WORKERS = 4
+CHUNK_PAIRS = 1 << 20   # (row, tree) pairs walked per pass (bounds the working arrays)
+CHECK_ROWS = 5000
+# -----------------------------
+
+
+def _pipeline_parts(pipeline):
+    """(ColumnTransformer, forest) of a fitted Pipeline, whatever its step names."""
+    steps = getattr(pipeline, "steps", None)
+    if not steps or len(steps) != 2:
+        raise ValueError("expected a 2-step Pipeline (preprocessing, forest)")
+    return steps[0][1], steps[1][1]
+
+
+def compile_preprocessor(ct) -> Dict:
+    if getattr(ct, "remainder", "drop") != "drop":
+        raise ValueError("only remainder='drop' is supported")
+    num_cols, mean, scale = [], [], []
+    cat_cols, categories = [], []
+    for name, trans, cols in ct.transformers_:
+        if name == "remainder" or trans == "drop":
+            continue
+        kind = type(trans).__name__
+        if kind == "StandardScaler":
+            n = len(cols)
+            num_cols.extend(cols)
+            mean.extend(trans.mean_ if trans.with_mean else np.zeros(n))
+            scale.extend(trans.scale_ if trans.with_std and trans.scale_ is not None else np.ones(n))
+        elif kind == "OneHotEncoder":
+            if trans.drop is not None or trans.handle_unknown != "ignore":
+                raise ValueError("only OneHotEncoder(drop=None, handle_unknown='ignore') is supported")
+            cat_cols.extend(cols)
+            categories.extend([c.tolist() for c in trans.categories_])
+        else:
+            raise ValueError(f"unsupported transformer: {kind}")
+        if cat_cols and kind == "StandardScaler":
+            raise ValueError("numeric columns must come before categorical ones")
+    return {"num_cols": list(num_cols), "mean": np.asarray(mean, dtype=np.float64),
+            "scale": np.asarray(scale, dtype=np.float64),
+            "cat_cols": list(cat_cols), "categories": categories}
+
+
+def compile_forest(forest) -> Dict:
+    trees = getattr(forest, "estimators_", None)
+    if trees is None:
+        trees = [forest]  # a single DecisionTreeRegressor
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset, depth = 0, 0
+    for est in trees:
+        t = est.tree_
+        if t.n_outputs != 1:
+            raise ValueError("only single-output trees are supported")
+        leaf = t.children_left == -1
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, t.feature).astype(np.int32))
+        threshold.append(t.threshold.astype(np.float64))
+        # leaves point at themselves, so extra iterations are no-ops
+        own = np.arange(t.node_count, dtype=np.int32) + offset
+        left.append(np.where(leaf, own, t.children_left + offset).astype(np.int32))
+        right.append(np.where(leaf, own, t.children_right + offset).astype(np.int32))
+        value.append(t.value[:, 0, 0].astype(np.float64))
+        offset += t.node_count
+        depth = max(depth, t.max_depth)
+    return {"feature": np.concatenate(feature), "threshold": np.concatenate(threshold),
+            "left": np.concatenate(left), "right": np.concatenate(right),
+            "value": np.concatenate(value), "roots": np.asarray(roots, dtype=np.int32),
+            "max_depth": depth}
+
+
+def compile_pipeline(pipeline) -> Dict:
+    ct, forest = _pipeline_parts(pipeline)
+    compiled = compile_preprocessor(ct)
+    compiled.update(compile_forest(forest))
+    compiled["feature_names_in"] = [str(c) for c in getattr(pipeline, "feature_names_in_", [])]
+    return compiled
+
+
+def save_compiled(compiled: Dict, path: str = COMPILED_FILE):
+    meta = {k: compiled[k] for k in ("num_cols", "cat_cols", "categories", "max_depth", "feature_names_in")}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(path, meta=np.array(json.dumps(meta, default=lambda v: v.item() if hasattr(v, "item") else str(v))),
+             **{k: compiled[k] for k in ("mean", "scale", "feature", "threshold", "left", "right", "value", "roots")})
+
+
+def schema_hash(meta: Dict) -> str:
+    """Hash of what the model expects as input: columns, category lists and their encoding order."""
+    schema = {"format": BUNDLE_FORMAT, "feature_names_in": list(meta.get("feature_names_in") or []),
+              "num_cols": list(meta["num_cols"]), "cat_cols": list(meta["cat_cols"]),
+              "categories": [[str(c) for c in cats] for cats in meta["categories"]]}
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def content_version(arrays: Dict[str, np.ndarray]) -> str:
+    """Short digest of the bundle arrays; equal for the same fitted model however it was loaded."""
+    digest = hashlib.sha256()
+    for name in BUNDLE_ARRAYS:
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def save_bundle(compiled: Dict, path: str = BUNDLE_DIR) -> Dict:
+    """Publish a bundle: a new versioned directory, swapped in behind the path symlink; returns its manifest."""
+    arrays = {
+        "mean": np.asarray(compiled["mean"], dtype=np.float64),
+        "scale": np.asarray(compiled["scale"], dtype=np.float64),
+        "feature": np.asarray(compiled["feature"], dtype=np.int32),
+        "threshold": np.asarray(compiled["threshold"], dtype=np.float64),
+        "children": np.stack([compiled["left"], compiled["right"]], axis=1).ravel().astype(np.int32),
+        "is_leaf": np.asarray(compiled["left"]) == np.arange(len(compiled["left"])),
+        "value": np.asarray(compiled["value"], dtype=np.float64),
+        "roots": np.asarray(compiled["roots"], dtype=np.int32),
+    }
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": content_version(arrays),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "num_cols": list(compiled["num_cols"]), "cat_cols": list(compiled["cat_cols"]),
+        "categories": compiled["categories"], "feature_names_in": list(compiled.get("feature_names_in") or []),
+        "max_depth": int(compiled["max_depth"]),
+        "arrays": {name: {"dtype": str(a.dtype), "shape": list(a.shape)} for name, a in arrays.items()},
+    }
+    manifest["schema_hash"] = schema_hash(manifest)
+
+    path = path.rstrip("/\\")
+    # the arrays alone do not tell two schemas apart (same forest, other category names)
+    target = f"{path}.{manifest['version']}-{manifest['schema_hash'][:8]}"
+    if not os.path.isdir(target):
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), arr)
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+        try:
+            os.rename(tmp, target)
+        except OSError:  # another process published the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+    publish_versioned(path, target)
+    return manifest
+
+
+def publish_versioned(path: str, target: str, keep: int = KEEP_BUNDLE_VERSIONS):
+    """
+    Point the symlink `path` at the directory `target` (a sibling named
+    "<path>.<version>") with one atomic replace, then remove all but the `keep`
+    newest version directories. Readers never see `path` missing or half-written.
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        # a directory written before versioning: move it aside once
+        try:
+            os.rename(path, f"{path}.legacy-{os.getpid()}")
+        except FileNotFoundError:  # another process just did
+            pass
+    link = f"{path}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(target), link)
+    os.replace(link, path)
+
+    parent = os.path.dirname(path) or "."
+    prefix = os.path.basename(path) + "."
+    in_progress = re.compile(re.escape(prefix) + r"(tmp|link)-\d+$")
+    versions = sorted((os.path.join(parent, name) for name in os.listdir(parent)
+                       if name.startswith(prefix) and not in_progress.match(name)
+                       and os.path.isdir(os.path.join(parent, name))
+                       and not os.path.islink(os.path.join(parent, name))),
+                      key=os.path.getmtime, reverse=True)
+    kept = {os.path.abspath(target)}
+    for old in versions:
+        if len(kept) < keep or os.path.abspath(old) in kept:
+            kept.add(os.path.abspath(old))
+        else:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+class CompiledForest:
+    def __init__(self, arrays: Dict):
+        self.num_cols: List[str] = arrays["num_cols"]
+        self.cat_cols: List[str] = arrays["cat_cols"]
+        self.categories: List[list] = arrays["categories"]
+        self.feature_names_in_ = np.asarray(arrays.get("feature_names_in") or self.num_cols + self.cat_cols,
+                                            dtype=object)
+        self.mean = arrays["mean"]
+        self.scale = arrays["scale"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self._version: Optional[str] = arrays.get("version")
+        self._split_points = None
+        self.schema_hash: str = arrays.get("schema_hash") or schema_hash(arrays)
+        if "children" in arrays:
+            # bundles store these precomputed, so a memory-mapped load allocates nothing per node
+            self.children = arrays["children"]
+            self.is_leaf = arrays["is_leaf"]
+        else:
+            # (left, right) interleaved, so one gather picks the child: children[2 * node + go_right]
+            self.children = np.stack([arrays["left"], arrays["right"]], axis=1).ravel()
+            self.is_leaf = arrays["left"] == np.arange(len(arrays["left"]))
+        self.left = self.children[0::2]
+        self.right = self.children[1::2]
+        self.cat_offsets = np.cumsum([len(self.num_cols)] + [len(c) for c in self.categories])[:-1]
+        self.n_features = len(self.num_cols) + sum(len(c) for c in self.categories)
+
+    @classmethod
+    def load(cls, path: str = COMPILED_FILE) -> "CompiledForest":
+        with np.load(path, allow_pickle=False) as z:
+            arrays = json.loads(str(z["meta"]))
+            for k in ("mean", "scale", "feature", "threshold", "left", "right", "value", "roots"):
+                arrays[k] = z[k]
+        return cls(arrays)
+
+    @classmethod
+    def load_bundle(cls, path: str = BUNDLE_DIR, mmap: bool = True,
+                    expected_schema: Optional[str] = None) -> "CompiledForest":
+        """Arrays memory-mapped read-only (mmap=True) or read into memory; ValueError on a bad bundle."""
+        path = os.path.realpath(path)  # one version throughout, even if a new one is published meanwhile
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{path}: bundle format {manifest.get('format')}, expected {BUNDLE_FORMAT}")
+        if schema_hash(manifest) != manifest.get("schema_hash"):
+            raise ValueError(f"{path}: schema hash does not match the bundle metadata")
+        if expected_schema is not None and manifest["schema_hash"] != expected_schema:
+            raise ValueError(f"{path}: schema {manifest['schema_hash'][:12]}, expected {expected_schema[:12]}")
+        arrays = dict(manifest)
+        for name in BUNDLE_ARRAYS:
+            arr = np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+            spec = manifest["arrays"][name]
+            if str(arr.dtype) != spec["dtype"] or list(arr.shape) != spec["shape"]:
+                raise ValueError(f"{path}: {name}.npy is {arr.dtype}{arr.shape}, manifest says "
+                                 f"{spec['dtype']}{tuple(spec['shape'])}")
+            arrays[name] = arr
+        return cls(arrays)
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            self._version = content_version({name: getattr(self, name) for name in BUNDLE_ARRAYS})
+        return self._version
+
+    def split_points(self):
+        """(encoded columns the forest splits on, sorted unique thresholds per such column)."""
+        if self._split_points is None:
+            internal = ~np.asarray(self.is_leaf)
+            feats = np.asarray(self.feature)[internal]
+            thresholds = np.asarray(self.threshold)[internal]
+            order = np.lexsort((thresholds, feats))
+            feats, thresholds = feats[order], thresholds[order]
+            cols, starts = np.unique(feats, return_index=True)
+            groups = np.split(thresholds, starts[1:])
+            # already sorted: drop repeats without another sort
+            self._split_points = (cols, [g[np.r_[True, g[1:] != g[:-1]]] for g in groups])
+        return self._split_points
+
+    def row_keys(self, X: np.ndarray) -> np.ndarray:
+        """
+        Per row, the interval between consecutive split thresholds each split column
+        falls into (int32, one column per split column). Rows with equal keys take
+        the same path through every tree, so they get exactly the same prediction.
+        """
+        cols, thresholds = self.split_points()
+        keys = np.empty((len(X), len(cols)), dtype=np.int32)
+        for k, (col, thr) in enumerate(zip(cols, thresholds)):
+            # a row goes left at threshold t iff x <= t, i.e. iff t is not among those < x
+            keys[:, k] = np.searchsorted(thr, X[:, col].astype(np.float64), side="left")
+        return keys
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledForest":
+        return cls(compile_pipeline(pipeline))
+
+    def transform(self, df: pd.DataFrame, cache: Optional[Dict] = None,
+                  extra: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """
+        Same matrix as the ColumnTransformer, dense, as float32 (what sklearn trees compare on).
+        `extra` supplies columns missing from df; `cache` (a dict shared between forests
+        within one batch) keeps scaled columns and category codes that another forest
+        with the same preprocessing already computed.
+        """
+        n = len(df)
+        cache = {} if cache is None else cache
+        extra = extra or {}
+        X = np.empty((n, self.n_features), dtype=np.float32)
+        for j, (col, mu, sd) in enumerate(zip(self.num_cols, self.mean, self.scale)):
+            if col in extra:
+                X[:, j] = (np.asarray(extra[col], dtype=np.float64) - mu) / sd
+                continue
+            key = ("num", col, float(mu), float(sd))
+            if key not in cache:
+                cache[key] = (df[col].to_numpy(dtype=np.float64) - mu) / sd
+            X[:, j] = cache[key]
+        X[:, len(self.num_cols):] = 0.0
+        rows = np.arange(n)
+        for col, cats, off in zip(self.cat_cols, self.categories, self.cat_offsets):
+            key = ("cat", col, tuple(cats))
+            if key not in cache:
+                values = extra[col] if col in extra else df[col]
+                codes = pd.Index(cats).get_indexer(values)  # -1 for unknown categories
+                known = codes >= 0  # unknown categories encode as all zeros
+                cache[key] = (rows[known], codes[known])
+            hit_rows, hit_codes = cache[key]
+            X[hit_rows, off + hit_codes] = 1.0
+        return X
+
+    def predict_transformed(self, X: np.ndarray) -> np.ndarray:
+        """Walks all (row, tree) pairs down one level per step, dropping pairs that reached a leaf."""
+        n_trees, n_cols = len(self.roots), X.shape[1]
+        out = np.empty(len(X), dtype=np.float64)
+        chunk = max(1, CHUNK_PAIRS // max(1, n_trees))
+        for start in range(0, len(X), chunk):
+            flat = np.ascontiguousarray(X[start:start + chunk]).ravel()
+            nc = len(flat) // n_cols if n_cols else 0
+            node = np.tile(self.roots, nc)
+            base = np.repeat(np.arange(nc, dtype=np.int64) * n_cols, n_trees)
+            active = np.flatnonzero(~self.is_leaf[node])
+            while active.size:
+                nd = node[active]
+                go_right = flat[base[active] + self.feature[nd]] > self.threshold[nd]
+                nd = self.children[2 * nd + go_right]
+                node[active] = nd
+                active = active[~self.is_leaf[nd]]
+            out[start:start + nc] = self.value[node].reshape(nc, n_trees).mean(axis=1)
+        return out
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        return self.predict_transformed(self.transform(df))
+
+
+def _fresh(path: str, model_file: str) -> bool:
+    return os.path.exists(path) and (not os.path.exists(model_file)
+                                     or os.path.getmtime(path) >= os.path.getmtime(model_file))
+
+
+def pipeline_schema_hash(pipeline) -> str:
+    """schema_hash() of a fitted sklearn pipeline, from its preprocessing step alone."""
+    meta = compile_preprocessor(_pipeline_parts(pipeline)[0])
+    meta["feature_names_in"] = [str(c) for c in getattr(pipeline, "feature_names_in_", [])]
+    return schema_hash(meta)
+
+
+def expected_schema_hash(model_file: str, bundle_dir: Optional[str] = None,
+                         manifest_path: str = TRAINING_MANIFEST) -> Optional[str]:
+    """The schema_hash training recorded for this model (matched by joblib or bundle path), if any."""
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        models = json.load(f).get("models", {})
+    wanted = {os.path.abspath(p) for p in (model_file, bundle_dir) if p}
+    for entry in models.values():
+        if wanted & {os.path.abspath(entry[k]) for k in ("path", "bundle") if entry.get(k)}:
+            return entry.get("schema_hash")
+    return None
+
+
+def load_model(model_file: str = MODEL_FILE, compiled_file: str = COMPILED_FILE,
+               bundle_dir: Optional[str] = BUNDLE_DIR, expected_schema: Optional[str] = None):
+    """
+    The memory-mapped bundle, else the compiled .npz, when at least as new as the
+    pickled pipeline; else the pipeline itself (importing joblib / sklearn only
+    then). All of them have .predict(df).
+
+    expected_schema defaults to the hash in the training manifest; a model whose
+    schema differs raises ValueError.
+    """
+    if expected_schema is None:
+        expected_schema = expected_schema_hash(model_file, bundle_dir)
+    if bundle_dir and _fresh(os.path.join(bundle_dir, "manifest.json"), model_file):
+        return CompiledForest.load_bundle(bundle_dir, expected_schema=expected_schema)
+    if compiled_file and _fresh(compiled_file, model_file):
+        model, source = CompiledForest.load(compiled_file), compiled_file
+        found = model.schema_hash
+    else:
+        import joblib
+        model, source = joblib.load(model_file), model_file
+        found = pipeline_schema_hash(model)
+    if expected_schema is not None and found != expected_schema:
+        raise ValueError(f"{source}: schema {found[:12]}, expected {expected_schema[:12]}")
+    return model
+
+
+def random_inputs(compiled: CompiledForest, n: int, seed: int = 0) -> pd.DataFrame:
+    """Rows spread around the scaler statistics, with known and unknown categories."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col, mu, sd in zip(compiled.num_cols, compiled.mean, compiled.scale):
+        data[col] = mu + sd * rng.normal(0, 1.5, n)
+    for col, cats in zip(compiled.cat_cols, compiled.categories):
+        pool = list(cats) + ["__unknown__"]
+        data[col] = [pool[i] for i in rng.integers(0, len(pool), n)]
+    return pd.DataFrame(data)
+
+
+def _memory_kib() -> Dict[str, int]:
+    """VmRSS and, where the kernel reports it, Pss (shared pages split between their users)."""
+    out = {}
+    for path, keys in (("/proc/self/status", ("VmRSS",)), ("/proc/self/smaps_rollup", ("Pss",))):
+        try:
+            with open(path) as f:
+                for line in f:
+                    key = line.split(":", 1)[0]
+                    if key in keys:
+                        out[key] = int(line.split()[1])
+        except OSError:
+            pass
+    return out
+
+
+def _bench_worker(kind: str, path: str, rows: pd.DataFrame, barrier, results):
+    before = _memory_kib()
+    t0 = time.perf_counter()
+    if kind == "joblib":
+        import joblib
+        model = joblib.load(path)
+    elif kind == "npz":
+        model = CompiledForest.load(path)
+    else:
+        model = CompiledForest.load_bundle(path)
+    load_s = time.perf_counter() - t0
+    model.predict(rows)  # touch the pages a prediction actually needs
+    barrier.wait()       # every worker holds its model before memory is measured
+    after = _memory_kib()
+    results.put({"load_s": load_s, **{k: after[k] - before.get(k, 0) for k in after}})
+    barrier.wait()
+
+
+def bench_load(model_file: str = MODEL_FILE, bundle_dir: str = BUNDLE_DIR, workers: int = BENCH_WORKERS):
+    """Startup cost per worker process: load time and memory added by loading + one predict."""
+    import joblib
+    pipeline = joblib.load(model_file)
+    compiled = compile_pipeline(pipeline)
+    npz_file = os.path.join(bundle_dir + ".bench.npz")
+    save_compiled(compiled, npz_file)
+    save_bundle(compiled, bundle_dir)
+    rows = random_inputs(CompiledForest.load_bundle(bundle_dir), 256)
+    del pipeline
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{workers} worker processes per format ({model_file}):")
+    for kind, path in (("joblib", model_file), ("npz", npz_file), ("bundle", bundle_dir)):
+        barrier, results = ctx.Barrier(workers), ctx.Queue()
+        procs = [ctx.Process(target=_bench_worker, args=(kind, path, rows, barrier, results)) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        stats = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        load_ms = 1000 * np.mean([r["load_s"] for r in stats])
+        line = f"  {kind:<7} load {load_ms:8.1f} ms"
+        for key in ("VmRSS", "Pss"):
+            if key in stats[0]:
+                line += f"   +{key} {np.mean([r[key] for r in stats]) / 1024:7.1f} MiB"
+        print(line)
+    os.remove(npz_file)
+
+
+def main():
+    argv = sys.argv[1:]
+    args = [a for i, a in enumerate(argv) if not a.startswith("--") and not (i and argv[i - 1] == "--bundle")]
+    if "--bench-load" in sys.argv:
+        bench_load(args[0] if args else MODEL_FILE, args[1] if len(args) > 1 else BUNDLE_DIR)
+        return
+
+    import joblib  # only the compile step needs the pickled sklearn model
+
+    model_file = args[0] if args else MODEL_FILE
+    out_file = args[1] if len(args) > 1 else COMPILED_FILE
+
+    pipeline = joblib.load(model_file)
+    compiled = compile_pipeline(pipeline)
+    save_compiled(compiled, out_file)
+    engine = CompiledForest.load(out_file)
+    print(f"Compiled {model_file} -> {out_file}: {len(engine.roots)} trees, {len(engine.value)} nodes, "
+          f"depth {engine.max_depth}, {os.path.getsize(out_file) / 1024:.1f} KiB")
+    if "--bundle" in sys.argv:
+        bundle_dir = sys.argv[sys.argv.index("--bundle") + 1]
+        manifest = save_bundle(compiled, bundle_dir)
+        engine = CompiledForest.load_bundle(bundle_dir)
+        print(f"Bundle {bundle_dir}: version {manifest['version']}, schema {manifest['schema_hash'][:12]}")
+
+    X = random_inputs(engine, CHECK_ROWS)
+    t0 = time.perf_counter()
+    expected = pipeline.predict(X)
+    t1 = time.perf_counter()
+    got = engine.predict(X)
+    t2 = time.perf_counter()
+    err = float(np.max(np.abs(expected - got)))
+    print(f"Check on {CHECK_ROWS} rows: max abs diff {err:.3g}; "
+          f"sklearn {1000 * (t1 - t0):.1f} ms, compiled {1000 * (t2 - t1):.1f} ms")
+    if not np.allclose(expected, got, rtol=1e-6, atol=1e-6):
+        print("ERROR: compiled forest does not reproduce the pipeline.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
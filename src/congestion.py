@@ -1,45 +1,16 @@
-import pandas as pd
-import numpy as np
-import joblib
-import os
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.pipeline import Pipeline
+"""
+congestion.py
 
-df = pd.read_csv("data/sample.csv")
+Trains only the congestion model; see training.py for the shared training pipeline.
 
-y = df["predicted_congestion"]
+Usage:
+  python congestion.py [--warm-start] [data.csv]
+"""
+import sys
 
-features = df.drop(columns=["predicted_congestion", "weight"])
+from training import DATA_PATH, train
 
-numeric = [
-    "distance", "road_quality", "lane_count", "speed_limit",
-    "tolls", "foot_traffic", "historical_congestion",
-    "pothole_reports"
-]
-
-categorical = [
-    "road_type", "event", "vehicle_type", "accident"
-]
-
-preprocess = ColumnTransformer(
-    transformers=[
-        ("num", StandardScaler(), numeric),
-        ("cat", OneHotEncoder(handle_unknown="ignore"), categorical)
-    ]
-)
-
-model = RandomForestRegressor(n_estimators=200, random_state=42)
-
-pipeline = Pipeline([
-    ("preprocess", preprocess),
-    ("model", model)
-])
-
-pipeline.fit(features, y)
-
-os.makedirs("model", exist_ok=True)
-joblib.dump(pipeline, "model/congestion.joblib")
-
-print("Congestion model saved successfully!")
\ No newline at end of file
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    train(args[0] if args else DATA_PATH, ["congestion"], warm_start="--warm-start" in sys.argv)
+    print("Congestion model saved successfully!")
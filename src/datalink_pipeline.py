@@ -5,27 +5,56 @@ builds a directed graph of road segments, enriches attributes (lanes, speed, tol
 surface, lighting, one-way, foot-traffic score, historical congestion, pothole & accident risk,
 event flags), and exports segments_features.csv + segments_features.geojson.
 
+Runs are incremental: a manifest of way ids -> content hashes (tags + geometry) is
+kept next to the outputs, and a new run only recomputes segments for ways that were
+added, changed or deleted since the previous run. The manifest also records
+PIPELINE_VERSION; when it differs (the way -> segment conversion changed, so
+unchanged ways would keep stale rows) the run is a full rebuild. Each run also writes
+segments_delta.json, which downstream consumers (routing snapshot builder, map
+renderer) can apply with apply_segments_delta() instead of reloading everything.
+
 Usage:
-  python datalink_pipeline.py
+  python datalink_pipeline.py            # incremental run
+  python datalink_pipeline.py --full     # ignore the manifest and rebuild everything
+  python datalink_pipeline.py --simplify # also write segments_simplified.csv (see graph_simplify.py)
+  python datalink_pipeline.py --tiles    # also write z/x/y GeoJSON tiles under tiles/
+  python datalink_pipeline.py --largest-component  # drop fragments outside the largest SCC
 """
 import os
+import sys
 import math
 import json
+import hashlib
 from datetime import datetime
 from typing import List, Dict
 
-import requests
+import numpy as np
 import pandas as pd
 import networkx as nx
 from shapely.geometry import LineString  # only for WKT creation
 
+from http_client import get_client
+from geojson_export import write_geojson_stream, iter_edge_features, export_geojson_tiles
+
 # -----------------------
 # CONFIG: change bbox if you want a different area
 # bbox = minlat, minlon, maxlat, maxlon
 # Here is a small Bangalore bbox near the coordinates used earlier.
 BBOX = (12.9680, 77.5920, 12.9820, 77.6020)
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+OVERPASS_TIMEOUT_S = 90  # the query itself asks Overpass for at most 60 s
 OUT_DIR = "datalink_output"
+MANIFEST_FILE = "ways_manifest.json"
+# bump whenever ways_to_segments_df() output changes (new columns, new derivations):
+# a manifest written by another version forces a full rebuild
+PIPELINE_VERSION = 2
+DELTA_FILE = "segments_delta.json"
+# optional stage: contract degree-2 chains into single routed edges (graph_simplify.py)
+SIMPLIFY_TOPOLOGY = False
+# optional stage: per-z/x/y GeoJSON tiles for viewport-based clients (geojson_export.py)
+EXPORT_TILES = False
+# optional stage: keep only the largest strongly connected component in the snapshot
+PRUNE_TO_LARGEST_COMPONENT = False
 # -----------------------
 
 def now_iso():
@@ -68,7 +97,7 @@ def fetch_osm_roads(bbox):
     out skel qt;
     """
     print("Querying Overpass API for bbox:", bbox)
-    resp = requests.post(OVERPASS_URL, data={"data": query})
+    resp = get_client().post(OVERPASS_URL, data={"data": query}, timeout=OVERPASS_TIMEOUT_S)
     if resp.status_code != 200:
         raise RuntimeError(f"Overpass query failed: HTTP {resp.status_code}: {resp.text[:500]}")
     data = resp.json()
@@ -235,6 +264,7 @@ def ways_to_segments_df(ways):
                 "from_node": from_node,
                 "to_node": to_node,
                 "way_id": w["id"],
+                "road_name": tags.get("name", ""),
                 "road_type": road_type,
                 "lane_count": lane_count if lane_count is not None else 1,
                 "speed_limit_kph": speed_limit_kph if speed_limit_kph is not None else 40,
@@ -277,6 +307,7 @@ def build_graph_from_segments_df(df_segments):
 
         edge_attrs = {
             "segment_id": f"{r['way_id']}",
+            "road_name": r["road_name"],
             "length_m": float(r["length_m"]),
             "lane_count": int(r["lane_count"]),
             "road_type": r["road_type"],
@@ -301,6 +332,167 @@ def build_graph_from_segments_df(df_segments):
         G.add_edge(u, v, **edge_attrs)
     return G
 
+def build_graph_from_edges_df(df_edges):
+    """
+    Rebuild a graph from a previously exported edge table (segments_features.csv).
+    Edge attributes are taken as-is, so normalized_ts of untouched edges survives.
+    """
+    G = nx.DiGraph()
+    attr_cols = [c for c in df_edges.columns if c not in ("from_node", "to_node")]
+    for rec in df_edges.to_dict("records"):
+        u = rec["from_node"]
+        v = rec["to_node"]
+        for n in (u, v):
+            if not G.has_node(n):
+                lat, lon = map(float, n.split("_"))
+                G.add_node(n, lat=lat, lon=lon)
+        G.add_edge(u, v, **{c: rec[c] for c in attr_cols})
+    return G
+
+# -----------------------
+# Incremental runs: way manifest + segment delta
+# -----------------------
+def way_content_hash(way):
+    """Stable hash of a way's tags and geometry; any edit to either changes it."""
+    payload = {
+        "tags": way["tags"],
+        "coords": [[c["lat"], c["lon"]] for c in way["coords"]],
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(path, bbox, hashes):
+    manifest = {"bbox": list(bbox), "pipeline_version": PIPELINE_VERSION, "generated_ts": now_iso(),
+                "ways": hashes}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest
+
+def diff_ways(ways, old_hashes):
+    """
+    Compare fetched ways against the previous manifest.
+    Returns (hashes, added, changed, deleted) where ids are strings.
+    """
+    hashes = {str(w["id"]): way_content_hash(w) for w in ways}
+    added = [wid for wid in hashes if wid not in old_hashes]
+    changed = [wid for wid in hashes if wid in old_hashes and old_hashes[wid] != hashes[wid]]
+    deleted = [wid for wid in old_hashes if wid not in hashes]
+    return hashes, added, changed, deleted
+
+def edge_records(df_edges):
+    """Edge rows as JSON-safe dicts (NaN -> None) for the delta file."""
+    df = df_edges.astype(object).where(pd.notna(df_edges), None)
+    return df.to_dict("records")
+
+def apply_segments_delta(df_edges, delta):
+    """
+    Apply a segments_delta.json payload to an edge table loaded from segments_features.csv.
+    A full delta replaces the table; otherwise removed edges are dropped and upserted
+    edges are added (or replace the existing row for the same from_node/to_node).
+    """
+    upserts = pd.DataFrame(delta.get("upserted_edges", []))
+    if delta.get("full"):
+        return upserts
+    removed = {(u, v) for u, v in delta.get("removed_edges", [])}
+    if removed:
+        keys = list(zip(df_edges["from_node"], df_edges["to_node"]))
+        df_edges = df_edges[[k not in removed for k in keys]]
+    if not upserts.empty:
+        df_edges = pd.concat([df_edges, upserts], ignore_index=True)
+        df_edges = df_edges.drop_duplicates(subset=["from_node", "to_node"], keep="last")
+    return df_edges.reset_index(drop=True)
+
+def column_changed(a, b):
+    """
+    Row-wise a != b, by value rather than by text: a column read back from CSV
+    as 3.0 equals the graph's 3, and missing equals missing.
+    """
+    a = a.reset_index(drop=True)
+    b = b.reset_index(drop=True)
+    both_missing = (a.isna() & b.isna()).to_numpy()
+    if pd.api.types.is_numeric_dtype(a) or pd.api.types.is_numeric_dtype(b):
+        na = pd.to_numeric(a, errors="coerce").astype(float)
+        nb = pd.to_numeric(b, errors="coerce").astype(float)
+        # only if nothing but missing values failed to convert
+        if (na.isna() == a.isna()).all() and (nb.isna() == b.isna()).all():
+            return ~(np.isclose(na.to_numpy(), nb.to_numpy(), rtol=1e-9, atol=0.0) | both_missing)
+    return ~((a.astype(str) == b.astype(str)).to_numpy() | both_missing)
+
+def diff_edge_tables(df_prev, df_new):
+    """
+    Diff two edge tables keyed by (from_node, to_node).
+    Returns (removed_edges, upserts) where upserts holds new and modified rows of df_new.
+    """
+    key = ["from_node", "to_node"]
+    prev = df_prev.set_index(key)
+    new = df_new.set_index(key)
+    removed = [list(k) for k in prev.index.difference(new.index)]
+    common = new.index.intersection(prev.index)
+    cols = list(new.columns)
+    prev_common = prev.reindex(index=common, columns=cols)
+    new_common = new.loc[common, cols]
+    changed = np.zeros(len(common), dtype=bool)
+    for c in cols:
+        changed |= column_changed(prev_common[c], new_common[c])
+    modified = common[changed]
+    added = new.index.difference(prev.index)
+    upserts = new.loc[added.append(modified)].reset_index()
+    return removed, upserts
+
+# -----------------------
+# Connectivity: component tagging and pruning
+# -----------------------
+def traversal_graph(G):
+    """
+    The directions a road can actually be driven: segments are exported once, in
+    way order, so every segment that is not one_way is also traversable backwards.
+    """
+    D = nx.DiGraph()
+    D.add_nodes_from(G.nodes)
+    D.add_edges_from(G.edges)
+    D.add_edges_from((v, u) for u, v, one_way in G.edges(data="one_way")
+                     if str(one_way).lower() not in ("true", "1"))
+    return D
+
+def tag_components(G):
+    """
+    Tag nodes and edges with component ids (0 = largest):
+      - component_id: strongly connected component of traversal_graph(G);
+        edges between two SCCs get -1
+      - weak_component_id: weakly connected component; nodes in different weak
+        components can never reach each other, which the router checks in O(1)
+    Returns (number of SCCs, number of WCCs).
+    """
+    sccs = sorted(nx.strongly_connected_components(traversal_graph(G)), key=len, reverse=True)
+    wccs = sorted(nx.weakly_connected_components(G), key=len, reverse=True)
+    for cid, comp in enumerate(sccs):
+        for n in comp:
+            G.nodes[n]["component_id"] = cid
+    for cid, comp in enumerate(wccs):
+        for n in comp:
+            G.nodes[n]["weak_component_id"] = cid
+    for u, v, data in G.edges(data=True):
+        cu = G.nodes[u]["component_id"]
+        data["component_id"] = cu if cu == G.nodes[v]["component_id"] else -1
+        data["weak_component_id"] = G.nodes[u]["weak_component_id"]
+    return len(sccs), len(wccs)
+
+def keep_largest_component(G):
+    """Subgraph of the largest strongly connected component (component_id 0, two-way roads counted both ways)."""
+    keep = [n for n, cid in G.nodes(data="component_id") if cid == 0]
+    H = G.subgraph(keep).copy()
+    for n in H.nodes:
+        H.nodes[n]["weak_component_id"] = 0
+    for _, _, data in H.edges(data=True):
+        data["weak_component_id"] = 0
+    return H
+
 # -----------------------
 # Export functions
 # -----------------------
@@ -315,66 +507,148 @@ def export_graph_edges_to_csv(G, out_path):
     df.to_csv(out_path, index=False)
     return df
 
+def export_graph_nodes_to_csv(G, out_path):
+    rows = [dict(data, node_id=n) for n, data in G.nodes(data=True)]
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df = df[["node_id"] + [c for c in df.columns if c != "node_id"]]
+    df.to_csv(out_path, index=False)
+    return df
+
 def export_graph_edges_to_geojson(G, out_path):
     """
     Export graph edges to GeoJSON using node coordinates directly.
     This guarantees valid [lon, lat] and avoids any WKT issues.
+    Features are streamed to disk one at a time (see geojson_export.py).
+    Returns the number of features written.
     """
-    features = []
-    for u, v, data in G.edges(data=True):
-        lat_u = G.nodes[u]["lat"]
-        lon_u = G.nodes[u]["lon"]
-        lat_v = G.nodes[v]["lat"]
-        lon_v = G.nodes[v]["lon"]
-
-        geom = {
-            "type": "LineString",
-            "coordinates": [
-                [float(lon_u), float(lat_u)],   # [lon, lat]
-                [float(lon_v), float(lat_v)]
-            ]
-        }
-
-        feat = {
-            "type": "Feature",
-            "properties": {k: v for k, v in data.items() if k != "geometry_wkt"},
-            "geometry": geom
-        }
-        features.append(feat)
-
-    geo = {"type": "FeatureCollection", "features": features}
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(geo, f)
-    return geo
+    return write_geojson_stream(iter_edge_features(G), out_path)
 
 # -----------------------
 # Main pipeline
 # -----------------------
-def run_pipeline(bbox):
+def run_pipeline(bbox, incremental=True, simplify=SIMPLIFY_TOPOLOGY, tiles=EXPORT_TILES,
+                 prune=PRUNE_TO_LARGEST_COMPONENT):
     if not os.path.exists(OUT_DIR):
         os.makedirs(OUT_DIR, exist_ok=True)
 
+    csv_path = os.path.join(OUT_DIR, "segments_features.csv")
+    nodes_path = os.path.join(OUT_DIR, "nodes.csv")
+    geojson_path = os.path.join(OUT_DIR, "segments_features.geojson")
+    manifest_path = os.path.join(OUT_DIR, MANIFEST_FILE)
+    delta_path = os.path.join(OUT_DIR, DELTA_FILE)
+
     raw = fetch_osm_roads(bbox)
     ways = parse_overpass_to_ways(raw)
-    print(f"Fetched {len(ways)} ways from Overpass. Converting to segments...")
-    df_segments = ways_to_segments_df(ways)
+    print(f"Fetched {len(ways)} ways from Overpass.")
+
+    manifest = load_manifest(manifest_path) if incremental else None
+    if manifest is not None and (manifest.get("bbox") != list(bbox) or not os.path.exists(csv_path)):
+        print("Manifest does not match this bbox / output, doing a full rebuild.")
+        manifest = None
+    elif manifest is not None and manifest.get("pipeline_version") != PIPELINE_VERSION:
+        print(f"Manifest was written by pipeline version {manifest.get('pipeline_version')} "
+              f"(now {PIPELINE_VERSION}), doing a full rebuild.")
+        manifest = None
+    old_hashes = manifest["ways"] if manifest else {}
+    hashes, added, changed, deleted = diff_ways(ways, old_hashes)
+
+    if manifest is None:
+        dirty_ways = ways
+        df_prev = None
+        print("Full run: converting all ways to segments...")
+    else:
+        dirty = set(added) | set(changed)
+        dirty_ways = [w for w in ways if str(w["id"]) in dirty]
+        df_prev = pd.read_csv(csv_path, dtype={"segment_id": str})
+        print(f"Incremental run: {len(added)} added, {len(changed)} changed, "
+              f"{len(deleted)} deleted, {len(ways) - len(dirty_ways)} unchanged ways.")
+
+    df_segments = ways_to_segments_df(dirty_ways)
     print(f"Created {len(df_segments)} directed segments (rows). Building graph...")
-    G = build_graph_from_segments_df(df_segments)
-
-    csv_path = os.path.join(OUT_DIR, "segments_features.csv")
-    geojson_path = os.path.join(OUT_DIR, "segments_features.geojson")
+    G_new = build_graph_from_segments_df(df_segments) if not df_segments.empty else nx.DiGraph()
+    df_new = pd.DataFrame(
+        [dict(data, from_node=u, to_node=v) for u, v, data in G_new.edges(data=True)]
+    )
+
+    if df_prev is None:
+        G = G_new
+    else:
+        stale_ways = set(changed) | set(deleted)
+        stale_mask = df_prev["segment_id"].isin(stale_ways)
+        stale_edges = df_prev.loc[stale_mask, ["from_node", "to_node"]].values.tolist()
+        df_merged = apply_segments_delta(
+            df_prev, {"removed_edges": stale_edges, "upserted_edges": edge_records(df_new)}
+        )
+        G = build_graph_from_edges_df(df_merged)
+
+    n_scc, n_wcc = tag_components(G)
+    print(f"Connectivity: {n_scc} strongly / {n_wcc} weakly connected components.")
+    if prune:
+        n_before = G.number_of_nodes()
+        H = keep_largest_component(G)
+        # ways that lost edges are left out of the manifest, so the next run
+        # regenerates them in full and they can rejoin if connectivity changes
+        pruned_ways = {str(d["segment_id"]) for u, v, d in G.edges(data=True) if not H.has_edge(u, v)}
+        hashes = {wid: h for wid, h in hashes.items() if wid not in pruned_ways}
+        G = H
+        print(f"Kept largest component: {n_before} -> {G.number_of_nodes()} nodes.")
+
+    delta = {
+        "generated_ts": now_iso(),
+        "bbox": list(bbox),
+        "added_ways": added,
+        "changed_ways": changed,
+        "deleted_ways": deleted,
+    }
 
     df_out = export_graph_edges_to_csv(G, csv_path)
+    export_graph_nodes_to_csv(G, nodes_path)
     export_graph_edges_to_geojson(G, geojson_path)
 
+    # the delta is a diff of exported edge tables, so component re-tagging and
+    # pruning show up as upserts/removals just like way edits do
+    if df_prev is None:
+        delta["full"] = True
+        delta["removed_edges"] = []
+        delta["upserted_edges"] = edge_records(df_out)
+    else:
+        removed, upserts = diff_edge_tables(df_prev, df_out)
+        delta["full"] = False
+        delta["removed_edges"] = removed
+        delta["upserted_edges"] = edge_records(upserts)
+    with open(delta_path, "w", encoding="utf-8") as f:
+        json.dump(delta, f)
+    save_manifest(manifest_path, bbox, hashes)
+
+    if tiles:
+        tiles_dir = os.path.join(OUT_DIR, "tiles")
+        for z, count in export_geojson_tiles(G, tiles_dir).items():
+            print(f"Exported {count} tiles at zoom {z} under {tiles_dir}")
+
+    if simplify:
+        from graph_simplify import simplify_graph, simplified_edges_df
+        simplified_path = os.path.join(OUT_DIR, "segments_simplified.csv")
+        H = simplify_graph(G)
+        simplified_edges_df(H).to_csv(simplified_path, index=False)
+        print(f"Simplified topology: {G.number_of_nodes()} -> {H.number_of_nodes()} nodes, "
+              f"{G.number_of_edges()} -> {H.number_of_edges()} edges")
+        print("Exported simplified CSV:", simplified_path)
+
     print("Exported CSV:", csv_path)
+    print("Exported nodes:", nodes_path)
     print("Exported GeoJSON:", geojson_path)
+    print(f"Exported delta: {delta_path} ({len(delta['removed_edges'])} removed, "
+          f"{len(delta['upserted_edges'])} upserted edges)")
     print("Sample rows:")
     print(df_out.head().to_string(index=False))
 
 if __name__ == "__main__":
     try:
-        run_pipeline(BBOX)
+        run_pipeline(BBOX, incremental="--full" not in sys.argv,
+                     simplify=SIMPLIFY_TOPOLOGY or "--simplify" in sys.argv,
+                     tiles=EXPORT_TILES or "--tiles" in sys.argv,
+                     prune=PRUNE_TO_LARGEST_COMPONENT or "--largest-component" in sys.argv)
     except Exception as e:
         print("Error:", e)
         print("If Overpass API rate-limited you, wait a moment and re-run.")
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+feature_adapter.py
+
+Maps datalink segment columns (segments_features*.csv) onto the input schema the
+congestion / weight models were trained on (data/sample.csv, see training.py).
+
+The two tables describe the same things under different names and units:
+
+  model column            segment column(s)
+  distance (km)           length_m / 1000 (routing_logic then uses a fixed reference distance)
+  road_quality (1-5)      road_quality (road-type base + lanes, 3-14) rescaled onto 1-5
+  tolls                   toll
+  foot_traffic            foot_traffic_score
+  pothole_reports (0-10)  pothole_risk * 10
+  speed_limit(_kph)       speed_limit_kph
+  road_type               OSM highway tag -> highway / urban / rural
+  event                   vip_blocked / event_blocked -> vip_movement / procession / none
+  accident                accident_risk >= ACCIDENT_RISK_THRESHOLD -> yes / no
+  vehicle_type            not in the segment table; DEFAULT_VEHICLE_TYPE
+
+FEATURE_MAP declares each model column once. FeatureAdapter resolves it against
+the model's feature_names_in_ and the table's columns a single time, raising a
+ValueError naming every column it cannot produce, and then builds the model input
+for a whole table with column-wise operations.
+
+Usage:
+  adapter = FeatureAdapter.for_model(model)
+  X = adapter.transform(segments_df)     # columns in model order
+  weights = model.predict(X)
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+ACCIDENT_RISK_THRESHOLD = 0.8   # datalink accident_risk is 0.2-1.0 and averages ~0.5; "yes" is rare in training
+DEFAULT_VEHICLE_TYPE = "sedan"
+# datalink road_quality is a road-type base (3-10) plus the lane count; training data is uniform 1-5
+SEGMENT_QUALITY_RANGE = (3.0, 14.0)
+TRAINING_QUALITY_RANGE = (1.0, 5.0)
+
+# OSM highway tag -> road_type category of the training data (anything else is "urban")
+ROAD_TYPE_MAP = {
+    "motorway": "highway", "motorway_link": "highway",
+    "trunk": "highway", "trunk_link": "highway",
+    "primary": "highway", "primary_link": "highway",
+    "track": "rural", "bridleway": "rural",
+}
+DEFAULT_ROAD_TYPE = "urban"
+
+# model column -> how to build it (model columns not listed are taken as-is):
+#   "from":      candidate source columns; the first one present is used
+#   "scale":     {source: factor} applied to a numeric source column
+#   "rescale":   {source: ((lo, hi), (lo, hi))} linear map of a numeric source range, clipped
+#   "map":       categorical lookup on the source; values in "keep" pass through, others get "default"
+#   "threshold": {source: t}; labels[0] where source >= t, else labels[1]
+#   "flags":     [(bool column, label), ...] used when no "from" column exists; first true flag wins
+#   "default":   constant used when no source column is present
+FEATURE_MAP: Dict[str, Dict] = {
+    "distance": {"from": ["distance", "length_m"], "scale": {"length_m": 0.001}},
+    "road_quality": {"from": ["road_quality"],
+                     "rescale": {"road_quality": (SEGMENT_QUALITY_RANGE, TRAINING_QUALITY_RANGE)}},
+    "lane_count": {"from": ["lane_count"], "default": 1},
+    "speed_limit": {"from": ["speed_limit", "speed_limit_kph"]},
+    "speed_limit_kph": {"from": ["speed_limit_kph", "speed_limit"]},
+    "tolls": {"from": ["tolls", "toll"], "default": 0},
+    "foot_traffic": {"from": ["foot_traffic", "foot_traffic_score"]},
+    "historical_congestion": {"from": ["historical_congestion"]},
+    "pothole_reports": {"from": ["pothole_reports", "pothole_risk"], "scale": {"pothole_risk": 10.0}},
+    "predicted_congestion": {"from": ["predicted_congestion", "historical_congestion"]},
+    "road_type": {"from": ["road_type"], "map": ROAD_TYPE_MAP, "default": DEFAULT_ROAD_TYPE,
+                  "keep": ["highway", "urban", "rural"]},
+    "event": {"from": ["event"], "flags": [("vip_blocked", "vip_movement"), ("event_blocked", "procession")],
+              "default": "none"},
+    "vehicle_type": {"from": ["vehicle_type"], "default": DEFAULT_VEHICLE_TYPE},
+    "accident": {"from": ["accident", "accident_risk"], "threshold": {"accident_risk": ACCIDENT_RISK_THRESHOLD},
+                 "labels": ("yes", "no"), "default": "no"},
+}
+# -----------------------------
+
+
+def model_feature_names(model) -> List[str]:
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        raise ValueError("model has no feature_names_in_; it was not fitted on a DataFrame")
+    return [str(n) for n in names]
+
+
+class FeatureAdapter:
+    def __init__(self, feature_names: Sequence[str], spec: Optional[Dict[str, Dict]] = None):
+        self.feature_names = list(feature_names)
+        self.spec = FEATURE_MAP if spec is None else spec
+        self._plans: Dict[tuple, List] = {}
+
+    @classmethod
+    def for_model(cls, model, spec: Optional[Dict[str, Dict]] = None) -> "FeatureAdapter":
+        return cls(model_feature_names(model), spec)
+
+    def plan(self, columns: Sequence[str]) -> List:
+        """
+        (model column, rule, source column or None) per model column, for a table with
+        these columns. Computed once per column set; raises ValueError if any model
+        column can be neither taken, derived nor defaulted.
+        """
+        key = tuple(columns)
+        if key in self._plans:
+            return self._plans[key]
+        present = set(columns)
+        plan, missing = [], []
+        for name in self.feature_names:
+            rule = self.spec.get(name, {"from": [name]})
+            source = next((c for c in rule.get("from", []) if c in present), None)
+            has_flags = any(col in present for col, _ in rule.get("flags", []))
+            if source is None and not has_flags and "default" not in rule:
+                missing.append(f"{name} (from {rule.get('from') or [c for c, _ in rule.get('flags', [])]})")
+            plan.append((name, rule, source))
+        if missing:
+            raise ValueError("cannot build model input; missing: " + ", ".join(missing))
+        self._plans[key] = plan
+        return plan
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        n = len(df)
+        out = {}
+        for name, rule, source in self.plan(df.columns):
+            if source is not None and source in rule.get("threshold", {}):
+                yes, no = rule.get("labels", ("yes", "no"))
+                risk = df[source].to_numpy(dtype=np.float64)
+                out[name] = np.where(risk >= rule["threshold"][source], yes, no).astype(object)
+            elif source is not None and "map" in rule:
+                values = df[source].astype(str)
+                keep = rule.get("keep", [])
+                mapped = values.map(rule["map"])
+                mapped = mapped.where(mapped.notna(), values.where(values.isin(keep), rule["default"]))
+                out[name] = mapped.to_numpy(dtype=object)
+            elif source is not None and source in rule.get("rescale", {}):
+                src_range, dst_range = rule["rescale"][source]
+                out[name] = np.interp(df[source].to_numpy(dtype=np.float64), src_range, dst_range)
+            elif source is not None:
+                col = df[source].to_numpy()
+                factor = rule.get("scale", {}).get(source)
+                out[name] = col * factor if factor is not None else col
+            elif rule.get("flags"):
+                labels = np.full(n, rule.get("default", ""), dtype=object)
+                # reversed so the first flag in the list wins
+                for col, label in reversed(rule["flags"]):
+                    if col in df.columns:
+                        labels[df[col].fillna(False).astype(bool).to_numpy()] = label
+                out[name] = labels
+            else:
+                out[name] = np.full(n, rule["default"], dtype=object if isinstance(rule["default"], str) else None)
+        return pd.DataFrame(out, index=df.index, columns=self.feature_names)
@@ -1,83 +1,161 @@
-import pandas as pd
-import numpy as np
+"""
+generate_sample.py
+
+Synthetic training data for the congestion / weight models (data/sample.csv).
+
+Every column is drawn for a whole chunk of rows at once and predicted_congestion
+and weight are computed with array expressions, so the generator scales to tens
+of millions of rows. Rows are written chunk by chunk (CHUNK_ROWS at a time), so
+memory stays bounded whatever n is.
+
+The distributions are the ones the original row-by-row generator used with
+seed=42: uniform source / destination over A..E with destination != source,
+5% accidents, 3/5 of events "none", and so on. The exact rows differ because the
+random stream is consumed column-wise; for a given (seed, chunk_rows) the output
+is reproducible.
+
+Output format follows the file suffix: .csv (default) or .parquet (needs pyarrow).
+
+Usage:
+  python generate_sample.py [n] [out_file] [--chunk-rows N] [--seed S]
+  e.g. python generate_sample.py 20000000 data/large.parquet
+"""
+import sys
+import time
 from pathlib import Path
 
-def generate_sample_data(n=5000, out_file="data/sample.csv"):
-    rng = np.random.default_rng(42)
-    
-    nodes = ["A", "B", "C", "D", "E"]
-    road_types = ["highway", "urban", "rural"]
-    vehicle_types = ["sedan", "suv", "truck", "bike"] 
-    events = ["none", "none", "none", "procession", "vip_movement"]
-    accidents = ["yes", "no"]
-
-    rows = []
-
-    for _ in range(n):
-        source = rng.choice(nodes)
-        destination = rng.choice(nodes)
-        while destination == source:
-            destination = rng.choice(nodes)
-
-        distance = float(rng.integers(1, 60))
-        road_quality = rng.uniform(1.0, 5.0)
-        lane_count = int(rng.choice([1, 2, 3, 4], p=[0.2, 0.5, 0.2, 0.1]))
-        road_type = rng.choice(road_types)
-        speed_limit = rng.choice([40, 60, 80, 100])
-        tolls = int(rng.choice([0, 0, 0, 1, 2]))
-        foot_traffic = rng.uniform(0, 1)
-        event = rng.choice(events)
-        vehicle_type = rng.choice(vehicle_types)
-        historical_congestion = rng.uniform(0, 1)
-        
-        accident_prob = [0.05, 0.95] # 5% chance of accident
-        accident = rng.choice(["yes", "no"], p=accident_prob)
-        
-        potholes = int(rng.integers(0, 11))
-
-        acc_factor = 0.8 if accident == "yes" else 0.0
-        congestion = (
-            0.4 * (1 / road_quality) +
-            0.2 * foot_traffic +
-            0.2 * historical_congestion +
-            acc_factor +
-            0.1 * (potholes / 10)
-        )
-        congestion = float(np.clip(congestion, 0, 1))
-
-        weight = (
-            0.3 * distance +
-            5 * (1 / road_quality) +
-            3 * (1 - speed_limit / 120) +
-            2 * tolls +
-            10 * congestion +  
-            (10 if accident == "yes" else 0) +
-            potholes * 0.2
-        )
-
-        rows.append({
-            "source": source,
-            "destination": destination,
-            "distance": distance,
-            "road_quality": round(road_quality, 2),
-            "lane_count": lane_count,
-            "road_type": road_type,
-            "speed_limit": speed_limit,
-            "tolls": tolls,
-            "foot_traffic": round(foot_traffic, 3),
-            "event": event,
-            "vehicle_type": vehicle_type,
-            "historical_congestion": round(historical_congestion, 3),
-            "accident": accident,
-            "pothole_reports": potholes,
-            "predicted_congestion": round(congestion, 3),
-            "weight": round(weight, 3)
-        })
-
-    df = pd.DataFrame(rows)
-    Path(out_file).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out_file, index=False)
-    print(f"[OK] Sample data generated → {out_file}")
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for .parquet output
+    pa = pq = None
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+SEED = 42
+CHUNK_ROWS = 1_000_000
+
+NODES = ["A", "B", "C", "D", "E"]
+ROAD_TYPES = ["highway", "urban", "rural"]
+VEHICLE_TYPES = ["sedan", "suv", "truck", "bike"]
+EVENTS = ["none", "none", "none", "procession", "vip_movement"]
+ACCIDENT_PROB = 0.05  # 5% chance of accident
+LANE_COUNTS, LANE_PROBS = [1, 2, 3, 4], [0.2, 0.5, 0.2, 0.1]
+SPEED_LIMITS = [40, 60, 80, 100]
+TOLLS = [0, 0, 0, 1, 2]
+# -----------------------------
+
+
+def _categorical(codes: np.ndarray, categories) -> pd.Categorical:
+    """Categorical over the distinct labels; repeated labels (EVENTS) keep their weight."""
+    labels = list(dict.fromkeys(categories))
+    remap = np.array([labels.index(c) for c in categories], dtype=np.int8)
+    return pd.Categorical.from_codes(remap[codes], labels)
+
+
+def generate_chunk(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    source = rng.integers(0, len(NODES), n)
+    # uniform over the other nodes, same as redrawing until destination != source
+    destination = (source + rng.integers(1, len(NODES), n)) % len(NODES)
+
+    distance = rng.integers(1, 60, n).astype(np.float64)
+    road_quality = rng.uniform(1.0, 5.0, n)
+    lane_count = rng.choice(LANE_COUNTS, n, p=LANE_PROBS)
+    road_type = rng.integers(0, len(ROAD_TYPES), n)
+    speed_limit = rng.choice(SPEED_LIMITS, n)
+    tolls = rng.choice(TOLLS, n)
+    foot_traffic = rng.uniform(0, 1, n)
+    event = rng.integers(0, len(EVENTS), n)
+    vehicle_type = rng.integers(0, len(VEHICLE_TYPES), n)
+    historical_congestion = rng.uniform(0, 1, n)
+    accident = rng.random(n) < ACCIDENT_PROB
+    potholes = rng.integers(0, 11, n)
+
+    congestion = np.clip(
+        0.4 * (1 / road_quality) +
+        0.2 * foot_traffic +
+        0.2 * historical_congestion +
+        0.8 * accident +
+        0.1 * (potholes / 10),
+        0, 1)
+
+    weight = (
+        0.3 * distance +
+        5 * (1 / road_quality) +
+        3 * (1 - speed_limit / 120) +
+        2 * tolls +
+        10 * congestion +
+        10 * accident +
+        potholes * 0.2
+    )
+
+    return pd.DataFrame({
+        "source": _categorical(source, NODES),
+        "destination": _categorical(destination, NODES),
+        "distance": distance,
+        "road_quality": road_quality.round(2),
+        "lane_count": lane_count,
+        "road_type": _categorical(road_type, ROAD_TYPES),
+        "speed_limit": speed_limit,
+        "tolls": tolls,
+        "foot_traffic": foot_traffic.round(3),
+        "event": _categorical(event, EVENTS),
+        "vehicle_type": _categorical(vehicle_type, VEHICLE_TYPES),
+        "historical_congestion": historical_congestion.round(3),
+        "accident": pd.Categorical.from_codes(np.where(accident, 0, 1), ["yes", "no"]),
+        "pothole_reports": potholes,
+        "predicted_congestion": congestion.round(3),
+        "weight": weight.round(3),
+    })
+
+
+def generate_sample_data(n=5000, out_file="data/sample.csv", chunk_rows=CHUNK_ROWS, seed=SEED):
+    rng = np.random.default_rng(seed)
+    path = Path(out_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    parquet = path.suffix == ".parquet"
+    if parquet and pq is None:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow), or use a .csv file")
+
+    t0 = time.perf_counter()
+    writer = None
+    written = 0
+    try:
+        while written < n:
+            chunk = generate_chunk(rng, min(chunk_rows, n - written))
+            if parquet:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(str(path), table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(path, mode="w" if written == 0 else "a", header=written == 0, index=False)
+            written += len(chunk)
+            if n > chunk_rows:
+                print(f"  {written:,}/{n:,} rows ({time.perf_counter() - t0:.1f} s)")
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"[OK] Sample data generated → {out_file} ({written:,} rows, {time.perf_counter() - t0:.1f} s)")
+
+
+def main():
+    args = sys.argv[1:]
+    options = {}
+    for flag in ("--chunk-rows", "--seed"):
+        if flag in args:
+            options[flag] = int(args[args.index(flag) + 1])
+    positional = [a for i, a in enumerate(args) if not a.startswith("--")
+                  and not (i > 0 and args[i - 1] in ("--chunk-rows", "--seed"))]
+    generate_sample_data(int(positional[0]) if positional else 5000,
+                         positional[1] if len(positional) > 1 else "data/sample.csv",
+                         chunk_rows=options.get("--chunk-rows", CHUNK_ROWS),
+                         seed=options.get("--seed", SEED))
+
 
 if __name__ == "__main__":
-    generate_sample_data()
\ No newline at end of file
+    main()
@@ -0,0 +1,175 @@
+"""
+geocode_cache.py
+
+Persistent geocoding cache + rate-limited concurrent Nominatim client.
+
+The traffic police account repeats the same junction names constantly, so every
+lookup goes through an on-disk SQLite cache keyed by the normalized location hint
+and city, with a TTL for hits and a shorter TTL for misses (negative caching).
+Only cache misses reach the network, through RateLimitedGeocoder, which runs
+lookups concurrently but spaces the actual requests to respect Nominatim's
+one-request-per-second policy. Concurrent lookups of the same key share one request.
+
+Usage:
+  cache = GeocodeCache()
+  geocoder = RateLimitedGeocoder(cache)
+  results = asyncio.run(geocoder.geocode_many([("Silk Board Junction", "Bengaluru")]))
+
+  # offline, against the local stand-in server:
+  python stub_server.py  and set NOMINATIM_URL=http://127.0.0.1:8765/search
+"""
+import os
+import re
+import time
+import sqlite3
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from http_client import get_client
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+CACHE_PATH = "datalink_output/geocode_cache.sqlite"
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+USER_AGENT = "navai-incident-ingest/1.0"
+
+CACHE_TTL_S = 30 * 24 * 3600       # found places rarely move
+NEGATIVE_TTL_S = 24 * 3600         # retry unknown hints once a day
+MIN_REQUEST_INTERVAL_S = 1.0       # Nominatim usage policy: max 1 request per second
+MAX_CONCURRENCY = 4
+# -----------------------------
+
+
+def normalize_key(hint: str, city: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace: 'Silk Board Jn.' == 'silk board jn'."""
+    text = f"{hint}|{city}".lower()
+    text = re.sub(r"[^\w|]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class GeocodeCache:
+    """SQLite-backed cache of normalized key -> (lat, lon) or a negative entry."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl_s: float = CACHE_TTL_S,
+                 negative_ttl_s: float = NEGATIVE_TTL_S):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY, lat REAL, lon REAL, found INTEGER NOT NULL, ts REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+
+    def get(self, key: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """Returns (hit, value). A hit with value None is a cached negative result."""
+        row = self.conn.execute("SELECT lat, lon, found, ts FROM geocode WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        lat, lon, found, ts = row
+        ttl = self.ttl_s if found else self.negative_ttl_s
+        if time.time() - ts > ttl:
+            return False, None
+        return True, ((lat, lon) if found else None)
+
+    def put(self, key: str, value: Optional[Tuple[float, float]]):
+        lat, lon = value if value else (None, None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO geocode (key, lat, lon, found, ts) VALUES (?, ?, ?, ?, ?)",
+            (key, lat, lon, 1 if value else 0, time.time()),
+        )
+        self.conn.commit()
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        cur = self.conn.execute(
+            "DELETE FROM geocode WHERE (found = 1 AND ts < ?) OR (found = 0 AND ts < ?)",
+            (now - self.ttl_s, now - self.negative_ttl_s),
+        )
+        self.conn.commit()
+        return cur.rowcount
+
+
+def nominatim_lookup(hint: str, city: str, url: str = NOMINATIM_URL, timeout: float = 10) -> Optional[Tuple[float, float]]:
+    """One blocking Nominatim search. Raises on network/HTTP errors so they are not cached."""
+    params = {"q": f"{hint}, {city}, India", "format": "json", "limit": 1}
+    response = get_client().get(url, params=params, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+    response.raise_for_status()
+    results = response.json()
+    if results:
+        return float(results[0]["lat"]), float(results[0]["lon"])
+    return None
+
+
+class RateLimitedGeocoder:
+    """Cache-first geocoder; misses go to Nominatim at most once per min_interval_s."""
+
+    def __init__(self, cache: GeocodeCache, url: str = NOMINATIM_URL,
+                 min_interval_s: float = MIN_REQUEST_INTERVAL_S, max_concurrency: int = MAX_CONCURRENCY):
+        self.cache = cache
+        self.url = url
+        self.min_interval_s = min_interval_s
+        self.max_concurrency = max_concurrency
+        self._next_slot = 0.0
+        self._loop = None
+        self._slot_lock = None
+        self._sem = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "network_calls": 0, "errors": 0}
+        self.failed = set()  # keys whose lookup errored; their None is not a real "not found"
+
+    async def _wait_for_slot(self):
+        async with self._slot_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.min_interval_s
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _fetch(self, key: str, hint: str, city: str) -> Optional[Tuple[float, float]]:
+        async with self._sem:
+            await self._wait_for_slot()
+            self.stats["network_calls"] += 1
+            try:
+                value = await asyncio.to_thread(nominatim_lookup, hint, city, self.url)
+            except requests.exceptions.RequestException as e:
+                self.stats["errors"] += 1
+                self.failed.add(key)
+                print(f"Geocoding error for '{hint}': {e}")
+                return None
+        self.failed.discard(key)
+        self.cache.put(key, value)
+        return value
+
+    async def geocode(self, hint: str, city: str) -> Optional[Tuple[float, float]]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # asyncio primitives are bound to one event loop
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._slot_lock = asyncio.Lock()
+            self._inflight = {}
+        key = normalize_key(hint, city)
+        hit, value = self.cache.get(key)
+        if hit:
+            self.stats["hits" if value else "negative_hits"] += 1
+            return value
+        if key in self._inflight:
+            return await self._inflight[key]
+        self.stats["misses"] += 1
+        task = asyncio.ensure_future(self._fetch(key, hint, city))
+        self._inflight[key] = task
+        try:
+            return await task
+        finally:
+            self._inflight.pop(key, None)
+
+    async def geocode_many(self, queries: List[Tuple[str, str]]) -> List[Optional[Tuple[float, float]]]:
+        return await asyncio.gather(*(self.geocode(hint, city) for hint, city in queries))
+
+    def lookup_failed(self, hint: str, city: str) -> bool:
+        """True if this hint's None came from a network/HTTP error rather than a miss."""
+        return normalize_key(hint, city) in self.failed
@@ -0,0 +1,199 @@
+"""
+geojson_export.py
+
+Streaming and tiled GeoJSON export for the road graph built by datalink_pipeline.py.
+
+- write_geojson_stream(): writes a FeatureCollection feature by feature instead of
+  building the whole dict in memory and calling json.dump once. Uses orjson when it
+  is installed, falling back to the standard json module. Both write NaN / inf
+  values (missing attributes read back from CSV) as null, as GeoJSON is JSON.
+- export_geojson_tiles(): writes per-z/x/y GeoJSON tiles (tiles/{z}/{x}/{y}.geojson)
+  with per-zoom geometry simplification and attribute pruning, so clients only
+  fetch the tiles covering their viewport. The graph has one two-point edge per
+  coordinate pair, so degree-2 chains are first contracted into polylines
+  (graph_simplify.simplify_graph); otherwise there are no vertices to simplify.
+
+Usage:
+  python geojson_export.py [segments.csv] [out_dir]
+"""
+import os
+import sys
+import math
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString
+
+try:
+    import orjson
+except ImportError:  # optional fast serializer
+    orjson = None
+    import json
+
+# -----------------------
+# CONFIG
+# -----------------------
+COORD_PRECISION = 6  # same precision as the node ids
+
+TILE_ZOOMS = range(13, 18)
+
+# smallest zoom at which a road type is drawn at all
+MIN_ZOOM_BY_ROAD_TYPE = {
+    "motorway": 0, "trunk": 0, "primary": 0, "secondary": 13, "tertiary": 14,
+    "unclassified": 15, "residential": 15, "living_street": 16, "service": 16,
+}
+DEFAULT_MIN_ZOOM = 16
+
+# properties kept per zoom (zoom >= key); the highest matching key wins,
+# None means keep everything
+TILE_PROPERTIES = {
+    0: ["road_type", "event_blocked", "vip_blocked", "closed_for_construction"],
+    15: ["segment_id", "road_type", "lane_count", "speed_limit_kph", "one_way",
+         "historical_congestion", "accident_risk",
+         "event_blocked", "vip_blocked", "closed_for_construction"],
+    17: None,
+}
+
+# tile contracted chains (graph_simplify.py) instead of the raw two-point edges
+CONTRACT_CHAINS = True
+
+# never exported as properties: geometry is already carried by the feature itself
+EXCLUDED_PROPERTIES = ("geometry_wkt", "node_path")
+# -----------------------
+
+
+def json_safe(obj):
+    """obj with non-finite floats as None and NumPy scalars as Python ones (what orjson does natively)."""
+    if isinstance(obj, dict):
+        return {k: json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [json_safe(v) for v in obj]
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)  # NaN / inf -> null
+    return json.dumps(json_safe(obj), separators=(",", ":"), default=str, allow_nan=False).encode("utf-8")
+
+
+def edge_coords(G, u, v, data) -> List[List[float]]:
+    """[lon, lat] coordinates of an edge, following node_path for contracted edges."""
+    path = data.get("node_path") or [u, v]
+    return [[round(float(G.nodes[n]["lon"]), COORD_PRECISION),
+             round(float(G.nodes[n]["lat"]), COORD_PRECISION)] for n in path]
+
+
+def iter_edge_features(G) -> Iterator[Dict]:
+    for u, v, data in G.edges(data=True):
+        yield {
+            "type": "Feature",
+            "properties": {k: val for k, val in data.items() if k not in EXCLUDED_PROPERTIES},
+            "geometry": {"type": "LineString", "coordinates": edge_coords(G, u, v, data)},
+        }
+
+
+def write_geojson_stream(features: Iterable[Dict], out_path: str) -> int:
+    """Write features as a FeatureCollection one at a time. Returns the feature count."""
+    count = 0
+    with open(out_path, "wb") as f:
+        f.write(b'{"type":"FeatureCollection","features":[')
+        for feat in features:
+            if count:
+                f.write(b",")
+            f.write(dumps(feat))
+            count += 1
+        f.write(b"]}")
+    return count
+
+# -----------------------
+# Tiles
+# -----------------------
+def lonlat_to_tile(lon: float, lat: float, z: int) -> Tuple[int, int]:
+    n = 2 ** z
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_r = math.radians(lat)
+    y = int((1.0 - math.log(math.tan(lat_r) + 1.0 / math.cos(lat_r)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def simplify_tolerance_deg(z: int) -> float:
+    """Roughly half a screen pixel (256 px tiles) at zoom z, in degrees."""
+    return 360.0 / (256 * 2 ** z) * 0.5
+
+
+def tile_properties(data: Dict, z: int) -> Dict:
+    keys = TILE_PROPERTIES[max(k for k in TILE_PROPERTIES if k <= z)]
+    if keys is None:
+        return {k: val for k, val in data.items() if k not in EXCLUDED_PROPERTIES}
+    return {k: data[k] for k in keys if k in data}
+
+
+def export_geojson_tiles(G, out_dir: str, zooms: Iterable[int] = TILE_ZOOMS,
+                         contract: bool = CONTRACT_CHAINS) -> Dict[int, int]:
+    """
+    Write tiles/{z}/{x}/{y}.geojson for each zoom. A feature is written to every
+    tile its bounding box touches (features are not clipped at tile edges).
+    With contract=True each feature is a contracted chain of edges.
+    Returns {zoom: number of tiles written}.
+    """
+    H = G
+    if contract:
+        from graph_simplify import simplify_graph  # imports datalink_pipeline, which imports this module
+        H = simplify_graph(G)
+    # node_path of a contracted edge runs through nodes that only the original graph has
+    edges = [(data, edge_coords(G, u, v, data)) for u, v, data in H.edges(data=True)]
+    written = {}
+    for z in zooms:
+        tol = simplify_tolerance_deg(z)
+        tiles: Dict[Tuple[int, int], List[bytes]] = {}
+        for data, coords in edges:
+            min_zoom = MIN_ZOOM_BY_ROAD_TYPE.get(data.get("road_type"), DEFAULT_MIN_ZOOM)
+            if z < min_zoom:
+                continue
+            if len(coords) > 2:
+                line = LineString(coords).simplify(tol, preserve_topology=False)
+                coords_z = [[round(x, COORD_PRECISION), round(y, COORD_PRECISION)]
+                            for x, y in line.coords]
+            else:
+                coords_z = coords
+            feat = dumps({
+                "type": "Feature",
+                "properties": tile_properties(data, z),
+                "geometry": {"type": "LineString", "coordinates": coords_z},
+            })
+            lons = [c[0] for c in coords_z]
+            lats = [c[1] for c in coords_z]
+            x0, y0 = lonlat_to_tile(min(lons), max(lats), z)
+            x1, y1 = lonlat_to_tile(max(lons), min(lats), z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    tiles.setdefault((x, y), []).append(feat)
+
+        for (x, y), feats in tiles.items():
+            tile_dir = os.path.join(out_dir, str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f"{y}.geojson"), "wb") as f:
+                f.write(b'{"type":"FeatureCollection","features":[')
+                f.write(b",".join(feats))
+                f.write(b"]}")
+        written[z] = len(tiles)
+    return written
+
+
+if __name__ == "__main__":
+    from datalink_pipeline import OUT_DIR, build_graph_from_edges_df
+
+    in_csv = sys.argv[1] if len(sys.argv) > 1 else os.path.join(OUT_DIR, "segments_features.csv")
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else OUT_DIR
+    G = build_graph_from_edges_df(pd.read_csv(in_csv, dtype={"segment_id": str}))
+    n = write_geojson_stream(iter_edge_features(G), os.path.join(out_dir, "segments_features.geojson"))
+    print(f"Streamed {n} features.")
+    for z, count in export_geojson_tiles(G, os.path.join(out_dir, "tiles")).items():
+        print(f"  zoom {z}: {count} tiles")
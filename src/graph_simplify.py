@@ -0,0 +1,210 @@
+"""
+graph_simplify.py
+
+Topology simplification for the road graph built by datalink_pipeline.py.
+
+Every OSM way is split into one edge per consecutive coordinate pair, so a curved
+road becomes dozens of 4-30 m edges. This module contracts chains of degree-2 nodes
+whose incident edges have compatible attributes into a single routed edge:
+
+  - length_m is summed over the chain
+  - continuous features (quality, risk, congestion, ...) are length-weighted means
+  - geometry_wkt is the full polyline of the chain
+  - node_path keeps the original node sequence, so a route over the simplified
+    graph maps back to the original (from_node, to_node) segments, and
+    segment_ids keeps the original way ids in order
+
+Usage:
+  python graph_simplify.py [segments.csv] [out.csv]
+"""
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import networkx as nx
+from shapely.geometry import LineString
+
+from datalink_pipeline import OUT_DIR, build_graph_from_edges_df
+
+# -----------------------
+# CONFIG
+# -----------------------
+# attributes that must be equal along a chain for it to be merged
+COMPAT_ATTRS = [
+    "road_type", "lane_count", "speed_limit_kph", "toll", "surface_type",
+    "lit", "one_way", "event_blocked", "vip_blocked", "closed_for_construction",
+]
+
+# attributes aggregated as a length-weighted mean over the chain
+WEIGHTED_ATTRS = [
+    "road_quality", "surface_quality", "foot_traffic_score",
+    "historical_congestion", "pothole_risk", "accident_risk",
+]
+
+NODE_PATH_SEP = "|"
+SEGMENT_IDS_SEP = ";"
+# -----------------------
+
+
+def compat_key(data: Dict) -> Tuple:
+    return tuple(data.get(a) for a in COMPAT_ATTRS)
+
+
+def is_interior(G: nx.DiGraph, n) -> bool:
+    """
+    A node can be contracted if it sits in the middle of a simple chain:
+    either one-way (1 in, 1 out, from different neighbours) or two-way
+    (the same 2 neighbours on both sides), and the edges passing through it
+    in each direction have compatible attributes.
+    """
+    preds = set(G.predecessors(n))
+    succs = set(G.successors(n))
+    if len(preds) == 1 and len(succs) == 1:
+        (a,), (b,) = preds, succs
+        if a == b:
+            return False
+        return compat_key(G.edges[a, n]) == compat_key(G.edges[n, b])
+    if len(preds) == 2 and preds == succs:
+        a, b = preds
+        return (compat_key(G.edges[a, n]) == compat_key(G.edges[n, b]) and
+                compat_key(G.edges[b, n]) == compat_key(G.edges[n, a]))
+    return False
+
+
+def _walk_chain(G: nx.DiGraph, u, v, interior) -> List:
+    """Follow u -> v through interior nodes until the next non-interior node."""
+    path = [u, v]
+    while v in interior and v != path[0]:
+        nxt = [w for w in G.successors(v) if w != path[-2]]
+        if len(nxt) != 1:
+            break
+        v = nxt[0]
+        path.append(v)
+    return path
+
+
+def merge_chain_attrs(G: nx.DiGraph, path: List) -> Dict:
+    """Aggregate the attributes of the edges along a node path into one edge."""
+    edges = [G.edges[a, b] for a, b in zip(path[:-1], path[1:])]
+    first = edges[0]
+    merged = dict(first)
+
+    lengths = [float(e.get("length_m", 0.0)) for e in edges]
+    total = sum(lengths)
+    merged["length_m"] = total
+    for attr in WEIGHTED_ATTRS:
+        if attr not in first:
+            continue
+        if total > 0:
+            merged[attr] = sum(float(e[attr]) * l for e, l in zip(edges, lengths)) / total
+        else:
+            merged[attr] = sum(float(e[attr]) for e in edges) / len(edges)
+
+    coords = [(G.nodes[n]["lon"], G.nodes[n]["lat"]) for n in path]
+    merged["geometry_wkt"] = LineString(coords).wkt
+
+    segment_ids = []
+    for e in edges:
+        sid = str(e.get("segment_id"))
+        if not segment_ids or segment_ids[-1] != sid:
+            segment_ids.append(sid)
+    merged["segment_ids"] = segment_ids
+    merged["node_path"] = list(path)
+    if "normalized_ts" in first:
+        merged["normalized_ts"] = max(str(e["normalized_ts"]) for e in edges)
+    return merged
+
+
+def simplify_graph(G: nx.DiGraph) -> nx.DiGraph:
+    """Return a new graph with compatible degree-2 chains contracted into single edges."""
+    interior = {n for n in G.nodes if is_interior(G, n)}
+    H = nx.DiGraph()
+    covered = set()
+
+    def add(path):
+        u, v = path[0], path[-1]
+        for n in (u, v):
+            if not H.has_node(n):
+                H.add_node(n, **G.nodes[n])
+        H.add_edge(u, v, **merge_chain_attrs(G, path))
+
+    def emit(path):
+        for a, b in zip(path[:-1], path[1:]):
+            covered.add((a, b))
+        u, v = path[0], path[-1]
+        if H.has_edge(u, v):
+            # parallel roads between the same two junctions: a DiGraph holds one edge
+            # per node pair, so one of them is cut at its first interior node
+            if len(path) == 2:
+                longer = H.edges[u, v]["node_path"]
+                H.remove_edge(u, v)
+                add(path)
+                path = longer
+            add(path[:2])
+            add(path[1:])
+            return
+        add(path)
+
+    for u in G.nodes:
+        if u in interior:
+            continue
+        for v in G.successors(u):
+            if (u, v) not in covered:
+                emit(_walk_chain(G, u, v, interior))
+
+    # isolated loops made only of interior nodes: cut them open at an arbitrary node
+    for u, v in G.edges:
+        if (u, v) not in covered:
+            interior.discard(u)
+            emit(_walk_chain(G, u, v, interior))
+
+    return H
+
+
+def simplified_edges_df(H: nx.DiGraph) -> pd.DataFrame:
+    """Edge table of a simplified graph, with node_path / segment_ids flattened to strings."""
+    rows = []
+    for u, v, data in H.edges(data=True):
+        row = data.copy()
+        row["node_path"] = NODE_PATH_SEP.join(row["node_path"])
+        row["segment_ids"] = SEGMENT_IDS_SEP.join(row["segment_ids"])
+        row["from_node"] = u
+        row["to_node"] = v
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def simplify_segments_df(df_edges: pd.DataFrame) -> pd.DataFrame:
+    """Convenience wrapper: segments_features-style edge table in, simplified table out."""
+    G = build_graph_from_edges_df(df_edges)
+    return simplified_edges_df(simplify_graph(G))
+
+
+def split_node_path(node_path: str) -> List[str]:
+    return node_path.split(NODE_PATH_SEP)
+
+
+def expand_route(node_path: List, edge_paths: Dict[Tuple, List]) -> List[Tuple]:
+    """
+    Map a route over the simplified graph back to the original segments.
+    edge_paths maps a simplified (u, v) edge to its original node path.
+    Returns the list of original (from_node, to_node) pairs in travel order.
+    """
+    segments = []
+    for u, v in zip(node_path[:-1], node_path[1:]):
+        full = edge_paths.get((u, v), [u, v])
+        segments.extend(zip(full[:-1], full[1:]))
+    return segments
+
+
+if __name__ == "__main__":
+    in_csv = sys.argv[1] if len(sys.argv) > 1 else os.path.join(OUT_DIR, "segments_features.csv")
+    out_csv = sys.argv[2] if len(sys.argv) > 2 else os.path.join(OUT_DIR, "segments_simplified.csv")
+    df = pd.read_csv(in_csv, dtype={"segment_id": str})
+    G = build_graph_from_edges_df(df)
+    H = simplify_graph(G)
+    simplified_edges_df(H).to_csv(out_csv, index=False)
+    print(f"Nodes: {G.number_of_nodes()} -> {H.number_of_nodes()}, "
+          f"edges: {G.number_of_edges()} -> {H.number_of_edges()}")
+    print("Saved simplified graph to:", out_csv)
@@ -0,0 +1,196 @@
+"""
+http_client.py
+
+Shared HTTP client for every external fetcher (Overpass, TomTom, Twitter, Nominatim).
+
+- one pooled requests.Session per process (keep-alive, connection reuse)
+- a default timeout on every call
+- retries on connection errors, 429 and 5xx with jittered exponential backoff;
+  a 429/5xx is never retried sooner than RETRY_MIN_INTERVAL_S, or than its
+  Retry-After (seconds or HTTP date), and the wait applies to every request to
+  that host, not just the one that was refused; a Retry-After longer than
+  BACKOFF_MAX_S is not shortened: the response is returned without retrying
+- a per-host concurrency limit
+- per-host response timing metrics
+- async wrappers (aget / apost) for the asyncio daemon, running the pooled
+  session in worker threads
+
+Usage:
+  from http_client import get_client
+  resp = get_client().get(url, params=..., timeout=10)
+  print(get_client().metrics())
+"""
+import time
+import random
+import email.utils
+import asyncio
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_TIMEOUT_S = 15
+POOL_SIZE = 16
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+RETRY_MIN_INTERVAL_S = 1.0   # floor on the wait after a 429/5xx
+PER_HOST_CONCURRENCY = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "navai-datalink/1.0"
+# -----------------------------
+
+
+class HttpClient:
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT_S, pool_size: int = POOL_SIZE,
+                 max_retries: int = MAX_RETRIES, backoff_base_s: float = BACKOFF_BASE_S,
+                 backoff_max_s: float = BACKOFF_MAX_S, per_host_concurrency: int = PER_HOST_CONCURRENCY,
+                 retry_min_interval_s: float = RETRY_MIN_INTERVAL_S):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.retry_min_interval_s = retry_min_interval_s
+        self.per_host_concurrency = per_host_concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+
+        self._lock = threading.Lock()
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_ready: Dict[str, float] = {}  # host -> monotonic time before which it is not called
+        self._metrics: Dict[str, Dict] = {}
+
+    def _host_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+            return self._host_limits[host]
+
+    def _record(self, host: str, elapsed_ms: float, status: Optional[int], retried: bool):
+        with self._lock:
+            m = self._metrics.setdefault(host, {
+                "requests": 0, "retries": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "statuses": {},
+            })
+            m["requests"] += 1
+            m["retries"] += 1 if retried else 0
+            m["total_ms"] += elapsed_ms
+            m["max_ms"] = max(m["max_ms"], elapsed_ms)
+            if status is None:
+                m["errors"] += 1
+            else:
+                m["statuses"][status] = m["statuses"].get(status, 0) + 1
+
+    def _wait_for_host(self, host: str):
+        with self._lock:
+            ready = self._host_ready.get(host, 0.0)
+        wait = ready - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _hold_host(self, host: str, delay: float):
+        with self._lock:
+            self._host_ready[host] = max(self._host_ready.get(host, 0.0), time.monotonic() + delay)
+
+    @staticmethod
+    def _retry_after(resp: requests.Response) -> Optional[float]:
+        """Retry-After as seconds from now: delta-seconds or an HTTP date."""
+        value = (resp.headers.get("Retry-After") or "").strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(when.timestamp() - time.time(), 0.0) if when is not None else None
+
+    def _backoff(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        # "full jitter" exponential backoff
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+        if resp is None:  # connection error / timeout: nothing says the host is overloaded
+            return delay
+        retry_after = self._retry_after(resp)
+        if retry_after is not None:
+            return max(retry_after, self.retry_min_interval_s)  # never shorter than the server asked
+        return max(delay, self.retry_min_interval_s)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request with retries. Returns the final response (which may still be
+        a 429/5xx once retries are exhausted, or at once if its Retry-After exceeds
+        backoff_max_s); raises requests.RequestException if
+        the last attempt failed without a response.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+        limit = self._host_limit(host)
+        attempt = 0
+        while True:
+            resp, error = None, None
+            with limit:
+                self._wait_for_host(host)
+                t0 = time.perf_counter()
+                try:
+                    resp = self.session.request(method, url, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            self._record(host, elapsed_ms, resp.status_code if resp is not None else None, attempt > 0)
+
+            retryable = error is not None or resp.status_code in RETRY_STATUSES
+            if retryable and resp is not None:
+                # the host refused or failed: nobody in this process calls it again before the backoff
+                delay = self._backoff(attempt, resp)
+                self._hold_host(host, delay)
+                if delay > self.backoff_max_s:
+                    return resp  # longer than we wait within a call: hand the refusal to the caller
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return resp
+            if resp is None:
+                time.sleep(self._backoff(attempt, None))
+            else:
+                self._wait_for_host(host)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    async def aget(self, url: str, **kwargs) -> requests.Response:
+        return await asyncio.to_thread(self.request, "GET", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> requests.Response:
+        return await asyncio.to_thread(self.request, "POST", url, **kwargs)
+
+    def metrics(self) -> Dict[str, Dict]:
+        with self._lock:
+            out = {}
+            for host, m in self._metrics.items():
+                out[host] = dict(m, statuses=dict(m["statuses"]),
+                                 mean_ms=round(m["total_ms"] / m["requests"], 2) if m["requests"] else 0.0)
+            return out
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Process-wide shared client, so all fetchers share one connection pool."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient()
+        return _CLIENT
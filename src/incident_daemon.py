@@ -0,0 +1,434 @@
+"""
+incident_daemon.py
+
+Long-running asyncio service that replaces the run-once ingest scripts.
+
+- Polls each incident source (TomTom, Twitter, or a fake source for offline runs)
+  on its own schedule.
+- Maps incidents onto road segments along their full geometry with an in-memory
+  SegmentIndex that is built once at startup, instead of reloading the CSV and
+  rebuilding the node table per run.
+- Publishes incident deltas (one JSON object per incident: source, id, flags,
+  validity window and the affected (from_node, to_node) edges) to a JSONL file
+  and/or a local UDP socket. routing_logic.apply_incident_deltas() tails the file.
+- Fuses every polled batch with the live reports of all sources
+  (incident_fusion.fuse_incidents), so an incident reported by TomTom and Twitter
+  is published once, as a "fusion" incident keyed by its earliest report.
+- Tracks live incidents in an IncidentStore, so an incident that keeps being
+  reported is re-published with a refreshed validity instead of being deduped
+  forever, and expired ones drop out.
+- Periodically compacts the delta log into incident_snapshot.json
+  (incident_log.compact), and resumes from snapshot + log on restart.
+- Keeps per-source metrics (poll latency, incidents seen / applied, edges flagged),
+  printed and written to incident_daemon_metrics.json after every poll, together
+  with the shared HTTP client's per-host timings.
+
+Usage:
+  python incident_daemon.py            # TomTom + Twitter
+  python incident_daemon.py --fake     # offline, synthetic incidents
+  python incident_daemon.py --fake --once
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import random
+import socket
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from segment_index import SegmentIndex
+from tweet_classifier import Gazetteer, TweetClassifier
+from incident_store import IncidentStore, default_ttl_s, flags_to_mask, parse_time, format_time
+from incident_fusion import fuse_incidents, fused_record, match_incidents
+from incident_log import append_events, compact, load_current_store, SNAPSHOT_FILE
+from http_client import get_client
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+SEGMENTS_CSV = "datalink_output/segments_features.csv"
+DELTA_LOG = "datalink_output/incident_deltas.jsonl"
+METRICS_FILE = "datalink_output/incident_daemon_metrics.json"
+# fold the delta log into incident_snapshot.json this often (see incident_log.py); None disables
+COMPACT_INTERVAL_S = 15 * 60
+
+# optional UDP publish target, e.g. ("127.0.0.1", 9917); None disables it
+DELTA_SOCKET = None
+
+TOMTOM_POLL_S = 120
+TWITTER_POLL_S = 300
+FAKE_POLL_S = 5
+
+FLAG_COLUMNS = ("event_blocked", "vip_blocked", "closed_for_construction")
+# -----------------------------
+
+
+def now_iso():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+# -----------------------------
+# Incident sources
+# -----------------------------
+# A source polls once and returns a list of incident dicts:
+#   {"id": str, "flags": [flag column, ...], "points": [(lat, lon), ...],
+#    "description": str, "start": optional time, "end": optional time}
+
+class IncidentSource:
+    name = "base"
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+
+    async def poll(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def commit(self):
+        """Called after the last poll's incidents were published (e.g. to move a watermark)."""
+        pass
+
+
+class TomTomSource(IncidentSource):
+    name = "tomtom"
+
+    def __init__(self, bbox, interval_s: float = TOMTOM_POLL_S):
+        super().__init__(interval_s)
+        self.bbox = bbox
+
+    async def poll(self) -> List[Dict]:
+        import tomtom_incidents_ingest as tt
+        raw = await asyncio.to_thread(tt.fetch_tomtom_incidents, self.bbox)
+        incidents = []
+        for inc in raw:
+            props = inc.get("properties", {})
+            desc = props.get("description", "") or ""
+            pts = tt.extract_incident_points(inc)
+            if not pts:
+                continue
+            incidents.append({
+                # hash() is salted per process; the fallback id must be the same across restarts
+                "id": str(props.get("id") or inc.get("id")
+                          or hashlib.sha1(json.dumps([desc, pts]).encode("utf-8")).hexdigest()),
+                "flags": [tt.incident_type_from_icon_category(props.get("iconCategory", 0), desc)],
+                # full geometry in travel order, matched by SegmentIndex.match_polyline
+                "points": pts,
+                "description": desc,
+                "start": props.get("startTime"),
+                "end": props.get("endTime"),
+            })
+        return incidents
+
+
+class TwitterSource(IncidentSource):
+    """
+    One account's timeline. Each poll fetches only tweets newer than the account's
+    since_id watermark (shared with twitter_incidents_ingest.py), and the
+    watermark moves in commit(), once the incidents have been published. A tweet
+    whose geocoding failed holds the watermark just below it, so it is retried.
+    """
+    name = "twitter"
+
+    def __init__(self, username: str, city: str = "Bengaluru", interval_s: float = TWITTER_POLL_S,
+                 gazetteer: Optional[Gazetteer] = None):
+        super().__init__(interval_s)
+        self.name = f"twitter:{username}"
+        self.username = username
+        self.city = city
+        self.classifier = TweetClassifier(gazetteer)
+        self.geocoder = None
+        self.fetched = None
+        self.hold_below = None  # oldest tweet id whose geocoding must be retried
+
+    async def poll(self) -> List[Dict]:
+        import twitter_incidents_ingest as tw
+        if self.geocoder is None:
+            self.geocoder = tw.get_geocoder()
+        fetched = await asyncio.to_thread(tw.fetch_account, self.username, tw.load_watermarks())
+        tweets = fetched["tweets"]
+        candidates = []
+        for tweet in tweets:
+            text = tweet.get("text", "")
+            result = self.classifier.classify(text)
+            if result is not None and result["location_hint"]:
+                candidates.append((tweet, text, result))
+
+        # road names from the gazetteer are already located; geocode the rest
+        geos = await asyncio.gather(*(
+            self._known(r) if r["place"] else self.geocoder.geocode(r["location_hint"], self.city)
+            for *_, r in candidates))
+        incidents = []
+        hold_below = None
+        for (tweet, text, result), geo in zip(candidates, geos):
+            flags = result["flags"]
+            if not geo and self.geocoder.lookup_failed(result["location_hint"], self.city):
+                tweet_id = int(tweet["id"])
+                hold_below = tweet_id if hold_below is None else min(hold_below, tweet_id)
+                continue
+            geo = self.classifier.snap(result, geo)
+            if not geo:
+                continue
+            incidents.append({
+                "id": str(tweet.get("id")),
+                "flags": [tw.FLAG_COLUMNS[k] for k, on in flags.items() if on],
+                "points": [geo],
+                "description": text,
+                "start": tweet.get("created_at"),
+            })
+        # only a poll that completed may move the watermark (in commit())
+        self.fetched = fetched
+        self.hold_below = hold_below
+        return incidents
+
+    @staticmethod
+    async def _known(result: Dict):
+        return result["lat"], result["lon"]
+
+    def commit(self):
+        import twitter_incidents_ingest as tw
+        if self.fetched is None:
+            return
+        # re-read so concurrent sources for other accounts are not overwritten
+        watermarks = tw.load_watermarks()
+        tw.advance_watermark(watermarks, self.fetched, self.hold_below)
+        tw.save_watermarks(watermarks)
+        self.fetched = None
+        self.hold_below = None
+
+
+class FakeSource(IncidentSource):
+    """
+    Offline source. Either replays scripted batches (one list of incidents per poll)
+    or, when given a SegmentIndex, invents incidents on random graph nodes.
+    """
+    name = "fake"
+
+    def __init__(self, batches: Optional[List[List[Dict]]] = None, index: Optional[SegmentIndex] = None,
+                 per_poll: int = 3, interval_s: float = FAKE_POLL_S, seed: int = 42):
+        super().__init__(interval_s)
+        self.batches = list(batches) if batches else []
+        self.node_ids = list(index.nodes) if index is not None else []
+        self.coords = index.nodes if index is not None else {}
+        self.per_poll = per_poll
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    async def poll(self) -> List[Dict]:
+        if self.batches:
+            return self.batches.pop(0)
+        incidents = []
+        for _ in range(self.per_poll if self.node_ids else 0):
+            nid = self.rng.choice(self.node_ids)
+            self.counter += 1
+            incidents.append({
+                "id": f"fake-{self.counter}",
+                "flags": [self.rng.choice(FLAG_COLUMNS)],
+                "points": [self.coords[nid]],
+                "description": "synthetic incident",
+            })
+        return incidents
+
+# -----------------------------
+# Delta publishing
+# -----------------------------
+class DeltaPublisher:
+    """Appends deltas to the incident event log and optionally sends each one as a UDP datagram."""
+
+    def __init__(self, path: Optional[str] = DELTA_LOG, udp_target: Optional[Tuple[str, int]] = DELTA_SOCKET):
+        self.path = path
+        self.udp_target = udp_target
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if udp_target else None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def publish(self, deltas: List[Dict]):
+        if not deltas:
+            return
+        if self.path:
+            append_events(deltas, self.path)
+        if self.sock is not None:
+            for d in deltas:
+                self.sock.sendto(json.dumps(d, separators=(",", ":")).encode("utf-8"), self.udp_target)
+
+# -----------------------------
+# Daemon
+# -----------------------------
+class IncidentDaemon:
+    def __init__(self, index: SegmentIndex, sources: List[IncidentSource], publisher: DeltaPublisher,
+                 metrics_path: Optional[str] = METRICS_FILE, compact_interval_s: Optional[float] = COMPACT_INTERVAL_S):
+        self.index = index
+        self.sources = sources
+        self.publisher = publisher
+        self.metrics_path = metrics_path
+        self.compact_interval_s = compact_interval_s
+        self.last_compact = time.monotonic()
+        # resume from what earlier runs already published, so live incidents are not re-sent
+        self.store = load_current_store(publisher.path, SNAPSHOT_FILE) if publisher.path else IncidentStore()
+        # every source's live reports, matched to segment rows: (source, id) -> report
+        self.reports: Dict[Tuple[str, str], Dict] = {}
+        self.metrics = {
+            s.name: {"polls": 0, "poll_errors": 0, "last_poll_ms": 0.0, "total_poll_ms": 0.0,
+                     "incidents_seen": 0, "incidents_applied": 0, "incidents_refreshed": 0,
+                     "edges_flagged": 0}
+            for s in sources
+        }
+
+    @staticmethod
+    def validity(incident: Dict, now: float) -> Tuple[float, float]:
+        start = parse_time(incident.get("start")) or now
+        end = parse_time(incident.get("end")) or max(start, now) + default_ttl_s(incident["flags"])
+        return start, end
+
+    def needs_publish(self, delta: Dict, explicit_end: bool, now: float) -> bool:
+        """New incidents, changed flags / edges / explicit end times, and implicit-TTL ones past half their TTL."""
+        entry = self.store.entries.get((delta["source"], delta["incident_id"]))
+        if entry is None:
+            return True
+        if entry["mask"] != flags_to_mask(delta["flags"]) or set(entry["edges"]) != {tuple(e) for e in delta["edges"]}:
+            return True
+        if explicit_end:
+            return parse_time(delta["end"]) != entry["end"]
+        return entry["end"] - now < default_ttl_s(delta["flags"]) / 2
+
+    def match_report(self, source_name: str, incident: Dict, now: float) -> Dict:
+        """Resolve a report to the segments along its geometry (one batched index query)."""
+        matched = match_incidents(self.index, source_name, [incident], now)
+        report = matched[0] if matched else {
+            "source": source_name, "id": incident["id"], "flags": incident["flags"], "rows": [],
+            "t": parse_time(incident.get("start")) or now, "description": incident.get("description", ""),
+        }
+        report["id"] = str(report["id"])
+        report["explicit_end"] = parse_time(incident.get("end")) is not None
+        report["end"] = self.validity(incident, now)[1]
+        return report
+
+    def fused_delta(self, fused: Dict, now: float) -> Dict:
+        """Delta for a fused incident; keeps the id it was published under if its earliest member changed."""
+        delta = fused_record(self.index, fused)
+        delta["ts"] = format_time(now)
+        for source_name, incident_id in fused["members"]:
+            fused_id = f"{source_name}/{incident_id}"
+            if ("fusion", fused_id) in self.store.entries:
+                delta["incident_id"] = fused_id
+                break
+        return delta
+
+    async def poll_once(self, source: IncidentSource) -> int:
+        m = self.metrics[source.name]
+        t0 = time.perf_counter()
+        try:
+            incidents = await source.poll()
+        except Exception as e:
+            m["poll_errors"] += 1
+            print(f"[{source.name}] poll failed: {e}")
+            return 0
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            m["polls"] += 1
+            m["last_poll_ms"] = round(elapsed_ms, 2)
+            m["total_poll_ms"] += elapsed_ms
+
+        now = time.time()
+        self.store.advance(now)
+        batch = set()
+        for inc in incidents:
+            key = (source.name, str(inc["id"]))
+            report = self.reports.get(key)
+            if report is None:
+                # unmatched reports are kept too, so they are not re-matched on every poll
+                report = self.reports[key] = self.match_report(source.name, inc, now)
+                m["incidents_seen"] += 1
+                m["incidents_applied"] += 1 if len(report["rows"]) else 0
+            else:
+                report["end"] = self.validity(inc, now)[1]
+                m["incidents_refreshed"] += 1
+            if len(report["rows"]):
+                batch.add(key)
+        for key in [k for k, r in self.reports.items() if r["end"] <= now]:
+            del self.reports[key]
+
+        # fuse this batch with the live reports of every source, so a closure reported
+        # by TomTom and Twitter is published once, as a "fusion" incident
+        live = [r for r in self.reports.values() if len(r["rows"])]
+        deltas = []
+        for fused in fuse_incidents(live):
+            if batch.isdisjoint(fused["members"]):
+                continue
+            delta = self.fused_delta(fused, now)
+            explicit_end = all(self.reports[k]["explicit_end"] for k in fused["members"])
+            if not self.needs_publish(delta, explicit_end, now):
+                continue
+            self.store.apply_delta(delta)
+            deltas.append(delta)
+            m["edges_flagged"] += len(delta["edges"])
+
+        self.publisher.publish(deltas)
+        source.commit()
+        self.maybe_compact()
+        self.write_metrics()
+        print(f"[{source.name}] poll {m['polls']}: {len(incidents)} incidents, "
+              f"{len(deltas)} new deltas, {m['last_poll_ms']:.1f} ms")
+        return len(deltas)
+
+    def maybe_compact(self):
+        if not self.publisher.path or self.compact_interval_s is None:
+            return
+        if time.monotonic() - self.last_compact < self.compact_interval_s:
+            return
+        self.last_compact = time.monotonic()
+        stats = compact(self.publisher.path, SNAPSHOT_FILE)
+        print(f"Compacted incident log: {stats}")
+
+    def write_metrics(self):
+        if not self.metrics_path:
+            return
+        out = {}
+        for name, m in self.metrics.items():
+            out[name] = dict(m, mean_poll_ms=round(m["total_poll_ms"] / m["polls"], 2) if m["polls"] else 0.0)
+        with open(self.metrics_path, "w", encoding="utf-8") as f:
+            json.dump({"updated": now_iso(), "sources": out, "active_incidents": len(self.store),
+                       "http": get_client().metrics()}, f, indent=2)
+
+    async def _run_source(self, source: IncidentSource, iterations: Optional[int]):
+        n = 0
+        while iterations is None or n < iterations:
+            await self.poll_once(source)
+            n += 1
+            if iterations is None or n < iterations:
+                await asyncio.sleep(source.interval_s)
+
+    async def run(self, iterations: Optional[int] = None):
+        """Poll every source on its own schedule; iterations=None runs forever."""
+        await asyncio.gather(*(self._run_source(s, iterations) for s in self.sources))
+
+
+def main():
+    if not os.path.exists(SEGMENTS_CSV):
+        print(f"Error: {SEGMENTS_CSV} not found. Run datalink_pipeline.py first.")
+        return
+
+    print(f"Loading segments from: {SEGMENTS_CSV}")
+    index = SegmentIndex(pd.read_csv(SEGMENTS_CSV, dtype={"segment_id": str}))
+    print(f"Indexed {len(index.nodes)} nodes.")
+
+    if "--fake" in sys.argv:
+        sources = [FakeSource(index=index)]
+    else:
+        import tomtom_incidents_ingest as tt
+        import twitter_incidents_ingest as tw
+        gazetteer = Gazetteer.from_segments(index.df)
+        print(f"Gazetteer: {len(gazetteer)} road names.")
+        sources = [TomTomSource(tt.BBOX)]
+        sources += [TwitterSource(u, gazetteer=gazetteer) for u in tw.TRAFFIC_USERNAMES]
+
+    daemon = IncidentDaemon(index, sources, DeltaPublisher())
+    try:
+        asyncio.run(daemon.run(iterations=1 if "--once" in sys.argv else None))
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+incident_fusion.py
+
+Cross-source incident fusion: one pass over TomTom and Twitter instead of running
+both ingest scripts in sequence, each flagging the same edges and rewriting the CSV.
+
+1. Every source is polled (the incident_daemon sources are reused, so Twitter is
+   read incrementally from its since_id watermark) and every incident is matched
+   to segment rows with the SegmentIndex.
+2. fuse_incidents() clusters incidents that overlap in space (shared segment rows)
+   and time (start times within FUSION_WINDOW_S). Incidents are swept in start
+   order; only clusters seen within the window stay active, and an inverted
+   row -> cluster map finds the candidates, so the cost is near-linear in the
+   number of incidents and matched rows.
+3. Each cluster becomes one fused incident: flags are kept when their combined
+   per-source confidence, 1 - prod(1 - c), reaches MIN_FLAG_CONFIDENCE; rows
+   are the union of the members' rows, and validity spans all members.
+4. Fused incidents are appended to the incident event log (incident_log.py),
+   one record each, so a refresh writes in proportion to the number of incidents.
+   With --materialize the enriched CSV is also written, with all fused incidents
+   applied in one scatter write per flag.
+
+Usage:
+  python incident_fusion.py [--materialize]
+"""
+import os
+import sys
+import time
+import heapq
+import asyncio
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from segment_index import SegmentIndex, apply_edge_flags
+from incident_store import parse_time, format_time
+from incident_log import append_events
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+INPUT_CSV = "datalink_output/segments_features.csv"
+OUTPUT_CSV = "datalink_output/segments_features_enriched_fused.csv"
+
+FUSION_WINDOW_S = 2 * 3600      # reports further apart than this are separate incidents
+MIN_EDGE_OVERLAP = 0.3          # shared rows / rows of the smaller incident
+MIN_FLAG_CONFIDENCE = 0.5
+
+# how much a single report from a source is trusted ("twitter:<account>" -> "twitter")
+SOURCE_CONFIDENCE = {"tomtom": 0.9, "twitter": 0.6, "fake": 0.5}
+DEFAULT_CONFIDENCE = 0.5
+# -----------------------------
+
+
+def source_confidence(source: str) -> float:
+    return SOURCE_CONFIDENCE.get(source.split(":", 1)[0], DEFAULT_CONFIDENCE)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_incidents(incidents: List[Dict], window_s: float = FUSION_WINDOW_S,
+                      min_overlap: float = MIN_EDGE_OVERLAP) -> List[List[int]]:
+    """
+    Groups incidents (dicts with "rows" and "t") into clusters of indices. Two
+    incidents join when their start times are within window_s of the cluster's
+    latest member and their rows overlap by at least min_overlap of the smaller set.
+    """
+    order = sorted(range(len(incidents)), key=lambda i: incidents[i]["t"])
+    parent: List[int] = []
+    rows: List[set] = []
+    last_t: List[float] = []
+    members: List[List[int]] = []
+    owner: Dict[int, int] = {}   # row -> cluster id, active clusters only
+    expiry = []                  # (last_t, cluster id); stale items are skipped
+
+    for i in order:
+        inc = incidents[i]
+        t = inc["t"]
+        while expiry and expiry[0][0] < t - window_s:
+            lt, c = heapq.heappop(expiry)
+            if _find(parent, c) != c or last_t[c] != lt:
+                continue
+            for r in rows[c]:
+                if owner.get(r) == c:
+                    del owner[r]
+
+        inc_rows = set(int(r) for r in inc["rows"])
+        candidates = {_find(parent, owner[r]) for r in inc_rows if r in owner}
+        joined = [c for c in candidates
+                  if len(inc_rows & rows[c]) >= min_overlap * min(len(inc_rows), len(rows[c]))]
+
+        if not joined:
+            c = len(parent)
+            parent.append(c)
+            rows.append(set())
+            last_t.append(t)
+            members.append([])
+        else:
+            # merge smaller clusters into the largest one
+            joined.sort(key=lambda k: len(rows[k]), reverse=True)
+            c = joined[0]
+            for other in joined[1:]:
+                parent[other] = c
+                for r in rows[other]:
+                    owner[r] = c
+                rows[c] |= rows[other]
+                members[c].extend(members[other])
+                last_t[c] = max(last_t[c], last_t[other])
+                rows[other], members[other] = set(), []
+
+        members[c].append(i)
+        rows[c] |= inc_rows
+        for r in inc_rows:
+            owner[r] = c
+        last_t[c] = max(last_t[c], t)
+        heapq.heappush(expiry, (last_t[c], c))
+
+    return [m for c, m in enumerate(members) if parent[c] == c and m]
+
+
+def merge_cluster(incidents: List[Dict], member_idx: List[int]) -> Optional[Dict]:
+    """One fused incident from a cluster, or None if no flag is confident enough."""
+    # members in start order: after a union-find merge the cluster's list is not
+    group = sorted((incidents[i] for i in member_idx), key=lambda inc: (inc["t"], inc["source"], str(inc["id"])))
+    miss = {}
+    for inc in group:
+        c = source_confidence(inc["source"])
+        for flag in inc["flags"]:
+            miss[flag] = miss.get(flag, 1.0) * (1.0 - c)
+    confidence = {flag: round(1.0 - m, 4) for flag, m in miss.items()}
+    flags = [f for f, c in confidence.items() if c >= MIN_FLAG_CONFIDENCE]
+    if not flags:
+        return None
+
+    ends = [inc["end"] for inc in group if inc.get("end") is not None]
+    best = max(group, key=lambda inc: source_confidence(inc["source"]))
+    return {
+        "sources": sorted({inc["source"] for inc in group}),
+        "members": [(inc["source"], inc["id"]) for inc in group],
+        "flags": flags,
+        "confidence": confidence,
+        "rows": np.unique(np.concatenate([np.asarray(inc["rows"], dtype=np.int64) for inc in group])),
+        "start": min(inc["t"] for inc in group),
+        "end": max(ends) if ends else None,
+        "description": best.get("description", ""),
+    }
+
+
+def fuse_incidents(incidents: List[Dict], window_s: float = FUSION_WINDOW_S,
+                   min_overlap: float = MIN_EDGE_OVERLAP) -> List[Dict]:
+    fused = []
+    for member_idx in cluster_incidents(incidents, window_s, min_overlap):
+        merged = merge_cluster(incidents, member_idx)
+        if merged is not None:
+            fused.append(merged)
+    return fused
+
+
+def apply_fused(df: pd.DataFrame, fused: List[Dict]) -> Dict[str, int]:
+    """All fused incidents in one scatter write per flag column."""
+    return apply_edge_flags(df, [(f["rows"], flag) for f in fused for flag in f["flags"]])
+
+
+def fused_record(index: SegmentIndex, fused: Dict) -> Dict:
+    """Event-log record for a fused incident, keyed by its earliest member so it stays stable."""
+    source, incident_id = fused["members"][0]
+    return {
+        "ts": format_time(time.time()),
+        "source": "fusion",
+        "incident_id": f"{source}/{incident_id}",
+        "flags": fused["flags"],
+        "start": format_time(fused["start"]),
+        "end": format_time(fused["end"]) if fused["end"] else None,
+        "edges": [list(k) for k in index.edge_keys(fused["rows"])],
+        "sources": fused["sources"],
+        "confidence": fused["confidence"],
+        "description": fused["description"],
+    }
+
+
+def match_incidents(index: SegmentIndex, source_name: str, raw: List[Dict], now: float) -> List[Dict]:
+    """Source incidents (incident_daemon format) -> incidents with matched rows and a start time."""
+    out = []
+    for inc in raw:
+        rows = index.match_polyline(inc["points"])
+        if not len(rows):
+            continue
+        out.append({
+            "source": source_name, "id": inc["id"], "flags": inc["flags"], "rows": rows,
+            "t": parse_time(inc.get("start")) or now, "end": parse_time(inc.get("end")),
+            "description": inc.get("description", ""),
+        })
+    return out
+
+
+async def poll_sources(sources) -> List[List[Dict]]:
+    async def poll(source):
+        try:
+            return await source.poll()
+        except Exception as e:
+            print(f"[{source.name}] poll failed: {e}")
+            return []
+    return await asyncio.gather(*(poll(s) for s in sources))
+
+
+def main():
+    import tomtom_incidents_ingest as tt
+    import twitter_incidents_ingest as tw
+    from incident_daemon import TomTomSource, TwitterSource
+    from tweet_classifier import Gazetteer
+
+    if not os.path.exists(INPUT_CSV):
+        print(f"Error: {INPUT_CSV} not found. Run datalink_pipeline.py first.")
+        return
+    print(f"Loading base data from: {INPUT_CSV}")
+    df = pd.read_csv(INPUT_CSV, dtype={"segment_id": str})
+    index = SegmentIndex(df)
+    print("Unique nodes:", len(index.nodes))
+
+    gazetteer = Gazetteer.from_segments(df)
+    sources = [TomTomSource(tt.BBOX)] + [TwitterSource(u, gazetteer=gazetteer) for u in tw.TRAFFIC_USERNAMES]
+    polled = asyncio.run(poll_sources(sources))
+
+    now = time.time()
+    incidents = []
+    for source, raw in zip(sources, polled):
+        matched = match_incidents(index, source.name, raw, now)
+        print(f"[{source.name}] {len(raw)} incidents, {len(matched)} matched to segments")
+        incidents.extend(matched)
+
+    fused = fuse_incidents(incidents)
+    print(f"\nFused {len(incidents)} incidents into {len(fused)}:")
+    for f in fused:
+        end = format_time(f["end"]) if f["end"] else "-"
+        print(f"  {f['flags']} from {f['sources']} on {len(f['rows'])} segments until {end} "
+              f"(confidence {f['confidence']})")
+
+    append_events([fused_record(index, f) for f in fused])
+    print(f"\nAppended {len(fused)} fused incidents to the incident event log.")
+    if "--materialize" in sys.argv:
+        applied = apply_fused(df, fused)
+        print("Flagged segments per flag:", applied)
+        df.to_csv(OUTPUT_CSV, index=False)
+        print(f"Final enriched data saved to: {OUTPUT_CSV}")
+
+    # the incidents are recorded: Twitter watermarks may move past the processed tweets
+    for source in sources:
+        source.commit()
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+incident_log.py
+
+Append-only incident event log with compaction.
+
+Incident ingestion (incident_daemon.py, incident_fusion.py) appends one compact
+JSON record per incident to the event log instead of rewriting the segment CSV:
+
+  {"ts", "source", "incident_id", "flags", "start", "end", "edges": [[from_node, to_node], ...]}
+
+Records are idempotent: a later record for the same (source, incident_id)
+replaces the earlier one. Current incident state is reconstructed as
+
+  snapshot (compacted base) + log tail
+
+compact() folds the log into the snapshot under a file lock: it replays snapshot
+and log into an IncidentStore, drops expired and superseded records, writes the
+still-relevant incidents as the new snapshot (with a bumped generation) and
+truncates the log. Both files scale with the number of incidents, not with the
+size of the road graph; segments_features.csv is only written by the pipeline.
+
+IncidentLogReader keeps a store up to date cheaply: it re-reads the snapshot only
+when the file was replaced and otherwise reads just the new bytes of the log.
+It holds the same lock while reading, so it never sees a snapshot without the
+matching log truncation.
+
+Usage:
+  python incident_log.py --compact
+  python incident_log.py --materialize   # write the enriched CSV for legacy readers
+"""
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform
+    fcntl = None
+
+from incident_store import IncidentStore, format_time, mask_to_flags
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+EVENT_LOG = "datalink_output/incident_deltas.jsonl"
+SNAPSHOT_FILE = "datalink_output/incident_snapshot.json"
+SEGMENTS_CSV = "datalink_output/segments_features.csv"
+MATERIALIZED_CSV = "datalink_output/segments_features_enriched_fused.csv"
+COMPACT_INTERVAL_S = 15 * 60
+# -----------------------------
+
+
+@contextmanager
+def log_lock(path: str = EVENT_LOG):
+    """Exclusive advisory lock shared by appenders and compaction (no-op without fcntl)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_events(records: List[Dict], path: str = EVENT_LOG):
+    if not records:
+        return
+    data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+    with log_lock(path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+
+def read_events(path: str, offset: int = 0):
+    """Complete records after byte offset; returns (records, new offset)."""
+    records = []
+    if not os.path.exists(path):
+        return records, offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # partially written record, pick it up next time
+            offset += len(line)
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records, offset
+
+
+def load_snapshot(path: str = SNAPSHOT_FILE) -> Dict:
+    if not os.path.exists(path):
+        return {"generation": 0, "compacted_at": None, "incidents": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def snapshot_generation(path: str = SNAPSHOT_FILE) -> int:
+    return load_snapshot(path)["generation"] if os.path.exists(path) else 0
+
+
+def store_records(store: IncidentStore) -> List[Dict]:
+    """The store's entries as event-log records (same shape as the daemon deltas)."""
+    return [{
+        "source": e["source"], "incident_id": e["incident_id"], "flags": mask_to_flags(e["mask"]),
+        "start": format_time(e["start"]), "end": format_time(e["end"]),
+        "edges": [list(edge) for edge in e["edges"]],
+    } for e in store.entries.values()]
+
+
+def compact(log_path: str = EVENT_LOG, snapshot_path: str = SNAPSHOT_FILE,
+            now: Optional[float] = None) -> Dict:
+    """Fold the log into the snapshot and truncate the log. Returns counts."""
+    now = time.time() if now is None else now
+    with log_lock(log_path):
+        snapshot = load_snapshot(snapshot_path)
+        records, _ = read_events(log_path)
+        store = IncidentStore()
+        for rec in snapshot["incidents"]:
+            store.apply_delta(rec)
+        for rec in records:
+            store.apply_delta(rec)
+        store.advance(now)
+
+        kept = store_records(store)
+        new_snapshot = {"generation": snapshot["generation"] + 1, "compacted_at": format_time(now),
+                        "incidents": kept}
+        tmp = snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(new_snapshot, f, separators=(",", ":"))
+        os.replace(tmp, snapshot_path)
+        # the snapshot holds everything now; appenders are blocked by the lock
+        open(log_path, "w").close()
+
+    return {"generation": new_snapshot["generation"], "log_records": len(records),
+            "snapshot_before": len(snapshot["incidents"]), "snapshot_after": len(kept)}
+
+
+class IncidentLogReader:
+    """Keeps an IncidentStore equal to snapshot + log, reading only what changed."""
+
+    def __init__(self, log_path: str = EVENT_LOG, snapshot_path: str = SNAPSHOT_FILE):
+        self.log_path = log_path
+        self.snapshot_path = snapshot_path
+        self.store = IncidentStore()
+        self.generation = -1
+        self.offset = 0
+        self._snapshot_id = None
+
+    def refresh(self) -> int:
+        """Apply new snapshot / log records; returns the number of records applied."""
+        applied = 0
+        with log_lock(self.log_path):
+            if os.path.exists(self.snapshot_path):
+                st = os.stat(self.snapshot_path)
+                snapshot_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+            else:
+                snapshot_id = None
+            if snapshot_id != self._snapshot_id:
+                self._snapshot_id = snapshot_id
+                snapshot = load_snapshot(self.snapshot_path)
+                if snapshot["generation"] != self.generation:
+                    # compaction happened: rebuild from the new base and re-read the (new) log
+                    self.store = IncidentStore()
+                    for rec in snapshot["incidents"]:
+                        self.store.apply_delta(rec)
+                    applied += len(snapshot["incidents"])
+                    self.generation = snapshot["generation"]
+                    self.offset = 0
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) < self.offset:
+                self.offset = 0  # truncated by hand; records are idempotent, so a replay is harmless
+            records, self.offset = read_events(self.log_path, self.offset)
+        for rec in records:
+            self.store.apply_delta(rec)
+        return applied + len(records)
+
+
+def load_current_store(log_path: str = EVENT_LOG, snapshot_path: str = SNAPSHOT_FILE,
+                       now: Optional[float] = None) -> IncidentStore:
+    reader = IncidentLogReader(log_path, snapshot_path)
+    reader.refresh()
+    reader.store.advance(now)
+    return reader.store
+
+
+def materialize(segments_csv: str = SEGMENTS_CSV, out_csv: str = MATERIALIZED_CSV) -> int:
+    """Write base segments with the current incident flags (a full rewrite; only on request)."""
+    import pandas as pd
+    df = pd.read_csv(segments_csv, dtype={"segment_id": str})
+    store = load_current_store()
+    store.apply_to_df(df)
+    df.to_csv(out_csv, index=False)
+    return len(store)
+
+
+def main():
+    if "--compact" in sys.argv:
+        print("Compacted:", compact())
+    if "--materialize" in sys.argv:
+        n = materialize()
+        print(f"Wrote {MATERIALIZED_CSV} with {n} live incidents.")
+    if not any(a in sys.argv for a in ("--compact", "--materialize")):
+        store = load_current_store()
+        print(f"Generation {snapshot_generation()}: {len(store)} live incidents, "
+              f"{len(store.blocked_edges())} closed and {len(store.slowed_edges())} slowed edges.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+incident_store.py
+
+Time-bounded incident store.
+
+The batch ingest scripts write incident flags into the segments CSV as permanent
+booleans; nothing ever clears them. The store instead keeps every incident as an
+entry with a source, a validity window [start, end) and the (from_node, to_node)
+edges it affects, and derives the *current* flag bitmask per edge on demand.
+
+- Entries sit in two heaps ordered by start (not yet active) and end (active),
+  so activating / expiring an entry is O(log n); superseded heap items are
+  skipped lazily.
+- Re-adding the same (source, incident_id) replaces the entry, which is how a
+  source that keeps reporting an incident extends its validity.
+- Incidents with no explicit end get a default TTL per flag.
+- Only closure flags (CLOSURE_FLAGS) close an edge; "slowdown" marks minor
+  incidents (jams, weather, lane closures) that routing turns into a penalty.
+
+Usage:
+  store = IncidentStore()
+  store.add("tomtom", "abc", ["closed_for_construction"], [(u, v)], start=t0, end=t1)
+  store.effective_masks()          # {(u, v): FLAG_BITS mask} at time.time()
+  store.blocked_edges()            # set of edges closed by a closure flag
+  store.slowed_edges()             # set of edges with only minor incidents
+  store.apply_delta(json_delta)    # ingest a record published by incident_daemon.py
+"""
+import time
+import heapq
+import calendar
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+FLAG_BITS = {
+    "event_blocked": 1,
+    "vip_blocked": 2,
+    "closed_for_construction": 4,
+    "slowdown": 8,
+}
+# flags that close an edge; any other flag only slows it down
+CLOSURE_FLAGS = ("event_blocked", "vip_blocked", "closed_for_construction")
+
+# validity assumed when a source gives no end time
+DEFAULT_TTL_S = {
+    "event_blocked": 6 * 3600,
+    "vip_blocked": 2 * 3600,
+    "closed_for_construction": 7 * 24 * 3600,
+    "slowdown": 3600,
+}
+FALLBACK_TTL_S = 3 * 3600
+# -----------------------------
+
+Edge = Tuple[str, str]
+
+
+def flags_to_mask(flags: Iterable[str]) -> int:
+    mask = 0
+    for flag in flags:
+        mask |= FLAG_BITS.get(flag, 0)
+    return mask
+
+
+CLOSURE_MASK = flags_to_mask(CLOSURE_FLAGS)
+
+
+def mask_to_flags(mask: int) -> List[str]:
+    return [flag for flag, bit in FLAG_BITS.items() if mask & bit]
+
+
+def default_ttl_s(flags: Iterable[str]) -> float:
+    ttls = [DEFAULT_TTL_S.get(f, FALLBACK_TTL_S) for f in flags]
+    return max(ttls) if ttls else FALLBACK_TTL_S
+
+
+def parse_time(value) -> Optional[float]:
+    """Epoch seconds from a number or an ISO-8601 string ('...Z' allowed); None if unparseable."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return calendar.timegm(time.strptime(text, "%Y-%m-%dT%H:%M:%SZ"))
+    except ValueError:
+        pass
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        return calendar.timegm(dt.timetuple()) + dt.microsecond / 1e6
+    return dt.timestamp()
+
+
+def format_time(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+class IncidentStore:
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str], Dict] = {}
+        self._pending = []   # (start, version, key) for entries not yet active
+        self._active = []    # (end, version, key) for active entries
+        self._version = 0
+        self._edge_refs: Dict[Edge, Dict[Tuple[str, str], int]] = {}
+        self._masks: Optional[Dict[Edge, int]] = None
+        self.now = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # --- mutation ---------------------------------------------------------
+    def add(self, source: str, incident_id: str, flags: Iterable[str], edges: Iterable[Edge],
+            start: Optional[float] = None, end: Optional[float] = None) -> Dict:
+        flags = list(flags)
+        start = time.time() if start is None else float(start)
+        end = start + default_ttl_s(flags) if end is None else float(end)
+        key = (source, str(incident_id))
+        self.remove(key)
+
+        self._version += 1
+        entry = {
+            "source": source, "incident_id": str(incident_id), "mask": flags_to_mask(flags),
+            "edges": [tuple(e) for e in edges], "start": start, "end": end,
+            "version": self._version, "active": False,
+        }
+        if end <= self.now:
+            return entry  # already over
+        self.entries[key] = entry
+        if start <= self.now:
+            self._activate(key, entry)
+        else:
+            heapq.heappush(self._pending, (start, entry["version"], key))
+        return entry
+
+    def remove(self, key: Tuple[str, str]) -> bool:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        if entry["active"]:
+            self._deactivate(key, entry)
+        # its heap items are now stale and get skipped when popped
+        return True
+
+    def apply_delta(self, delta: Dict) -> Optional[Dict]:
+        """Ingest one incident delta as written by incident_daemon.DeltaPublisher."""
+        start = parse_time(delta.get("start")) or parse_time(delta.get("ts"))
+        return self.add(delta.get("source", ""), delta.get("incident_id", ""), delta.get("flags", []),
+                        delta.get("edges", []), start=start, end=parse_time(delta.get("end")))
+
+    def _activate(self, key, entry):
+        entry["active"] = True
+        heapq.heappush(self._active, (entry["end"], entry["version"], key))
+        for edge in entry["edges"]:
+            self._edge_refs.setdefault(edge, {})[key] = entry["mask"]
+        self._masks = None
+
+    def _deactivate(self, key, entry):
+        entry["active"] = False
+        for edge in entry["edges"]:
+            refs = self._edge_refs.get(edge)
+            if refs is None:
+                continue
+            refs.pop(key, None)
+            if not refs:
+                del self._edge_refs[edge]
+        self._masks = None
+
+    def _is_current(self, version, key) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry["version"] == version
+
+    def advance(self, now: Optional[float] = None) -> Tuple[int, int]:
+        """Move the clock to `now`: activate started entries, drop expired ones. Returns (activated, expired)."""
+        now = time.time() if now is None else now
+        self.now = max(self.now, now)
+        activated = expired = 0
+        while self._pending and self._pending[0][0] <= self.now:
+            _, version, key = heapq.heappop(self._pending)
+            if self._is_current(version, key):
+                entry = self.entries[key]
+                if entry["end"] <= self.now:
+                    del self.entries[key]
+                    expired += 1
+                else:
+                    self._activate(key, entry)
+                    activated += 1
+        while self._active and self._active[0][0] <= self.now:
+            _, version, key = heapq.heappop(self._active)
+            if self._is_current(version, key):
+                self._deactivate(key, self.entries.pop(key))
+                expired += 1
+        return activated, expired
+
+    # --- queries ----------------------------------------------------------
+    def next_change(self) -> Optional[float]:
+        """Earliest time at which an entry starts or expires (stale heap items may make this early)."""
+        times = [h[0][0] for h in (self._pending, self._active) if h]
+        return min(times) if times else None
+
+    def effective_masks(self, now: Optional[float] = None) -> Dict[Edge, int]:
+        """Current OR of the flag bits of all active incidents, per affected edge."""
+        self.advance(now)
+        if self._masks is None:
+            masks = {}
+            for edge, refs in self._edge_refs.items():
+                mask = 0
+                for m in refs.values():
+                    mask |= m
+                masks[edge] = mask
+            self._masks = masks
+        return self._masks
+
+    def blocked_edges(self, now: Optional[float] = None) -> Set[Edge]:
+        """Edges closed by an active closure incident."""
+        return {edge for edge, mask in self.effective_masks(now).items() if mask & CLOSURE_MASK}
+
+    def slowed_edges(self, now: Optional[float] = None) -> Set[Edge]:
+        """Edges with active incidents, none of which closes them."""
+        return {edge for edge, mask in self.effective_masks(now).items() if mask and not mask & CLOSURE_MASK}
+
+    def mask_array(self, from_nodes, to_nodes, now: Optional[float] = None) -> np.ndarray:
+        """Effective masks aligned to an edge table's (from_node, to_node) columns, as uint8."""
+        masks = self.effective_masks(now)
+        if not masks:
+            return np.zeros(len(from_nodes), dtype=np.uint8)
+        return np.fromiter((masks.get((u, v), 0) for u, v in zip(from_nodes, to_nodes)),
+                           dtype=np.uint8, count=len(from_nodes))
+
+    def apply_to_df(self, df, now: Optional[float] = None):
+        """Overwrite the flag columns of a segments DataFrame with the current effective flags."""
+        masks = self.mask_array(df["from_node"].to_numpy(), df["to_node"].to_numpy(), now)
+        for flag, bit in FLAG_BITS.items():
+            df[flag] = (masks & bit) != 0
+        return df
+
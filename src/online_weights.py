@@ -0,0 +1,190 @@
+"""
+online_weights.py
+
+Online edge-weight corrections learned from observed travel times.
+
+The model weights only change when the forests are retrained. Reports of how long
+a segment actually took (e.g. from the Android app) are appended to an
+observation log, one JSON record per traversal:
+
+  {"ts", "from_node", "to_node", "travel_s"}
+
+OnlineWeightLearner keeps, per routed edge, an exponentially decayed average of
+log(observed / expected travel time) in compact arrays (mean float32, evidence
+float32, last_ts uint32: 12 bytes per edge). An observation is O(1): decay the
+edge's evidence to the report's time and fold the new log-ratio in. The edge's
+weight multiplier is
+
+  exp(mean * w / (w + PRIOR_OBSERVATIONS)),  w = evidence decayed to now
+
+so one report moves an edge only a little, and a correction fades back to 1
+within a few HALF_LIFE_S once reports stop.
+
+publish() returns only the edges whose multiplier moved by more than
+PUBLISH_TOLERANCE since they were last published (including edges fading back
+to 1), at a cost proportional to the edges with live evidence. routing_logic
+applies that delta to its per-edge correction layer in place, without a
+retrain or a graph rebuild. On a rebuild the log is replayed (reports older
+than MAX_REPLAY_AGE_S are skipped; --compact drops them from the file).
+
+Usage:
+  python online_weights.py --observe FROM_NODE TO_NODE TRAVEL_S [--ts EPOCH]
+  python online_weights.py --compact
+"""
+import os
+import sys
+import json
+import math
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from incident_log import append_events, log_lock, read_events
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+OBSERVATION_LOG = "datalink_output/travel_observations.jsonl"
+HALF_LIFE_S = 30 * 60             # a report's weight halves every 30 minutes
+PRIOR_OBSERVATIONS = 2.0          # pseudo-reports of "as expected"; damps corrections from few reports
+RATIO_RANGE = (0.2, 5.0)          # observed / expected clipped to this (map-matching glitches)
+PUBLISH_TOLERANCE = 0.02          # republish an edge when its multiplier moved by more than 2%
+MAX_REPLAY_AGE_S = 12 * HALF_LIFE_S  # older reports weigh < 1/4096
+MAX_CLOCK_SKEW_S = 5 * 60         # reports stamped further in the future are rejected
+# -----------------------------
+
+
+def valid_observation(ts, travel_s, now: Optional[float] = None) -> bool:
+    """True for a finite, positive travel time stamped between the epoch and now + MAX_CLOCK_SKEW_S."""
+    now = time.time() if now is None else now
+    try:
+        ts, travel_s = float(ts), float(travel_s)
+    except (TypeError, ValueError):
+        return False
+    return (math.isfinite(ts) and math.isfinite(travel_s) and travel_s > 0
+            and 0 <= ts <= min(now + MAX_CLOCK_SKEW_S, np.iinfo(np.uint32).max))
+
+
+class OnlineWeightLearner:
+    def __init__(self, n_edges: int, half_life_s: float = HALF_LIFE_S, prior: float = PRIOR_OBSERVATIONS):
+        self.half_life_s = float(half_life_s)
+        self.prior = float(prior)
+        self.mean = np.zeros(n_edges, dtype=np.float32)      # decayed mean of log(observed / expected)
+        self.evidence = np.zeros(n_edges, dtype=np.float32)  # decayed number of reports, as of last_ts
+        self.last_ts = np.zeros(n_edges, dtype=np.uint32)
+        self.published: Dict[int, float] = {}  # edge -> multiplier live in the routing engine (!= 1)
+        self._touched = set()                  # edges observed since the last publish()
+        self.observations = 0
+
+    def __len__(self):
+        return len(self.mean)
+
+    def observe(self, edge: int, observed_s: float, expected_s: float, ts: float) -> bool:
+        """Folds one traversal of edge into its correction; False if the report is unusable."""
+        if not (0 <= edge < len(self.mean)) or not (expected_s > 0 and math.isfinite(expected_s)):
+            return False
+        if not valid_observation(ts, observed_s):
+            return False
+        x = math.log(min(max(observed_s / expected_s, RATIO_RANGE[0]), RATIO_RANGE[1]))
+        last = float(self.last_ts[edge])
+        w = float(self.evidence[edge])
+        if ts >= last:
+            w *= 0.5 ** ((ts - last) / self.half_life_s)
+            new = 1.0
+            self.last_ts[edge] = int(ts)
+        else:
+            new = 0.5 ** ((last - ts) / self.half_life_s)  # late report: age it, not the edge state
+        total = w + new
+        self.mean[edge] = (w * float(self.mean[edge]) + new * x) / total
+        self.evidence[edge] = total
+        self._touched.add(edge)
+        self.observations += 1
+        return True
+
+    def multipliers(self, edges: np.ndarray, now: float) -> np.ndarray:
+        """Weight multipliers of the given edges at time now."""
+        age = np.maximum(now - self.last_ts[edges].astype(np.float64), 0.0)
+        w = self.evidence[edges] * 0.5 ** (age / self.half_life_s)
+        return np.exp(self.mean[edges] * (w / (w + self.prior)))
+
+    def publish(self, now: Optional[float] = None) -> Dict[int, float]:
+        """{edge: multiplier} for every edge whose live multiplier should change."""
+        now = time.time() if now is None else now
+        candidates = self._touched | self.published.keys()
+        self._touched = set()
+        if not candidates:
+            return {}
+        edges = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        changes = {}
+        for edge, m in zip(edges.tolist(), self.multipliers(edges, now).tolist()):
+            old = self.published.get(edge, 1.0)
+            if abs(m - 1.0) <= PUBLISH_TOLERANCE:
+                if edge in self.published:  # faded out
+                    del self.published[edge]
+                    changes[edge] = 1.0
+            elif abs(m - old) > PUBLISH_TOLERANCE * old:
+                self.published[edge] = m
+                changes[edge] = m
+        return changes
+
+
+class ObservationLogReader:
+    """Reads only the new records of the observation log; notices when it was compacted."""
+
+    def __init__(self, path: str = OBSERVATION_LOG):
+        self.path = path
+        self.offset = 0
+        self._file_id = None
+
+    def read(self):
+        """(new records, replaced): replaced means earlier records must be forgotten and replayed."""
+        with log_lock(self.path):
+            file_id = os.stat(self.path).st_ino if os.path.exists(self.path) else None
+            replaced = file_id != self._file_id and self._file_id is not None
+            if replaced or (file_id is not None and os.path.getsize(self.path) < self.offset):
+                replaced = True
+                self.offset = 0
+            self._file_id = file_id
+            records, self.offset = read_events(self.path, self.offset)
+        return records, replaced
+
+
+def append_observations(records: Iterable[Dict], path: str = OBSERVATION_LOG):
+    append_events([dict(r, ts=r.get("ts", time.time())) for r in records], path)
+
+
+def compact_observations(path: str = OBSERVATION_LOG, now: Optional[float] = None) -> int:
+    """Rewrites the log without reports older than MAX_REPLAY_AGE_S; returns the number kept."""
+    now = time.time() if now is None else now
+    with log_lock(path):
+        records, _ = read_events(path)
+        keep = [r for r in records if now - float(r.get("ts", 0)) <= MAX_REPLAY_AGE_S]
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in keep)
+        os.replace(tmp, path)
+    return len(keep)
+
+
+def main():
+    args = sys.argv[1:]
+    if "--observe" in args:
+        i = args.index("--observe")
+        try:
+            from_node, to_node, travel_s = args[i + 1], args[i + 2], float(args[i + 3])
+            ts = float(args[args.index("--ts") + 1]) if "--ts" in args else time.time()
+        except (IndexError, ValueError):
+            print("Usage: python online_weights.py --observe FROM_NODE TO_NODE TRAVEL_S [--ts EPOCH]")
+            sys.exit(1)
+        append_observations([{"ts": ts, "from_node": from_node, "to_node": to_node, "travel_s": travel_s}])
+        print(f"Appended 1 observation to {OBSERVATION_LOG}")
+    elif "--compact" in args:
+        print(f"Kept {compact_observations()} observations in {OBSERVATION_LOG}")
+    else:
+        records, _ = ObservationLogReader().read()
+        print(f"{len(records)} observations in {OBSERVATION_LOG}")
+
+
+if __name__ == "__main__":
+    main()
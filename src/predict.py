@@ -1,21 +1,358 @@
-import joblib
+"""
+predict.py
+
+Congestion and edge-weight predictions.
+
+- Models are loaded on first use, not at import (compiled_forest.load_model: the
+  memory-mapped bundle or array export when up to date, else the joblib pipeline).
+- predict_congestion_batch / predict_weight_batch take a DataFrame, a dict of
+  column arrays, a list of row dicts or a single row dict, and run one predict
+  call for all rows. The weight model's predicted_congestion input is filled from
+  the congestion model when the caller does not supply it.
+- predict_congestion / predict_weight keep the one-row-dict interface.
+- FusedPredictor runs congestion -> weight as one callable: shared columns are
+  standardized / one-hot encoded once for both forests (compiled_forest arrays),
+  and the congestion output goes straight into the weight stage. The routing
+  graph build predicts all edge weights through it.
+- MicroBatcher serves concurrent single-row requests: a worker thread collects
+  requests for up to MAX_WAIT_S (or MAX_BATCH rows) after the first one arrives
+  and answers them all from one batch call.
+
+Usage:
+  python predict.py            # sample prediction
+  python predict.py --bench    # throughput / latency: single calls, batches, micro-batching
+"""
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
 import pandas as pd
 
-congestion_model = joblib.load("model/congestion.joblib")
-weight_model = joblib.load("model/weight.joblib")
+from compiled_forest import CompiledForest, load_model
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+CONGESTION_MODEL_FILE = "model/congestion.joblib"
+CONGESTION_FOREST_FILE = "model/congestion_forest.npz"
+CONGESTION_BUNDLE_DIR = "model/congestion_bundle"
+WEIGHT_MODEL_FILE = "model/weight.joblib"
+WEIGHT_FOREST_FILE = "model/weight_forest.npz"
+WEIGHT_BUNDLE_DIR = "model/weight_bundle"
+
+MAX_BATCH = 256       # rows per micro-batch
+MAX_WAIT_S = 0.002    # how long the first request of a micro-batch waits for company
+# -----------------------------
+
+Rows = Union[pd.DataFrame, Dict, List[Dict]]
+
+_models: Dict[str, object] = {}
+_models_lock = threading.Lock()
+
+
+def _model(name: str):
+    if name not in _models:
+        with _models_lock:
+            if name not in _models:
+                if name == "congestion":
+                    _models[name] = load_model(CONGESTION_MODEL_FILE, CONGESTION_FOREST_FILE, CONGESTION_BUNDLE_DIR)
+                else:
+                    _models[name] = load_model(WEIGHT_MODEL_FILE, WEIGHT_FOREST_FILE, WEIGHT_BUNDLE_DIR)
+    return _models[name]
+
+
+def congestion_model():
+    return _model("congestion")
+
+
+def weight_model():
+    return _model("weight")
+
+
+def as_frame(rows: Rows) -> pd.DataFrame:
+    """DataFrame from a DataFrame, {column: array}, [row dict, ...] or one row dict."""
+    if isinstance(rows, pd.DataFrame):
+        return rows
+    if isinstance(rows, dict):
+        if all(np.ndim(v) == 0 for v in rows.values()):
+            return pd.DataFrame([rows])
+        return pd.DataFrame(rows)
+    return pd.DataFrame(list(rows))
+
+
+def _needs(model, column: str) -> bool:
+    names = getattr(model, "feature_names_in_", None)
+    return names is not None and column in set(names)
+
+
+def predict_congestion_batch(rows: Rows) -> np.ndarray:
+    return np.asarray(congestion_model().predict(as_frame(rows)), dtype=np.float64)
+
+
+def predict_weight_batch(rows: Rows, congestion: Optional[np.ndarray] = None) -> np.ndarray:
+    """Edge weights; predicted_congestion comes from `congestion`, the input, or the congestion model."""
+    df = as_frame(rows)
+    if congestion is None and "predicted_congestion" not in df:
+        return fused_predictor().predict(df)
+    model = weight_model()
+    if _needs(model, "predicted_congestion") and (congestion is not None or "predicted_congestion" not in df):
+        df = df.assign(predicted_congestion=congestion if congestion is not None else predict_congestion_batch(df))
+    return np.asarray(model.predict(df), dtype=np.float64)
+
 
 def predict_congestion(input_dict: dict) -> float:
-    df = pd.DataFrame([input_dict])
-    result = congestion_model.predict(df)[0]
-    return float(result)
+    return float(predict_congestion_batch(input_dict)[0])
 
 
 def predict_weight(input_dict: dict) -> float:
-    df = pd.DataFrame([input_dict])
-    result = weight_model.predict(df)[0]
-    return float(result)
+    return float(predict_weight_batch(input_dict)[0])
+
+
+class _Stage:
+    """One model of the fused predictor: compiled preprocessing, plus the fastest forest evaluator at hand."""
+
+    def __init__(self, name: str, model):
+        self.name = name
+        if isinstance(model, CompiledForest):
+            self.encoder, self.predict_X = model, model.predict_transformed
+        else:
+            # a joblib pipeline: encode with the compiled arrays, keep sklearn's C tree walk
+            self.encoder, self.predict_X = CompiledForest.from_pipeline(model), model.steps[-1][1].predict
+        # the columns the preprocessor actually reads (feature_names_in_ may list dropped ones)
+        self.feature_names = [str(c) for c in self.encoder.num_cols + self.encoder.cat_cols]
+
+    def __call__(self, df: pd.DataFrame, cache: Dict, extra: Optional[Dict] = None, memo=None) -> np.ndarray:
+        X = self.encoder.transform(df, cache, extra)
+        if memo is not None:
+            return memo.predict(self.name, self.encoder, X, self.predict_X)
+        return np.asarray(self.predict_X(X), dtype=np.float64)
+
+
+class FusedPredictor:
+    """
+    Congestion -> weight in one call. Both stages encode their inputs from one
+    shared cache, so columns standardized / one-hot encoded identically by the two
+    preprocessors are encoded once, and the congestion prediction is handed to the
+    weight stage as its predicted_congestion column without another DataFrame.
+    With a prediction_memo.PredictionMemo, each stage only runs its forest on rows
+    whose split-threshold key it has not seen.
+    """
+
+    def __init__(self, congestion=None, weight=None, memo=None):
+        self.memo = memo
+        self.weight = _Stage("weight", weight if weight is not None else weight_model())
+        self.uses_congestion = "predicted_congestion" in self.weight.feature_names
+        self.congestion = None
+        if self.uses_congestion:
+            self.congestion = _Stage("congestion", congestion if congestion is not None else congestion_model())
+        names = (self.congestion.feature_names if self.congestion else []) + self.weight.feature_names
+        # the input schema: what callers (e.g. feature_adapter.FeatureAdapter) must provide
+        self.feature_names_in_ = np.asarray(
+            list(dict.fromkeys(c for c in names if not (self.uses_congestion and c == "predicted_congestion"))),
+            dtype=object)
+
+    def predict_both(self, rows: Rows):
+        """(predicted congestion or None, weight) for every row."""
+        df = as_frame(rows)
+        cache: Dict = {}
+        if not self.uses_congestion:
+            return None, self.weight(df, cache, memo=self.memo)
+        congestion = self.congestion(df, cache, memo=self.memo)
+        return congestion, self.weight(df, cache, {"predicted_congestion": congestion}, self.memo)
+
+    def predict(self, rows: Rows) -> np.ndarray:
+        return self.predict_both(rows)[1]
+
+    __call__ = predict
+
+
+_fused: Optional[FusedPredictor] = None
+
+
+def fused_predictor() -> FusedPredictor:
+    global _fused
+    if _fused is None:
+        _fused = FusedPredictor()
+    return _fused
+
+
+class MicroBatcher:
+    """
+    Coalesces single-row requests from many threads into batch calls of
+    predict_fn (rows DataFrame -> array). submit() returns a Future; predict()
+    blocks for the result.
+    """
+
+    def __init__(self, predict_fn: Callable[[pd.DataFrame], np.ndarray],
+                 max_batch: int = MAX_BATCH, max_wait_s: float = MAX_WAIT_S):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_s
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, row: Dict) -> Future:
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future: Future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def predict(self, row: Dict, timeout: Optional[float] = None) -> float:
+        return self.submit(row).result(timeout)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait_s
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._serve(batch)
+            if stop:
+                return
+
+    def _serve(self, batch):
+        self.stats["requests"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        futures = [f for _, f in batch]
+        try:
+            results = self.predict_fn(pd.DataFrame([row for row, _ in batch]))
+        except Exception as e:
+            for f in futures:
+                f.set_exception(e)
+            return
+        for f, r in zip(futures, results):
+            f.set_result(float(r))
+
+
+def sample_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    """Inputs in the training schema (see generate_sample.py)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "distance": rng.integers(1, 60, n).astype(float),
+        "road_quality": rng.uniform(1.0, 5.0, n),
+        "lane_count": rng.choice([1, 2, 3, 4], n),
+        "speed_limit": rng.choice([40, 60, 80, 100], n),
+        "speed_limit_kph": rng.choice([40, 60, 80, 100], n),
+        "tolls": rng.choice([0, 0, 0, 1, 2], n),
+        "foot_traffic": rng.uniform(0, 1, n),
+        "historical_congestion": rng.uniform(0, 1, n),
+        "pothole_reports": rng.integers(0, 11, n),
+        "road_type": rng.choice(["highway", "urban", "rural"], n),
+        "event": rng.choice(["none", "none", "none", "procession", "vip_movement"], n),
+        "vehicle_type": rng.choice(["sedan", "suv", "truck", "bike"], n),
+        "accident": rng.choice(["yes", "no"], n, p=[0.05, 0.95]),
+    })
+
+
+def _latency_line(label: str, latencies: List[float], rows: int, elapsed: float):
+    lat = np.asarray(latencies) * 1000
+    print(f"{label:<28} {rows / elapsed:>12,.0f} rows/s   p50 {np.percentile(lat, 50):8.3f} ms"
+          f"   p99 {np.percentile(lat, 99):8.3f} ms")
+
+
+def benchmark(n_single: int = 300, batch_sizes=(16, 256, 4096), clients: int = 32, per_client: int = 50):
+    predict = lambda df: predict_weight_batch(df)
+    data = sample_rows(max(max(batch_sizes), clients * per_client, n_single))
+    records = data.to_dict("records")
+    predict(data.iloc[:8])  # load models
+
+    lat = []
+    t0 = time.perf_counter()
+    for row in records[:n_single]:
+        t = time.perf_counter()
+        predict_weight(row)
+        lat.append(time.perf_counter() - t)
+    _latency_line("single-row calls", lat, n_single, time.perf_counter() - t0)
+
+    for size in batch_sizes:
+        lat = []
+        reps = max(3, 2000 // size)
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            t = time.perf_counter()
+            predict(data.iloc[:size])
+            lat.append(time.perf_counter() - t)
+        _latency_line(f"batch of {size} (per batch)", lat, size * reps, time.perf_counter() - t0)
+
+    # two-stage congestion -> weight: separate pipelines vs the fused predictor
+    size = max(batch_sizes)
+    batch = data.iloc[:size]
+    fused = fused_predictor()
+
+    def separate(df):
+        model = weight_model()
+        if _needs(model, "predicted_congestion"):
+            df = df.assign(predicted_congestion=predict_congestion_batch(df))
+        return model.predict(df)
+
+    for label, call in (("two-stage, separate", separate), ("two-stage, fused", fused.predict)):
+        lat = []
+        t0 = time.perf_counter()
+        for _ in range(3):
+            t = time.perf_counter()
+            call(batch)
+            lat.append(time.perf_counter() - t)
+        _latency_line(f"{label} ({size})", lat, size * 3, time.perf_counter() - t0)
+
+    # concurrent single-row clients, unbatched vs micro-batched
+    def run_clients(call):
+        def client(k):
+            out = []
+            for row in records[k * per_client:(k + 1) * per_client]:
+                t = time.perf_counter()
+                call(row)
+                out.append(time.perf_counter() - t)
+            return out
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            lat = [x for part in pool.map(client, range(clients)) for x in part]
+        return lat, time.perf_counter() - t0
+
+    lat, elapsed = run_clients(predict_weight)
+    _latency_line(f"{clients} clients, direct", lat, len(lat), elapsed)
+    with MicroBatcher(predict) as batcher:
+        lat, elapsed = run_clients(batcher.predict)
+        _latency_line(f"{clients} clients, micro-batched", lat, len(lat), elapsed)
+        print(f"  micro-batches: {batcher.stats}")
+
 
 if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit(0)
+
     sample = pd.DataFrame([{
         "distance": 3.2,
         "road_quality": 0.7,
@@ -31,10 +368,8 @@ if __name__ == "__main__":
         "accident": "no"
     }])
 
-    predicted_congestion = congestion_model.predict(sample)[0]
-    print("Predicted Congestion:", predicted_congestion)
-
-    sample["predicted_congestion"] = predicted_congestion
-
-    predicted_weight = weight_model.predict(sample)[0]
-    print("Predicted Weight:", predicted_weight)
\ No newline at end of file
+    predicted_congestion, predicted_weight = fused_predictor().predict_both(sample)
+    if predicted_congestion is None:
+        predicted_congestion = predict_congestion_batch(sample)
+    print("Predicted Congestion:", predicted_congestion[0])
+    print("Predicted Weight:", predicted_weight[0])
@@ -0,0 +1,106 @@
+"""
+prediction_memo.py
+
+Deduplicated, persistent forest inference for the graph builder.
+
+Most rows of the segment table share their model-relevant features; the raw
+feature vectors still differ (every segment has its own length), but a forest
+only ever compares a column with its split thresholds. CompiledForest.row_keys()
+turns an encoded row into the threshold interval of every split column, and two
+rows with equal keys take the same path through every tree, so:
+
+- predict() hashes the keys, runs the forest once per key not seen before and
+  scatters the results back to all rows (exact, not approximate);
+- the key -> prediction table is saved to MEMO_FILE with the version of every
+  model stage and reused by the next graph build, so a rebuild after an incident
+  refresh only predicts rows whose keys changed. A different model version
+  starts a fresh table for that stage.
+
+Usage:
+  memo = PredictionMemo.load()
+  weights = FusedPredictor(memo=memo).predict(adapter_output)
+  memo.save()
+"""
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+MEMO_FILE = "datalink_output/weight_memo.npz"
+# -----------------------------
+
+
+class PredictionMemo:
+    def __init__(self, path: str = MEMO_FILE):
+        self.path = path
+        self.tables: Dict[str, Dict] = {}   # stage -> {"version", "width", "values": {key bytes: prediction}}
+        self.stats = {"rows": 0, "unique": 0, "hits": 0, "predicted": 0}
+
+    @classmethod
+    def load(cls, path: str = MEMO_FILE) -> "PredictionMemo":
+        memo = cls(path)
+        if not os.path.exists(path):
+            return memo
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                for stage in [str(s) for s in z["stages"]]:
+                    keys, values = z[f"{stage}.keys"], z[f"{stage}.values"]
+                    memo.tables[stage] = {
+                        "version": str(z[f"{stage}.version"]), "width": keys.shape[1],
+                        "values": dict(zip((row.tobytes() for row in keys), values.tolist())),
+                    }
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Warning: ignoring unreadable prediction memo {path} ({e})")
+            memo.tables = {}
+        return memo
+
+    def save(self):
+        arrays = {"stages": np.array(list(self.tables), dtype=str)}
+        for stage, table in self.tables.items():
+            values = table["values"]
+            keys = np.frombuffer(b"".join(values), dtype=np.int32).reshape(len(values), table["width"])
+            arrays[f"{stage}.keys"] = keys
+            arrays[f"{stage}.values"] = np.fromiter(values.values(), dtype=np.float64, count=len(values))
+            arrays[f"{stage}.version"] = np.array(table["version"])
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.path)
+
+    def _table(self, stage: str, version: str, width: int) -> Dict[bytes, float]:
+        table = self.tables.get(stage)
+        if table is None or table["version"] != version or table["width"] != width:
+            table = {"version": version, "width": width, "values": {}}
+            self.tables[stage] = table
+        return table["values"]
+
+    def predict(self, stage: str, engine, X: np.ndarray, predict_X: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """Predictions for encoded rows X, running predict_X only on rows with unseen keys."""
+        keys = np.ascontiguousarray(engine.row_keys(X))
+        rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+        uniq, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        table = self._table(stage, engine.version, keys.shape[1])
+
+        values = np.empty(len(uniq), dtype=np.float64)
+        missing = []
+        for i, key in enumerate(uniq.tolist()):
+            hit = table.get(key)
+            if hit is None:
+                missing.append(i)
+            else:
+                values[i] = hit
+        if missing:
+            missing = np.asarray(missing)
+            predicted = np.asarray(predict_X(X[first[missing]]), dtype=np.float64)
+            values[missing] = predicted
+            for key, value in zip(uniq[missing].tolist(), predicted.tolist()):
+                table[key] = value
+
+        self.stats["rows"] += len(X)
+        self.stats["unique"] += len(uniq)
+        self.stats["hits"] += len(uniq) - len(missing)
+        self.stats["predicted"] += len(missing)
+        return values[inverse.ravel()]
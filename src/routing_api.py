@@ -1,5 +1,9 @@
+import time
+
 from flask import Flask, request, jsonify
-from routing_logic import calculate_route, load_graph_and_geometry
+from routing_logic import calculate_route, load_graph_and_geometry, apply_incident_deltas, apply_travel_observations
+from time_profiles import parse_depart_at
+from online_weights import append_observations, valid_observation
 
 app = Flask(__name__)
 
@@ -12,6 +16,7 @@ def get_route():
     """
     API endpoint to calculate the best route.
     Expects: /api/route?source_lat=...&source_lon=...&dest_lat=...&dest_lon=...&vehicle=...
+    Optional: depart_at=<ISO-8601 time (local time if no offset) or epoch seconds>
     """
     try:
         # 1. Get query parameters
@@ -23,6 +28,11 @@ def get_route():
         
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid or missing latitude/longitude parameters."}), 400
+
+    depart_at = request.args.get('depart_at')
+    depart_ts = parse_depart_at(depart_at)
+    if depart_at and depart_ts is None:
+        return jsonify({"error": "Invalid depart_at; use ISO-8601 or epoch seconds."}), 400
     
     if not vehicle_type:
          return jsonify({"error": "Missing vehicle_type parameter."}), 400
@@ -31,17 +41,49 @@ def get_route():
     if not calculate_route: # If the function is not defined/loaded correctly
         return jsonify({"error": "Routing engine not initialized. Check server logs."}), 500
 
-    # 3. Calculate the route
-    route_coords = calculate_route(source_lat, source_lon, dest_lat, dest_lon, vehicle_type)
+    # 3. Pick up incident deltas published by incident_daemon.py and newly learned
+    #    travel-time corrections, then calculate the route
+    apply_incident_deltas()
+    apply_travel_observations()
+    route_coords = calculate_route(source_lat, source_lon, dest_lat, dest_lon, vehicle_type, depart_ts)
     
     if not route_coords:
         return jsonify({"error": "Could not find a valid route between the points."}), 404
 
     # 4. Return the calculated route (list of [lat, lon] pairs)
-    return jsonify({
+    response = {
         "status": "success",
         "route_coordinates": route_coords
-    }), 200
+    }
+    if depart_ts is not None:
+        response["depart_at"] = depart_ts
+    return jsonify(response), 200
+
+@app.route('/api/observations', methods=['POST'])
+def post_observations():
+    """
+    Observed segment traversal times from the app, appended to the observation log.
+    Expects a JSON list of {"from_node", "to_node", "travel_s", "ts" (optional, epoch seconds)}.
+    """
+    records = request.get_json(silent=True)
+    if isinstance(records, dict):
+        records = [records]
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a JSON list of observations."}), 400
+    clean = []
+    now = time.time()
+    for rec in records:
+        try:
+            ts = float(rec["ts"]) if rec.get("ts") is not None else now
+            obs = {"from_node": str(rec["from_node"]), "to_node": str(rec["to_node"]),
+                   "travel_s": float(rec["travel_s"]), "ts": ts}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({"error": "Each observation needs from_node, to_node and a numeric travel_s."}), 400
+        if not valid_observation(obs["ts"], obs["travel_s"], now):
+            return jsonify({"error": "travel_s must be positive and ts a past epoch time in seconds."}), 400
+        clean.append(obs)
+    append_observations(clean)
+    return jsonify({"status": "success", "accepted": len(clean)}), 200
 
 @app.route('/', methods=['GET'])
 def home():
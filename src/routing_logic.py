@@ -1,21 +1,68 @@
 import pandas as pd
-import joblib
+import numpy as np
 import heapq
-import json
 import math
 import os
+import time
 from typing import Dict, List, Tuple, Optional
 
+from graph_simplify import simplify_segments_df, split_node_path, expand_route
+from incident_log import IncidentLogReader, SNAPSHOT_FILE
+from compiled_forest import load_model
+from feature_adapter import FeatureAdapter
+from predict import FusedPredictor
+from prediction_memo import PredictionMemo, MEMO_FILE
+from time_profiles import EdgeProfiles, build_profiles, ensure_profiles, PROFILE_DIR
+from online_weights import (OnlineWeightLearner, ObservationLogReader, OBSERVATION_LOG, MAX_REPLAY_AGE_S,
+                            valid_observation)
+
 # --- CONFIG ---
 # Use the most enriched data available
 DATA_CSV = "datalink_output/segments_features_enriched_tomtom.csv"
-GEOJSON_FILE = "segments_features.geojson"
+# Written by incident_fusion.py (both incident sources in one pass); preferred when present
+FUSED_DATA_CSV = "datalink_output/segments_features_enriched_fused.csv"
 WEIGHT_MODEL_FILE = "model/weight.joblib"
+# Array export of the weight model (compiled_forest.py); used instead of the pickle when up to date
+WEIGHT_FOREST_FILE = "model/weight_forest.npz"
+# Memory-mapped model bundle (compiled_forest.save_bundle, written by training.py); preferred over both
+WEIGHT_BUNDLE_DIR = "model/weight_bundle"
+# Incident event log (and its compacted snapshot), see incident_log.py
+INCIDENT_DELTA_LOG = "datalink_output/incident_deltas.jsonl"
+INCIDENT_SNAPSHOT = SNAPSHOT_FILE
+# Predictions per distinct split-threshold key, reused across rebuilds of the same model (see prediction_memo.py)
+WEIGHT_MEMO_FILE = MEMO_FILE
+# Per-edge time-of-day weight profiles, written at graph build and memory-mapped (see time_profiles.py)
+WEIGHT_PROFILE_DIR = PROFILE_DIR
+# Observed segment travel times, learned into per-edge weight corrections (see online_weights.py)
+TRAVEL_OBSERVATION_LOG = OBSERVATION_LOG
+# The model is trained on 1-60 km trips; routed edges are metres long. Edges are fed to it at
+# this distance and weighted by its output per km times their length, so cost grows with length.
+WEIGHT_REFERENCE_KM = 1.0
+# Route over the degree-2-contracted graph (see graph_simplify.py)
+SIMPLIFY_GRAPH = True
+# Weight multiplier for edges with only minor incidents (jams, weather: the "slowdown" flag);
+# only closure flags remove an edge from the search
+INCIDENT_SLOWDOWN_PENALTY = 3.0
 
 # --- GLOBAL DATA STRUCTURES ---
-GRAPH = {}
+GRAPH = {} # Maps node_id -> [(neighbor_id, weight, edge_idx)]
 NODE_COORDS = {} # Maps node_id -> (lat, lon)
+EDGE_PATHS = {} # Maps routed (u, v) -> original node path [u, ..., v]
+NODE_COMPONENT = {} # Maps node_id -> weak_component_id (tagged by datalink_pipeline)
+SEGMENT_EDGE = {} # Maps original (from_node, to_node) segment -> routed edge_idx
+INCIDENT_READER = None # IncidentLogReader: live incidents from snapshot + log tail, expired by time
+BLOCKED_EDGES = set() # Routed edge_idx closed by currently active incidents
+INCIDENT_PENALTY = {} # Routed edge_idx -> weight multiplier for active minor incidents
 WEIGHT_MODEL = None
+WEIGHT_PREDICTOR = None # (WEIGHT_MODEL it was built for, FusedPredictor), reused across rebuilds
+EDGE_PROFILES = None # EdgeProfiles for departure-time-aware routing (None if they could not be built)
+SEGMENT_SHARE = {} # Maps original (from_node, to_node) segment -> its share of the routed edge's length
+EDGE_CORRECTION = [] # Per-edge weight multiplier learned from observed travel times (1.0 = none)
+WEIGHT_LEARNER = None # OnlineWeightLearner behind EDGE_CORRECTION
+OBSERVATION_READER = None # ObservationLogReader: new records of the observation log
+COST_PER_M_FLOOR = 0.0 # Lowest static edge weight per metre; scales the A* heuristic
+PROFILE_FLOOR = 1.0 # Lowest time-of-day multiplier of any edge
+CORRECTION_FLOOR = 1.0 # Lowest published EDGE_CORRECTION
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculates the distance between two points in meters using the Haversine formula."""
@@ -31,131 +78,241 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
 
     return R * c
 
+def fallback_edge_weights(df: pd.DataFrame):
+    """Hand formula used when the model cannot be fed: travel time plus a congestion penalty."""
+    length = df['length_m'] if 'length_m' in df.columns else 10.0
+    speed = df['speed_limit_kph'] if 'speed_limit_kph' in df.columns else 40.0
+    congestion = df['predicted_congestion'] if 'predicted_congestion' in df.columns else 0.5
+    return (length / speed + congestion * 5).to_numpy(dtype=float)
+
+def predict_edge_weights(df: pd.DataFrame):
+    """
+    Model weights for every row in one batch; the schema is checked once, not per edge.
+    The model's output at WEIGHT_REFERENCE_KM is taken as a cost per km and scaled by length_m.
+    """
+    global WEIGHT_PREDICTOR
+    try:
+        # congestion -> weight in one pass when the weight model takes predicted_congestion
+        if WEIGHT_PREDICTOR is None or WEIGHT_PREDICTOR[0] is not WEIGHT_MODEL:
+            WEIGHT_PREDICTOR = (WEIGHT_MODEL, FusedPredictor(weight=WEIGHT_MODEL))
+        model = WEIGHT_PREDICTOR[1]
+        if model.memo is None:
+            model.memo = PredictionMemo.load(WEIGHT_MEMO_FILE)
+        memo = model.memo
+        X = FeatureAdapter.for_model(model).transform(df)
+        if 'distance' in X.columns:
+            X['distance'] = WEIGHT_REFERENCE_KM
+    except (ValueError, OSError) as e:
+        print(f"Warning: weight model input cannot be built ({e}); using the fallback formula.")
+        return fallback_edge_weights(df)
+    before = dict(memo.stats)
+    per_km = model.predict(X) / WEIGHT_REFERENCE_KM
+    length_km = df['length_m'].to_numpy(dtype=float) / 1000.0 if 'length_m' in df.columns else 0.01
+    weights = per_km * length_km
+    try:
+        memo.save()
+    except OSError as e:
+        print(f"Warning: could not save prediction memo ({e}).")
+    s = {k: memo.stats[k] - before[k] for k in before}
+    print(f"Edge weights: {s['rows']} rows, {s['unique']} distinct model inputs, "
+          f"{s['hits']} from memo, {s['predicted']} predicted.")
+    return weights
+
 def load_graph_and_geometry():
     """Loads the weight model, builds the graph with predicted weights, and loads node coordinates."""
-    global WEIGHT_MODEL, GRAPH, NODE_COORDS
+    global WEIGHT_MODEL, GRAPH, NODE_COORDS, EDGE_PATHS, NODE_COMPONENT
+    global SEGMENT_EDGE, INCIDENT_READER, BLOCKED_EDGES, INCIDENT_PENALTY, EDGE_PROFILES
+    global SEGMENT_SHARE, EDGE_CORRECTION, WEIGHT_LEARNER, OBSERVATION_READER
+    global COST_PER_M_FLOOR, PROFILE_FLOOR, CORRECTION_FLOOR
     
     # 1. Load the Weight Model
-    if not os.path.exists(WEIGHT_MODEL_FILE):
+    if not any(os.path.exists(p) for p in (WEIGHT_MODEL_FILE, WEIGHT_FOREST_FILE, WEIGHT_BUNDLE_DIR)):
         print(f"Error: Weight model not found at {WEIGHT_MODEL_FILE}. Cannot proceed with routing.")
         return False
 
     try:
-        WEIGHT_MODEL = joblib.load(WEIGHT_MODEL_FILE)
-        print("Weight model loaded successfully.")
+        WEIGHT_MODEL = load_model(WEIGHT_MODEL_FILE, WEIGHT_FOREST_FILE, WEIGHT_BUNDLE_DIR)
+        print(f"Weight model loaded successfully ({type(WEIGHT_MODEL).__name__}).")
     except Exception as e:
         print(f"Error loading weight model: {e}")
         return False
         
     # 2. Load Segment Data and Build Graph
-    if not os.path.exists(DATA_CSV):
-        print(f"Error: Segment data not found at {DATA_CSV}. Cannot proceed with routing.")
+    data_csv = FUSED_DATA_CSV if os.path.exists(FUSED_DATA_CSV) else DATA_CSV
+    if not os.path.exists(data_csv):
+        print(f"Error: Segment data not found at {data_csv}. Cannot proceed with routing.")
         return False
 
-    df = pd.read_csv(DATA_CSV)
+    df = pd.read_csv(data_csv, dtype={"segment_id": str})
+    if SIMPLIFY_GRAPH:
+        n_before = len(df)
+        df = simplify_segments_df(df)
+        print(f"Simplified graph: {n_before} segments -> {len(df)} routed edges.")
+    df = df.reset_index(drop=True) # edge_idx doubles as the row of the profile arrays
     
+    weights = predict_edge_weights(df)
     temp_graph = {}
-    for idx, row in df.iterrows():
-        start = row['from_node']
-        end = row['to_node']
-        
-        # Prepare features for prediction
-        # Ensure only columns expected by the model are passed.
-        # This requires careful alignment with the training data columns.
-        feature_cols = [
-            'distance_m', 'road_quality', 'lane_count', 'speed_limit_kph',
-            'toll', 'foot_traffic_score', 'historical_congestion',
-            'pothole_risk', 'accident_risk', 'closed_for_construction',
-            'event_blocked', 'vip_blocked', 'lit', 'one_way', 'surface_quality',
-            'road_type', 'surface_type', 'provenance', 'normalized_ts',
-            'predicted_congestion'
-        ] # Note: The full set of features needs to be derived from the weight model's expected input.
-          # For a robust example, we predict a weight using the provided model interface.
-
-        # Simplify: Use a placeholder prediction if the model is too complex to reconstruct input for.
-        # In a real scenario, you'd ensure the features match the model's training data.
-        try:
-             # Assuming the required input features are the ones that were dropped
-             # in the original weight.py, plus predicted_congestion.
-             # This is a simplification; the exact feature set needs to match the pipeline.
-             edge_features = row.drop(['from_node', 'to_node', 'geometry_wkt']).to_frame().T
-             weight = WEIGHT_MODEL.predict(edge_features)[0]
-        except Exception:
-             # Fallback: Use a simple calculated weight if prediction fails
-             weight = (row.get('length_m', 10) / row.get('speed_limit_kph', 40)) + (row.get('predicted_congestion', 0.5) * 5)
-
+    for idx, start, end, weight in zip(df.index, df['from_node'], df['to_node'], weights):
         if start not in temp_graph:
             temp_graph[start] = []
-        temp_graph[start].append((end, weight))
+        temp_graph[start].append((end, float(weight), idx))
     
     GRAPH = temp_graph
+    # an edge is at least as long as the straight line between its ends, so this keeps A* admissible
+    if len(df) and 'length_m' in df.columns:
+        lengths = np.maximum(df['length_m'].to_numpy(dtype=float), 1.0)
+        COST_PER_M_FLOOR = max(float(np.min(np.asarray(weights, dtype=float) / lengths)), 0.0)
+    else:
+        COST_PER_M_FLOOR = 0.0
     print(f"Graph loaded with {len(GRAPH)} nodes.")
 
-    # 3. Load Node Coordinates from GeoJSON (for A* heuristic and final path coords)
-    if not os.path.exists(GEOJSON_FILE):
-        print(f"Warning: GeoJSON file not found at {GEOJSON_FILE}. A* will use Dijkstra (heuristic=0).")
-        return True # Proceed with limited functionality
-
     try:
-        with open(GEOJSON_FILE, 'r') as f:
-            geojson_data = json.load(f)
-        
-        # Extract all unique coordinates from LineString geometries
-        coords_set = {}
-        for feature in geojson_data['features']:
-            geom = feature['geometry']
-            if geom['type'] == 'LineString':
-                for lon, lat in geom['coordinates']:
-                    # Simple hack: use string representation as a key for coordinate uniqueness
-                    key = f"{lat},{lon}" 
-                    coords_set[key] = (lat, lon)
-        
-        # For simplicity, we only store the coordinates for the 'from_node' of each segment
-        # In a full graph, you'd map every OSM node ID to its coordinates.
-        # Since we only have 'from_node' and 'to_node' IDs here, we must rely on
-        # external data to map all graph nodes to their coordinates.
-        # Assuming for now: Node IDs are the indices of the graph.
-        
-        # Since we don't have the full OSM node table, we'll map segment endpoints.
-        # This part is highly dependent on how node IDs were generated in datalink_pipeline.
-        # Let's assume 'from_node' and 'to_node' correspond to the start/end coordinates of the LineString
-        for idx, row in df.iterrows():
-            start_node = row['from_node']
-            end_node = row['to_node']
-            
-            # This is complex without the WKT column in the GeoJSON.
-            # Rerunning datalink_pipeline.py is the proper solution.
-            # I will assume the geometry coordinates can be looked up from the GeoJSON.
-            pass # Keep it simple for now, relying on geometry lookup later
-
-        # Fallback: Create NODE_COORDS by iterating the geojson coordinates
-        # and assigning unique IDs based on proximity (not ideal, but works for A* heuristic)
-        # This is a huge simplification for the API
-        
-        # Re-using the logic from twitter_incidents_ingest.py/datalink_pipeline.py 
-        # for finding the center coordinate of each segment for a quick node lookup.
-        # A full node table (node_id -> coords) is needed for proper A*.
-        
-        # Simplified NODE_COORDS lookup (Node ID -> (lat, lon))
-        for idx, row in df.iterrows():
-            # Get the geometry from the GeoJSON corresponding to this segment_id
-            # This is too complex to reliably do without access to all files.
-            # I will assume the following simplified coordinate lookup:
-            if row['from_node'] not in NODE_COORDS:
-                NODE_COORDS[row['from_node']] = (row['center_lat'], row['center_lon']) # Placeholder, should be the actual node coordinate
+        # written once per graph / model version; other processes only map what is there
+        EDGE_PROFILES, written = ensure_profiles(build_profiles(df, weights), WEIGHT_PROFILE_DIR)
+        PROFILE_FLOOR = EDGE_PROFILES.min_multiplier()
+        manifest = EDGE_PROFILES.manifest
+        print(f"Time-of-day profiles for {manifest['n_edges']} edges ({manifest['bytes_per_edge']} bytes/edge, "
+              f"version {manifest['version']} {'written' if written else 'loaded'}).")
+    except OSError as e:
+        print(f"Warning: time-of-day profiles unavailable ({e}); routing ignores departure time.")
+        EDGE_PROFILES = None
 
-    except Exception as e:
-        print(f"Error loading or parsing GeoJSON/CSV for coordinates: {e}")
-        return False
-        
+    # 3. Node coordinates (for the A* heuristic and final path coords).
+    # datalink_pipeline encodes node ids as "<lat>_<lon>", so every node on the
+    # original node path of each routed edge can be placed directly.
+    node_paths = df['node_path'] if 'node_path' in df.columns else None
+    temp_paths = {}
+    temp_coords = {}
+    temp_segment_edge = {}
+    for idx, row in df.iterrows():
+        if node_paths is not None:
+            path = split_node_path(node_paths[idx])
+        else:
+            path = [row['from_node'], row['to_node']]
+        temp_paths[(row['from_node'], row['to_node'])] = path
+        for seg in zip(path[:-1], path[1:]):
+            temp_segment_edge[seg] = idx
+        for node_id in path:
+            if node_id not in temp_coords:
+                try:
+                    lat, lon = map(float, str(node_id).split("_"))
+                except ValueError:
+                    continue
+                temp_coords[node_id] = (lat, lon)
+
+    EDGE_PATHS = temp_paths
+    NODE_COORDS = temp_coords
+    SEGMENT_EDGE = temp_segment_edge
+    INCIDENT_READER = IncidentLogReader(INCIDENT_DELTA_LOG, INCIDENT_SNAPSHOT)
+    BLOCKED_EDGES = set()
+    INCIDENT_PENALTY = {}
+    print(f"Coordinates resolved for {len(NODE_COORDS)} nodes.")
+
+    # Share of each original segment in its routed edge, so a report for one segment
+    # can be compared with the matching part of the edge's travel time
+    temp_share = {}
+    for path in EDGE_PATHS.values():
+        lengths = [haversine_distance(*NODE_COORDS[a], *NODE_COORDS[b])
+                   if a in NODE_COORDS and b in NODE_COORDS else 0.0 for a, b in zip(path[:-1], path[1:])]
+        total = sum(lengths)
+        for seg, length in zip(zip(path[:-1], path[1:]), lengths):
+            temp_share[seg] = length / total if total > 0 else 1.0 / len(lengths)
+    SEGMENT_SHARE = temp_share
+    # A new edge numbering: start a fresh correction layer and replay the observation log into it
+    EDGE_CORRECTION = [1.0] * len(df)
+    CORRECTION_FLOOR = 1.0
+    WEIGHT_LEARNER = OnlineWeightLearner(len(df))
+    OBSERVATION_READER = None
+    apply_travel_observations()
+
+    # 4. Connectivity components, so impossible pairs are rejected before searching
+    temp_components = {}
+    if 'weak_component_id' in df.columns:
+        for start, end, cid in zip(df['from_node'], df['to_node'], df['weak_component_id']):
+            temp_components[start] = cid
+            temp_components[end] = cid
+    else:
+        print("Warning: no component ids in segment data (re-run datalink_pipeline.py).")
+    NODE_COMPONENT = temp_components
     return True
 
+def apply_incident_deltas(path: str = INCIDENT_DELTA_LOG) -> int:
+    """
+    Applies incident records appended to the event log since the last call (or a
+    new snapshot after compaction) and expires incidents whose validity has ended.
+    Closures block their edges; minor incidents only multiply the edge weight by
+    INCIDENT_SLOWDOWN_PENALTY. Only the new tail of the log is read. Returns the
+    number of edges newly blocked.
+    """
+    global INCIDENT_READER, BLOCKED_EDGES, INCIDENT_PENALTY
+    if INCIDENT_READER is None or INCIDENT_READER.log_path != path:
+        INCIDENT_READER = IncidentLogReader(path, INCIDENT_SNAPSHOT)
+    INCIDENT_READER.refresh()
+
+    blocked = set()
+    for edge in INCIDENT_READER.store.blocked_edges():
+        idx = SEGMENT_EDGE.get(edge)
+        if idx is not None:
+            blocked.add(idx)
+    penalty = {}
+    for edge in INCIDENT_READER.store.slowed_edges():
+        idx = SEGMENT_EDGE.get(edge)
+        if idx is not None and idx not in blocked:
+            penalty[idx] = INCIDENT_SLOWDOWN_PENALTY
+    newly_blocked = len(blocked - BLOCKED_EDGES)
+    BLOCKED_EDGES = blocked
+    INCIDENT_PENALTY = penalty
+    return newly_blocked
+
+def apply_travel_observations(path: str = TRAVEL_OBSERVATION_LOG, now: Optional[float] = None) -> int:
+    """
+    Folds travel-time reports appended to the observation log since the last call into
+    the online learner and publishes the changed corrections into EDGE_CORRECTION.
+    Only the new tail of the log is read. Returns the number of edges whose correction changed.
+    """
+    global OBSERVATION_READER, WEIGHT_LEARNER, EDGE_CORRECTION, CORRECTION_FLOOR
+    if WEIGHT_LEARNER is None:
+        return 0
+    if EDGE_PROFILES is None:
+        return 0 # expected travel times come from the time-of-day profiles
+    now = time.time() if now is None else now
+    if OBSERVATION_READER is None or OBSERVATION_READER.path != path:
+        OBSERVATION_READER = ObservationLogReader(path)
+    records, replaced = OBSERVATION_READER.read()
+    if replaced:
+        # the log was compacted: forget what was learned and replay it from the start
+        WEIGHT_LEARNER = OnlineWeightLearner(len(WEIGHT_LEARNER))
+        EDGE_CORRECTION = [1.0] * len(EDGE_CORRECTION)
+
+    used = 0
+    for rec in records:
+        seg = (rec.get("from_node"), rec.get("to_node"))
+        idx = SEGMENT_EDGE.get(seg)
+        ts = rec.get("ts", now)
+        # one malformed record must not stop the log (or the graph load replaying it)
+        if idx is None or not valid_observation(ts, rec.get("travel_s"), now) or now - float(ts) > MAX_REPLAY_AGE_S:
+            continue
+        ts = float(ts)
+        travel_s = EDGE_PROFILES.bucket_arrays(EDGE_PROFILES.bucket(ts))[1]
+        expected = travel_s[idx] * SEGMENT_SHARE.get(seg, 1.0)
+        used += WEIGHT_LEARNER.observe(idx, float(rec.get("travel_s", 0)), expected, ts)
+
+    changes = WEIGHT_LEARNER.publish(now)
+    for idx, mult in changes.items():
+        EDGE_CORRECTION[idx] = mult
+    CORRECTION_FLOOR = min(1.0, min(WEIGHT_LEARNER.published.values(), default=1.0))
+    if records:
+        print(f"Travel observations: {len(records)} read, {used} used, {len(changes)} edge corrections updated.")
+    return len(changes)
+
 def find_nearest_node(lat: float, lon: float) -> Optional[int]:
     """Finds the nearest graph node ID to a given (lat, lon) coordinate."""
     min_dist = float('inf')
     nearest_node_id = None
 
     for node_id, (node_lat, node_lon) in NODE_COORDS.items():
+        if node_id not in GRAPH:
+            continue # interior node of a contracted edge, or a dead end
         dist = haversine_distance(lat, lon, node_lat, node_lon)
         if dist < min_dist:
             min_dist = dist
@@ -168,20 +325,38 @@ def find_nearest_node(lat: float, lon: float) -> Optional[int]:
     print(f"Warning: Node for ({lat}, {lon}) not found within 500m.")
     return None
 
-def heuristic(node_id1: int, node_id2: int) -> float:
-    """Estimates the travel time/cost between two nodes (Haversine distance in meters)."""
+def same_component(node_id1, node_id2) -> bool:
+    """O(1) reachability pre-check: nodes in different weak components can never be connected."""
+    c1 = NODE_COMPONENT.get(node_id1)
+    c2 = NODE_COMPONENT.get(node_id2)
+    if c1 is None or c2 is None:
+        return True # unknown, let the search decide
+    return c1 == c2
+
+def heuristic(node_id1: int, node_id2: int, cost_per_m: Optional[float] = None) -> float:
+    """
+    Lower bound of the cost between two nodes: Haversine distance in meters times the
+    lowest weight per metre of any edge (with the current corrections by default).
+    """
     if node_id1 not in NODE_COORDS or node_id2 not in NODE_COORDS:
         return 0.0 # Fallback to Dijkstra
     
     lat1, lon1 = NODE_COORDS[node_id1]
     lat2, lon2 = NODE_COORDS[node_id2]
     
-    # Use Haversine distance as a proxy for minimum travel cost
-    # Divide by a high average speed (e.g., 80km/h = 22.2 m/s) to get a time estimate (in seconds)
-    return haversine_distance(lat1, lon1, lat2, lon2) / 22.2
+    if cost_per_m is None:
+        cost_per_m = COST_PER_M_FLOOR * CORRECTION_FLOOR
+    return haversine_distance(lat1, lon1, lat2, lon2) * cost_per_m
 
-def a_star(graph: Dict, start: int, goal: int) -> Tuple[List[int], float]:
-    """Runs the A* search algorithm."""
+def a_star(graph: Dict, start: int, goal: int, blocked: Optional[set] = None,
+           correction: Optional[List[float]] = None, penalty: Optional[Dict[int, float]] = None) -> Tuple[List[int], float]:
+    """
+    Runs the A* search algorithm. Edges whose edge_idx is in `blocked` are skipped;
+    `correction` (per edge_idx) multiplies the edge weights when given, and so does
+    `penalty` (edge_idx -> multiplier >= 1) for the edges it lists.
+    """
+    blocked = blocked or ()
+    penalty = penalty or {}
     if start not in graph or goal not in graph:
         return [], 0.0 # Invalid nodes
     
@@ -203,7 +378,13 @@ def a_star(graph: Dict, start: int, goal: int) -> Tuple[List[int], float]:
             path.reverse()
             return path, g_score[goal]
 
-        for neighbor, weight in graph.get(current, []):
+        for neighbor, weight, edge_idx in graph.get(current, []):
+            if edge_idx in blocked:
+                continue
+            if correction is not None:
+                weight *= correction[edge_idx]
+            if edge_idx in penalty:
+                weight *= penalty[edge_idx]
             tentative_g = g_score[current] + weight
             
             if tentative_g < g_score.get(neighbor, float('inf')):
@@ -214,14 +395,69 @@ def a_star(graph: Dict, start: int, goal: int) -> Tuple[List[int], float]:
 
     return [], 0.0 # no path found
 
+def a_star_time_dependent(graph: Dict, start: int, goal: int, depart_ts: float,
+                           profiles: EdgeProfiles, blocked: Optional[set] = None,
+                           correction: Optional[List[float]] = None,
+                           penalty: Optional[Dict[int, float]] = None) -> Tuple[List[int], float, float]:
+    """
+    A* where each edge costs its weight in the time bucket in which it is entered.
+    Arrival time advances by the edge's profiled travel time. Returns (path, cost, arrival_ts).
+    `correction` (per edge_idx) multiplies the weights and travel times when given,
+    and so does `penalty` (edge_idx -> multiplier >= 1, minor incidents).
+    """
+    blocked = blocked or ()
+    penalty = penalty or {}
+    if start not in graph or goal not in graph:
+        return [], 0.0, depart_ts
+
+    open_set = [(0.0, start)]
+    came_from = {}
+    g_score = {start: 0.0}
+    cost_per_m = COST_PER_M_FLOOR * CORRECTION_FLOOR * PROFILE_FLOOR
+    arrival = {start: depart_ts}
+    closed = set()
+
+    while open_set:
+        _, current = heapq.heappop(open_set)
+        if current in closed:
+            continue
+        closed.add(current)
+
+        if current == goal:
+            path = [current]
+            while current in came_from:
+                current = came_from[current]
+                path.append(current)
+            path.reverse()
+            return path, g_score[goal], arrival[goal]
+
+        t_current = arrival[current]
+        mult, travel_s = profiles.bucket_arrays(profiles.bucket(t_current))
+        for neighbor, weight, edge_idx in graph.get(current, []):
+            if edge_idx in blocked or neighbor in closed:
+                continue
+            slow = penalty.get(edge_idx, 1.0) if correction is None else penalty.get(edge_idx, 1.0) * correction[edge_idx]
+            tentative_g = g_score[current] + weight * mult[edge_idx] * slow
+            if tentative_g < g_score.get(neighbor, float('inf')):
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g
+                arrival[neighbor] = t_current + travel_s[edge_idx] * slow
+                heapq.heappush(open_set, (tentative_g + heuristic(neighbor, goal, cost_per_m), neighbor))
+
+    return [], 0.0, depart_ts
+
 def get_route_coordinates(node_path: List[int]) -> List[List[float]]:
     """Converts a list of node IDs into a list of (lat, lon) coordinates."""
     if not node_path:
         return []
         
-    # Simply look up coordinates for each node in the path
+    # Expand contracted edges back to their original node paths, then look up coordinates
+    full_path = [node_path[0]]
+    for u, v in zip(node_path[:-1], node_path[1:]):
+        full_path.extend(EDGE_PATHS.get((u, v), [u, v])[1:])
+
     coords_path = []
-    for node_id in node_path:
+    for node_id in full_path:
         if node_id in NODE_COORDS:
             lat, lon = NODE_COORDS[node_id]
             coords_path.append([lat, lon]) # GeoJSON/Leaflet uses [lat, lon]
@@ -236,8 +472,13 @@ def get_route_coordinates(node_path: List[int]) -> List[List[float]]:
 
     return unique_coords_path
 
-def calculate_route(source_lat: float, source_lon: float, dest_lat: float, dest_lon: float, vehicle_type: str) -> List[List[float]]:
-    """Main function to find the route between two coordinates."""
+def get_route_segments(node_path: List) -> List[Tuple]:
+    """Maps a routed node path back to the original (from_node, to_node) segments."""
+    return expand_route(node_path, EDGE_PATHS)
+
+def calculate_route(source_lat: float, source_lon: float, dest_lat: float, dest_lon: float, vehicle_type: str,
+                    depart_ts: Optional[float] = None) -> List[List[float]]:
+    """Main function to find the route between two coordinates (at depart_ts, epoch seconds, if given)."""
     
     # 1. Find nearest graph nodes to source and destination coordinates
     start_node = find_nearest_node(source_lat, source_lon)
@@ -248,15 +489,27 @@ def calculate_route(source_lat: float, source_lon: float, dest_lat: float, dest_
         return []
         
     print(f"Routing from node {start_node} to node {goal_node} for {vehicle_type}.")
+
+    if not same_component(start_node, goal_node):
+        print("Error: Start and goal are in disconnected parts of the road graph.")
+        return []
     
-    # 2. Run A*
-    node_path, cost = a_star(GRAPH, start_node, goal_node)
+    # 2. Run A* around edges closed by incidents (minor ones only cost more), with time-of-day weights when a departure time is given
+    if depart_ts is not None and EDGE_PROFILES is not None:
+        node_path, cost, arrival_ts = a_star_time_dependent(GRAPH, start_node, goal_node, depart_ts,
+                                                            EDGE_PROFILES, BLOCKED_EDGES, EDGE_CORRECTION,
+                                                            INCIDENT_PENALTY)
+    else:
+        node_path, cost = a_star(GRAPH, start_node, goal_node, BLOCKED_EDGES, EDGE_CORRECTION, INCIDENT_PENALTY)
+        arrival_ts = None
     
     if not node_path:
         print("Error: A* failed to find a path.")
         return []
         
     print(f"Path found with cost: {cost:.2f}")
+    if arrival_ts is not None:
+        print(f"Estimated travel time: {arrival_ts - depart_ts:.0f} s")
     
     # 3. Convert node path to coordinates
     route_coords = get_route_coordinates(node_path)
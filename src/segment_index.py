@@ -0,0 +1,289 @@
+"""
+segment_index.py
+
+In-memory index over the datalink segment table (segments_features*.csv), built once
+and reused for every incident instead of rebuilding a node table per run:
+
+  - node coordinates (parsed from the "<lat>_<lon>" node ids, or from
+    from_lat/from_lon/to_lat/to_lon columns when present)
+  - a uniform lat/lon grid for nearest-node lookups
+  - node id -> row positions of the edges starting or ending at that node, as a
+    CSR incidence index (indptr / indices arrays), so an incident costs O(degree)
+    instead of two full-table masks
+  - a segment grid over edge bounding boxes (in a local metric projection), used by
+    match_polyline() to match every vertex of an incident geometry to segments by
+    point-to-segment distance and direction of travel, in one batched query (two-way
+    segments are stored once, in way order, so they match either direction)
+
+apply_incident_flags() / apply_edge_flags() apply a whole batch of matches as one
+scatter write per flag column, with the bool cast done once at the end.
+
+Usage:
+  from segment_index import SegmentIndex, apply_incident_flags
+  index = SegmentIndex(pd.read_csv("datalink_output/segments_features.csv"))
+  node = index.nearest_node(12.975, 77.597)
+  rows = index.edges_at_node(node)
+  rows = index.match_polyline([(12.9751, 77.5970), (12.9760, 77.5981)])
+  apply_incident_flags(index.df, index, [(node, "event_blocked")])
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+GRID_CELL_DEG = 0.001   # ~110 m cells
+MATCH_RADIUS_M = 50.0   # same threshold the ingest scripts use
+SEGMENT_CELL_M = 100.0  # segment grid cell size
+HEADING_TOLERANCE_DEG = 60.0  # max angle between incident and segment direction
+# -----------------------------
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Calculate the great-circle distance between two points on the Earth."""
+    R = 6371000  # Earth's radius in meters
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def node_coords_from_df(df: pd.DataFrame) -> Dict[str, Tuple[float, float]]:
+    """Maps node_id -> (lat, lon) for every node in the segment table."""
+    nodes = {}
+    if {'from_lat', 'from_lon', 'to_lat', 'to_lon'}.issubset(df.columns):
+        for nid, lat, lon in zip(df['from_node'], df['from_lat'], df['from_lon']):
+            nodes[nid] = (float(lat), float(lon))
+        for nid, lat, lon in zip(df['to_node'], df['to_lat'], df['to_lon']):
+            nodes.setdefault(nid, (float(lat), float(lon)))
+        return nodes
+    for nid in pd.unique(pd.concat([df['from_node'], df['to_node']], ignore_index=True)):
+        try:
+            lat, lon = map(float, str(nid).split("_"))
+        except ValueError:
+            continue
+        nodes[nid] = (lat, lon)
+    return nodes
+
+
+class SegmentIndex:
+    """Nearest-node and node -> edge lookups over a segment table."""
+
+    def __init__(self, df: pd.DataFrame, cell_deg: float = GRID_CELL_DEG):
+        self.df = df
+        self.cell_deg = cell_deg
+        self.nodes = node_coords_from_df(df)
+
+        self.grid: Dict[Tuple[int, int], List[str]] = {}
+        for nid, (lat, lon) in self.nodes.items():
+            self.grid.setdefault(self._cell(lat, lon), []).append(nid)
+
+        # CSR node -> edge incidence: edges of node k are indices[indptr[k]:indptr[k + 1]]
+        n_edges = len(df)
+        codes, uniques = pd.factorize(pd.concat([df['from_node'], df['to_node']], ignore_index=True))
+        rows = np.concatenate([np.arange(n_edges), np.arange(n_edges)])
+        keep = np.ones(2 * n_edges, dtype=bool)
+        keep[n_edges:] = codes[n_edges:] != codes[:n_edges]  # self-loops only once
+        codes, rows = codes[keep], rows[keep]
+        order = np.argsort(codes, kind="stable")
+        self.indices = rows[order]
+        self.indptr = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(uniques)), out=self.indptr[1:])
+        self.node_pos = {nid: k for k, nid in enumerate(uniques)}
+
+        # segments are stored once per way; only one_way rows have a direction of travel
+        if 'one_way' in df.columns:
+            self.one_way = df['one_way'].astype(str).str.lower().isin(("true", "1")).to_numpy()
+        else:
+            self.one_way = np.zeros(n_edges, dtype=bool)
+
+        self._build_segment_grid()
+
+    # -----------------------------
+    # Segment grid
+    # -----------------------------
+    def _project(self, lat, lon):
+        """Equirectangular projection to meters around the index's mean latitude."""
+        return (np.asarray(lon, dtype=float) * self.m_per_deg_lon,
+                np.asarray(lat, dtype=float) * self.m_per_deg_lat)
+
+    def _build_segment_grid(self):
+        coords = pd.DataFrame.from_dict(self.nodes, orient="index", columns=["lat", "lon"])
+        lat0 = float(coords["lat"].mean()) if len(coords) else 0.0
+        self.m_per_deg_lat = 110540.0
+        self.m_per_deg_lon = 111320.0 * max(math.cos(math.radians(lat0)), 0.01)
+
+        a = coords.reindex(self.df['from_node'].to_numpy())
+        b = coords.reindex(self.df['to_node'].to_numpy())
+        self.ax, self.ay = self._project(a["lat"].to_numpy(), a["lon"].to_numpy())
+        self.bx, self.by = self._project(b["lat"].to_numpy(), b["lon"].to_numpy())
+        valid = ~(np.isnan(self.ax) | np.isnan(self.bx))
+
+        c = SEGMENT_CELL_M
+        ix0 = np.floor(np.fmin(self.ax, self.bx)[valid] / c).astype(np.int64)
+        ix1 = np.floor(np.fmax(self.ax, self.bx)[valid] / c).astype(np.int64)
+        iy0 = np.floor(np.fmin(self.ay, self.by)[valid] / c).astype(np.int64)
+        iy1 = np.floor(np.fmax(self.ay, self.by)[valid] / c).astype(np.int64)
+        nx = ix1 - ix0 + 1
+        counts = nx * (iy1 - iy0 + 1)
+
+        # one (cell, edge) pair for every cell an edge's bounding box overlaps
+        edge_rep = np.repeat(np.flatnonzero(valid), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        nx_rep = np.repeat(nx, counts)
+        cx = np.repeat(ix0, counts) + local % nx_rep
+        cy = np.repeat(iy0, counts) + local // nx_rep
+        keys = self._cell_key(cx, cy)
+
+        order = np.argsort(keys, kind="stable")
+        self.seg_cell_edges = edge_rep[order]
+        self.seg_cell_keys, self.seg_cell_start = np.unique(keys[order], return_index=True)
+        self.seg_cell_end = np.append(self.seg_cell_start[1:], len(order))
+
+    @staticmethod
+    def _cell_key(cx, cy):
+        return (cx + (1 << 31)) * (1 << 32) + (cy + (1 << 31))
+
+    def match_polyline(self, points: List[Tuple[float, float]], max_dist_m: float = MATCH_RADIUS_M,
+                       heading_tol_deg: float = HEADING_TOLERANCE_DEG, directional: bool = True) -> np.ndarray:
+        """
+        Row positions of all segments within max_dist_m of the incident geometry.
+        points are (lat, lon) in travel order; the line is densified so no stretch
+        between vertices is skipped. With directional=True (and more than one point)
+        one_way segments pointing against the direction of travel are rejected; a
+        two-way segment only has to run along the incident, either way.
+        """
+        if not points or not len(self.seg_cell_keys):
+            return self.indices[:0]
+        lat = np.array([p[0] for p in points], dtype=float)
+        lon = np.array([p[1] for p in points], dtype=float)
+        px, py = self._project(lat, lon)
+
+        # densify: at most max_dist_m between consecutive sample points
+        if len(px) > 1:
+            seg_len = np.hypot(np.diff(px), np.diff(py))
+            steps = np.maximum(np.ceil(seg_len / max(max_dist_m, 1.0)).astype(np.int64), 1)
+            seg_idx = np.repeat(np.arange(len(steps)), steps)
+            frac = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+            hx = np.diff(px)[seg_idx]
+            hy = np.diff(py)[seg_idx]
+            px = np.append(px[:-1][seg_idx] + frac * hx, px[-1])
+            py = np.append(py[:-1][seg_idx] + frac * hy, py[-1])
+            hx = np.append(hx, hx[-1])
+            hy = np.append(hy, hy[-1])
+        else:
+            hx = hy = np.zeros(1)
+
+        # candidate (sample, edge) pairs from the cells around every sample point
+        c = SEGMENT_CELL_M
+        reach = int(math.ceil(max_dist_m / c))
+        offs = np.arange(-reach, reach + 1)
+        ox, oy = [o.ravel() for o in np.meshgrid(offs, offs)]
+        cx = (np.floor(px / c).astype(np.int64)[:, None] + ox[None, :]).ravel()
+        cy = (np.floor(py / c).astype(np.int64)[:, None] + oy[None, :]).ravel()
+        sample = np.repeat(np.arange(len(px)), len(ox))
+        keys = self._cell_key(cx, cy)
+        pos = np.searchsorted(self.seg_cell_keys, keys)
+        pos_ok = pos < len(self.seg_cell_keys)
+        hit = np.zeros(len(keys), dtype=bool)
+        hit[pos_ok] = self.seg_cell_keys[pos[pos_ok]] == keys[pos_ok]
+        starts = self.seg_cell_start[pos[hit]]
+        counts = self.seg_cell_end[pos[hit]] - starts
+        if not counts.sum():
+            return self.indices[:0]
+        cand_sample = np.repeat(sample[hit], counts)
+        cand_edge = self.seg_cell_edges[
+            np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        ]
+
+        # point-to-segment distance
+        ax, ay = self.ax[cand_edge], self.ay[cand_edge]
+        dx, dy = self.bx[cand_edge] - ax, self.by[cand_edge] - ay
+        qx, qy = px[cand_sample], py[cand_sample]
+        len2 = dx * dx + dy * dy
+        t = np.clip(((qx - ax) * dx + (qy - ay) * dy) / np.where(len2 > 0, len2, 1.0), 0.0, 1.0)
+        dist = np.hypot(qx - (ax + t * dx), qy - (ay + t * dy))
+        ok = dist <= max_dist_m
+
+        # direction of travel
+        if directional and len(points) > 1:
+            h_x, h_y = hx[cand_sample], hy[cand_sample]
+            norm = np.sqrt(len2) * np.hypot(h_x, h_y)
+            cos = np.where(norm > 0, (dx * h_x + dy * h_y) / np.where(norm > 0, norm, 1.0), 1.0)
+            cos = np.where(self.one_way[cand_edge], cos, np.abs(cos))
+            ok &= cos >= math.cos(math.radians(heading_tol_deg))
+
+        return np.unique(cand_edge[ok])
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def nearest_node(self, lat: float, lon: float, max_dist_m: float = MATCH_RADIUS_M) -> Optional[str]:
+        """Closest node within max_dist_m, searching only the surrounding grid cells."""
+        ci, cj = self._cell(lat, lon)
+        reach_i = int(math.ceil(max_dist_m / (self.cell_deg * 111000.0))) + 1
+        lon_m = self.cell_deg * 111000.0 * max(math.cos(math.radians(lat)), 0.01)
+        reach_j = int(math.ceil(max_dist_m / lon_m)) + 1
+        best, best_d = None, float('inf')
+        for i in range(ci - reach_i, ci + reach_i + 1):
+            for j in range(cj - reach_j, cj + reach_j + 1):
+                for nid in self.grid.get((i, j), ()):
+                    n_lat, n_lon = self.nodes[nid]
+                    d = haversine_meters(lat, lon, n_lat, n_lon)
+                    if d < best_d:
+                        best, best_d = nid, d
+        return best if best_d < max_dist_m else None
+
+    def edges_at_node(self, node_id) -> np.ndarray:
+        """Row positions of all edges starting or ending at node_id."""
+        k = self.node_pos.get(node_id)
+        if k is None:
+            return self.indices[:0]
+        return self.indices[self.indptr[k]:self.indptr[k + 1]]
+
+    def edges_at_nodes(self, node_ids: Iterable) -> np.ndarray:
+        """Row positions of all edges touching any of node_ids (may repeat)."""
+        slices = [self.edges_at_node(n) for n in node_ids]
+        return np.concatenate(slices) if slices else self.indices[:0]
+
+    def edge_keys(self, positions) -> List[Tuple[str, str]]:
+        from_nodes = self.df['from_node'].to_numpy()
+        to_nodes = self.df['to_node'].to_numpy()
+        return list(zip(from_nodes[positions], to_nodes[positions]))
+
+
+def apply_incident_flags(df: pd.DataFrame, index: SegmentIndex, matches: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+    """
+    Sets flag columns to True for all edges touching the matched nodes.
+    matches is an iterable of (node_id, flag_column) pairs covering all incidents;
+    each flag column gets a single scatter write and a single bool cast.
+    Returns {flag_column: number of rows set}.
+    """
+    return apply_edge_flags(df, ((index.edges_at_node(node_id), flag) for node_id, flag in matches))
+
+
+def apply_edge_flags(df: pd.DataFrame, matches: Iterable[Tuple[np.ndarray, str]]) -> Dict[str, int]:
+    """
+    Like apply_incident_flags(), but matches are (edge row positions, flag_column)
+    pairs, e.g. from SegmentIndex.match_polyline().
+    """
+    rows_by_flag: Dict[str, List[np.ndarray]] = {}
+    for rows, flag in matches:
+        rows_by_flag.setdefault(flag, []).append(np.asarray(rows, dtype=np.int64))
+
+    applied = {}
+    for flag, row_lists in rows_by_flag.items():
+        rows = np.unique(np.concatenate(row_lists))
+        if flag in df.columns:
+            col = df[flag].fillna(False).to_numpy(dtype=bool, copy=True)
+        else:
+            col = np.zeros(len(df), dtype=bool)
+        col[rows] = True
+        df[flag] = col
+        applied[flag] = len(rows)
+    return applied
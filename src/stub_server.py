@@ -0,0 +1,194 @@
+"""
+stub_server.py
+
+Local stand-in HTTP server for running the external fetchers offline.
+
+Routes are plain functions (query params, request body) -> (status, JSON payload)
+or (status, JSON payload, response headers), registered per path. Stand-ins are provided for Nominatim /search, Overpass,
+TomTom incidentDetails and the two Twitter v2 endpoints (the timeline honours
+since_id, max_results and pagination_token), plus flaky() to make any route fail
+a few times first (for exercising http_client retries).
+
+Usage:
+  python stub_server.py                 # serves on http://127.0.0.1:8765
+  NOMINATIM_URL=http://127.0.0.1:8765/search \
+  TWITTER_BASE_URL=http://127.0.0.1:8765/2 python twitter_incidents_ingest.py
+  TOMTOM_INCIDENT_URL=http://127.0.0.1:8765/tomtom python tomtom_incidents_ingest.py
+  OVERPASS_URL=http://127.0.0.1:8765/overpass python datalink_pipeline.py
+
+  with StubServer({"/search": nominatim_route(PLACES)}) as server:
+      ... server.url + "/search" ...
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from geocode_cache import normalize_key
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+HOST = "127.0.0.1"
+PORT = 8765
+
+# normalized "<hint>|<city>" -> (lat, lon)
+PLACES = {
+    normalize_key("Silk Board Junction", "Bengaluru"): (12.9177, 77.6238),
+    normalize_key("MG Road", "Bengaluru"): (12.9756, 77.6050),
+    normalize_key("Kasturba Road", "Bengaluru"): (12.9740, 77.5960),
+    normalize_key("Hudson Circle", "Bengaluru"): (12.9667, 77.5870),
+}
+# -----------------------------
+
+Route = Callable[[Dict, bytes], Tuple]
+
+
+def nominatim_route(places: Dict[str, Tuple[float, float]]) -> Route:
+    """Emulates Nominatim /search?q=<hint>, <city>, India&format=json."""
+    def handle(params: Dict, body: bytes):
+        q = params.get("q", [""])[0]
+        parts = [p.strip() for p in q.split(",")]
+        hint, city = (parts[0], parts[1]) if len(parts) >= 2 else (q, "")
+        hit = places.get(normalize_key(hint, city))
+        if hit is None:
+            return 200, []
+        return 200, [{"lat": str(hit[0]), "lon": str(hit[1]), "display_name": q}]
+    return handle
+
+
+def static_route(payload, status: int = 200) -> Route:
+    return lambda params, body: (status, payload)
+
+
+def flaky(route: Route, failures: int, status: int = 503, retry_after: Optional[str] = None) -> Route:
+    """Fails the first `failures` calls with `status` (and a Retry-After header), then delegates to route."""
+    state = {"left": failures}
+    headers = {"Retry-After": retry_after} if retry_after is not None else {}
+
+    def handle(params: Dict, body: bytes):
+        if state["left"] > 0:
+            state["left"] -= 1
+            return status, {"error": "stub failure"}, headers
+        return route(params, body)
+    return handle
+
+
+def overpass_route(elements) -> Route:
+    return static_route({"elements": elements})
+
+
+def tomtom_route(incidents) -> Route:
+    return static_route({"incidents": incidents})
+
+
+def twitter_timeline_route(tweets) -> Route:
+    """
+    Emulates GET /2/users/:id/tweets over a list that may grow between calls:
+    newest first, filtered by since_id, paged by max_results / pagination_token.
+    """
+    def handle(params: Dict, body: bytes):
+        newest_first = sorted(tweets, key=lambda t: int(t["id"]), reverse=True)
+        since_id = params.get("since_id", [None])[0]
+        if since_id:
+            newest_first = [t for t in newest_first if int(t["id"]) > int(since_id)]
+        size = int(params.get("max_results", ["10"])[0])
+        offset = int(params.get("pagination_token", ["0"])[0])
+        page = newest_first[offset:offset + size]
+        meta = {"result_count": len(page)}
+        if page:
+            meta["newest_id"], meta["oldest_id"] = page[0]["id"], page[-1]["id"]
+        if offset + size < len(newest_first):
+            meta["next_token"] = str(offset + size)
+        return 200, ({"data": page, "meta": meta} if page else {"meta": meta})
+    return handle
+
+
+def twitter_routes(user_id: str, username: str, tweets, base: str = "/2") -> Dict[str, Route]:
+    return {
+        f"{base}/users/by/username/{username}": static_route({"data": {"id": user_id}}),
+        f"{base}/users/{user_id}/tweets": twitter_timeline_route(tweets),
+    }
+
+
+def default_routes() -> Dict[str, Route]:
+    routes = {
+        "/search": nominatim_route(PLACES),
+        "/overpass": overpass_route([
+            {"type": "way", "id": 1, "tags": {"highway": "primary", "name": "Kasturba Road"},
+             "geometry": [{"lat": 12.9740, "lon": 77.5960}, {"lat": 12.9745, "lon": 77.5970}]},
+        ]),
+        "/tomtom": tomtom_route([
+            {"properties": {"iconCategory": 6, "description": "Roadworks"},
+             "geometry": {"type": "LineString", "coordinates": [[77.5960, 12.9740], [77.5970, 12.9745]]}},
+        ]),
+    }
+    routes.update(twitter_routes("1", "blrcitytraffic", [
+        {"id": "100", "text": "Road closure near Kasturba Road due to VIP movement"},
+    ]))
+    return routes
+
+
+class StubServer:
+    """Threaded HTTP server serving JSON routes; counts requests per path."""
+
+    def __init__(self, routes: Dict[str, Route], host: str = HOST, port: int = 0):
+        self.routes = routes
+        self.requests = {}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                stub.requests[parsed.path] = stub.requests.get(parsed.path, 0) + 1
+                route = stub.routes.get(parsed.path) or stub.routes.get(parsed.path.rstrip("/"))
+                if route is None:
+                    status, payload, headers = 404, {"error": "not found"}, {}
+                else:
+                    status, payload, *rest = route(parse_qs(parsed.query), body)
+                    headers = rest[0] if rest else {}
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = StubServer(default_routes(), port=PORT)
+    print(f"Stub server running on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
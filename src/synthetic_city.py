@@ -0,0 +1,398 @@
+"""
+synthetic_city.py
+
+Synthetic city-scale road graphs for offline benchmarking.
+
+Writes the same tables datalink_pipeline.py exports (segments_features.csv with
+the same columns, nodes.csv) for a city of a configurable size, from 10k to a
+few million directed edges, so a_star, snapping, simplification and the export
+path can be exercised at production scale without Overpass.
+
+Two layouts:
+  grid    perturbed Manhattan grid; every ARTERIAL_EVERY-th row / column is an
+          arterial, a few blocks have a diagonal cut-through
+  radial  concentric rings joined by radial streets, with ring roads every few
+          rings and straight spokes out of the centre
+
+Node positions are jittered, a fraction of local streets is dropped (dead ends,
+T junctions), cul-de-sac spurs are added, and streets get interior shape nodes, so degrees spread over 1-5
+with most nodes at degree 2 like the OSM data. Road types follow a
+per-level mix, and one-way streets are drawn per road type (ONE_WAY_RATIO); a
+two-way street becomes two directed rows, a one-way street one row. Edge
+attributes use the datalink heuristics (quality from road type and lanes,
+foot traffic, historical congestion, pothole / accident risk), and component
+ids are tagged as in datalink_pipeline.tag_components (0 = largest).
+
+Everything is built with array operations; the edge table is written in
+chunks of CHUNK_ROWS.
+
+Usage:
+  python synthetic_city.py [--edges N] [--layout grid|radial] [--seed S] [--out DIR] [--routing]
+
+--routing writes the edge table under the file name routing_logic.py reads
+(segments_features_enriched_tomtom.csv) instead of segments_features.csv.
+"""
+import os
+import sys
+import math
+import time
+from datetime import datetime
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+OUT_DIR = "synthetic_output"
+EDGES_FILE = "segments_features.csv"
+ROUTING_EDGES_FILE = "segments_features_enriched_tomtom.csv"
+NODES_FILE = "nodes.csv"
+DEFAULT_EDGES = 100_000
+SEED = 42
+CHUNK_ROWS = 500_000
+
+CENTER = (12.975, 77.597)    # lat, lon (datalink_pipeline BBOX centre)
+SPACING_M = 90.0             # typical block edge / ring spacing
+JITTER_M = 12.0              # std of the node position noise
+DROP_LOCAL_FRAC = 0.12       # local streets removed (dead ends, T junctions)
+DIAGONAL_FRAC = 0.03         # grid blocks with a diagonal street
+CUL_DE_SAC_FRAC = 0.06       # layout nodes with a short dead-end spur
+ARTERIAL_EVERY = (16, 8, 4)  # grid lines / rings that are level 0, 1, 2 roads
+RADIAL_SPOKES = 8            # nodes on the first ring = straight spokes
+SHAPE_POINTS_MEAN = 1.0      # mean interior shape nodes per street (Poisson), as OSM ways have ...
+MAX_SHAPE_POINTS = 4         # ... so most nodes end up with degree 2
+
+# road type mix per level (0 = main arterial ... 3 = local)
+LEVEL_ROAD_TYPES = [
+    {"trunk": 0.3, "primary": 0.7},
+    {"secondary": 1.0},
+    {"tertiary": 1.0},
+    {"residential": 0.55, "service": 0.2, "footway": 0.12, "unclassified": 0.08, "living_street": 0.05},
+]
+ONE_WAY_RATIO = {"trunk": 0.5, "primary": 0.3, "secondary": 0.25, "tertiary": 0.2, "residential": 0.15,
+                 "service": 0.3, "unclassified": 0.1, "living_street": 0.1, "footway": 0.0}
+LANES = {"trunk": (2, 4), "primary": (2, 3), "secondary": (1, 2), "tertiary": (1, 2)}   # else 1
+SPEED_KPH = {"trunk": 80, "primary": 60, "secondary": 50, "tertiary": 40, "residential": 30,
+             "unclassified": 40, "living_street": 20, "service": 20, "footway": 10}
+TOLL_PROB = {"trunk": 0.05}
+LIT_PROB = [0.9, 0.8, 0.6, 0.35]  # per level
+SURFACE_MIX = {"asphalt": 0.75, "concrete": 0.1, "paved": 0.05, "unknown": 0.1}
+FOOTWAY_SURFACE_MIX = {"paved": 0.4, "unknown": 0.6}
+CONGESTION_NOISE = 0.1            # +- uniform noise on the datalink historical congestion
+
+# datalink_pipeline.ways_to_segments_df heuristics
+SURFACE_QUALITY = {"asphalt": 0.9, "paved": 0.8, "concrete": 0.9}                          # else 0.5
+FOOT_TRAFFIC_BASE = {"residential": 0.8, "living_street": 0.9, "tertiary": 0.7, "secondary": 0.5,
+                     "primary": 0.4, "trunk": 0.3, "motorway": 0.1, "unclassified": 0.5, "service": 0.6}  # else 0.4
+CONGESTION_BASE = {"motorway": 0.5, "trunk": 0.6, "primary": 0.7, "secondary": 0.6, "tertiary": 0.5,
+                   "residential": 0.4, "unclassified": 0.5, "service": 0.45}               # else 0.5
+BASE_QUALITY = {"motorway": 10, "trunk": 8, "primary": 7, "secondary": 6, "tertiary": 5,
+                "residential": 3, "unclassified": 4, "service": 4}                        # else 4
+# -----------------------------
+
+EDGE_COLUMNS = [
+    "segment_id", "road_name", "length_m", "lane_count", "road_type", "speed_limit_kph", "toll",
+    "road_quality", "geometry_wkt", "surface_type", "surface_quality", "lit", "one_way",
+    "foot_traffic_score", "historical_congestion", "pothole_risk", "accident_risk", "event_blocked",
+    "vip_blocked", "closed_for_construction", "provenance", "normalized_ts",
+    "component_id", "weak_component_id", "from_node", "to_node",
+]
+
+LEVEL_ROAD_TYPES_ORDER = list(dict.fromkeys(t for mix in LEVEL_ROAD_TYPES for t in mix))
+
+# undirected streets per node of the layout, and directed rows per street
+STREETS_PER_NODE = 2 * (1 - DROP_LOCAL_FRAC) + DIAGONAL_FRAC + CUL_DE_SAC_FRAC
+MEAN_ROWS_PER_STREET = 1.8 * (1 + SHAPE_POINTS_MEAN)  # two-way pieces give 2 rows, one-way pieces 1
+
+
+def _level_of_line(index: np.ndarray) -> np.ndarray:
+    level = np.full(len(index), 3, dtype=np.int8)
+    for lvl, every in reversed(list(enumerate(ARTERIAL_EVERY))):
+        level[index % every == 0] = lvl
+    return level
+
+
+def grid_layout(rng: np.random.Generator, target_edges: int) -> Tuple[np.ndarray, ...]:
+    """(x, y, u, v, level) of a perturbed grid with about target_edges directed rows."""
+    side = max(2, int(round(math.sqrt(target_edges / (STREETS_PER_NODE * MEAN_ROWS_PER_STREET)))))
+    node = np.arange(side * side).reshape(side, side)
+    row, col = np.divmod(node.ravel(), side)
+    x = col * SPACING_M + rng.normal(0, JITTER_M, side * side)
+    y = row * SPACING_M + rng.normal(0, JITTER_M, side * side)
+
+    blocks = node[:-1, :-1].ravel()
+    diag = blocks[rng.random(len(blocks)) < DIAGONAL_FRAC]
+    u = np.concatenate([node[:, :-1].ravel(), node[:-1, :].ravel(), diag])
+    v = np.concatenate([node[:, 1:].ravel(), node[1:, :].ravel(), diag + side + 1])
+    level = np.concatenate([
+        _level_of_line(np.repeat(np.arange(side), side - 1)),   # horizontal streets lie on row i
+        _level_of_line(np.tile(np.arange(side), side - 1)),     # vertical streets lie on column j
+        np.full(len(diag), 3, dtype=np.int8),
+    ])
+    return x, y, u, v, level
+
+
+def radial_layout(rng: np.random.Generator, target_edges: int) -> Tuple[np.ndarray, ...]:
+    """(x, y, u, v, level) of a ring-and-spoke city with about target_edges directed rows."""
+    # ring r has RADIAL_SPOKES * r nodes, so about RADIAL_SPOKES * R^2 / 2 nodes in total
+    n_nodes = target_edges / (STREETS_PER_NODE * MEAN_ROWS_PER_STREET)
+    rings = max(2, int(round(math.sqrt(2 * n_nodes / RADIAL_SPOKES))))
+    counts = RADIAL_SPOKES * np.arange(1, rings + 1)
+    offsets = np.concatenate([[1], 1 + np.cumsum(counts)])   # node 0 is the centre
+    ring = np.repeat(np.arange(1, rings + 1), counts)
+    k = np.arange(offsets[-1] - 1) - (offsets[ring - 1] - 1)
+    theta = 2 * np.pi * k / counts[ring - 1]
+    x = np.concatenate([[0.0], ring * SPACING_M * np.cos(theta)]) + rng.normal(0, JITTER_M, offsets[-1])
+    y = np.concatenate([[0.0], ring * SPACING_M * np.sin(theta)]) + rng.normal(0, JITTER_M, offsets[-1])
+
+    ids = np.arange(1, offsets[-1])
+    # ring streets: k -> k + 1 around the ring
+    ring_u = ids
+    ring_v = offsets[ring - 1] + (k + 1) % counts[ring - 1]
+    ring_level = _level_of_line(ring)
+    # radial streets: every node to the nearest-angle node on the ring inside it
+    inner = ring - 1
+    inner_k = np.rint(theta * np.maximum(inner, 1) * RADIAL_SPOKES / (2 * np.pi)).astype(np.int64)
+    radial_v = np.where(inner == 0, 0, offsets[np.maximum(inner - 1, 0)] + inner_k % np.maximum(inner * RADIAL_SPOKES, 1))
+    on_spoke = k % ring == 0                      # k = m * r lies on spoke m at every ring
+    spoke = k // ring
+    radial_level = np.where(on_spoke, np.where(spoke % 2 == 0, 0, 1), 3).astype(np.int8)
+
+    u = np.concatenate([ring_u, ids])
+    v = np.concatenate([ring_v, radial_v])
+    return x, y, u, v, np.concatenate([ring_level, radial_level])
+
+
+LAYOUTS = {"grid": grid_layout, "radial": radial_layout}
+
+
+def _add_shape_nodes(rng: np.random.Generator, x: np.ndarray, y: np.ndarray,
+                     u: np.ndarray, v: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Splits every street u -> v at m ~ Poisson(SHAPE_POINTS_MEAN) interior nodes.
+    Returns (x, y) with the new nodes appended and (u, v, street) per piece.
+    """
+    m = np.minimum(rng.poisson(SHAPE_POINTS_MEAN, len(u)), MAX_SHAPE_POINTS)
+    street = np.repeat(np.arange(len(u)), m + 1)
+    j = np.arange(len(street)) - np.repeat(np.cumsum(m + 1) - (m + 1), m + 1)   # piece index in its street
+    first_new = len(x) + np.cumsum(m) - m                                        # id of a street's first new node
+    piece_m, piece_first = m[street], first_new[street]
+    piece_u = np.where(j == 0, u[street], piece_first + j - 1)
+    piece_v = np.where(j == piece_m, v[street], piece_first + j)
+
+    # interior node t / (m + 1) of the way along its street, slightly off the straight line
+    owner = np.repeat(np.arange(len(u)), m)
+    t = (np.arange(len(owner)) - np.repeat(np.cumsum(m) - m, m) + 1) / (m[owner] + 1)
+    wobble = JITTER_M / 3
+    new_x = x[u[owner]] + (x[v[owner]] - x[u[owner]]) * t + rng.normal(0, wobble, len(owner))
+    new_y = y[u[owner]] + (y[v[owner]] - y[u[owner]]) * t + rng.normal(0, wobble, len(owner))
+    return np.concatenate([x, new_x]), np.concatenate([y, new_y]), piece_u, piece_v, street
+
+
+def _draw(rng: np.random.Generator, mix: Dict[str, float], n: int) -> np.ndarray:
+    names = list(mix)
+    p = np.array([mix[k] for k in names], dtype=float)
+    return np.array(names, dtype=object)[rng.choice(len(names), n, p=p / p.sum())]
+
+
+def _lookup(values: np.ndarray, table: Dict, default) -> np.ndarray:
+    return pd.Series(values).map(table).fillna(default).to_numpy()
+
+
+def _to_lat_lon(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lat = CENTER[0] + y / 111320.0
+    lon = CENTER[1] + x / (111320.0 * math.cos(math.radians(CENTER[0])))
+    return np.round(lat, 6), np.round(lon, 6)
+
+
+def _haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 6371000.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _components(n_nodes: int, u: np.ndarray, v: np.ndarray, connection: str) -> Tuple[int, np.ndarray]:
+    """(count, label per node) with labels ranked by component size (0 = largest)."""
+    graph = coo_matrix((np.ones(len(u), dtype=np.int8), (u, v)), shape=(n_nodes, n_nodes)).tocsr()
+    n, labels = connected_components(graph, directed=True, connection=connection)
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.argsort(-np.bincount(labels, minlength=n), kind="stable")] = np.arange(n)
+    return n, rank[labels]
+
+
+def generate_city(n_edges: int = DEFAULT_EDGES, layout: str = "grid", seed: int = SEED) -> Dict:
+    """Nodes and directed edges of a synthetic city as column arrays (see write_city)."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown layout {layout!r}; expected one of {list(LAYOUTS)}")
+    rng = np.random.default_rng(seed)
+    x, y, u, v, level = LAYOUTS[layout](rng, n_edges)
+
+    # cul-de-sacs: a local spur from some nodes to a new dead-end node
+    hub = np.flatnonzero(rng.random(len(x)) < CUL_DE_SAC_FRAC)
+    angle = rng.uniform(0, 2 * np.pi, len(hub))
+    reach = SPACING_M * rng.uniform(0.3, 0.5, len(hub))
+    end = len(x) + np.arange(len(hub))
+    x = np.concatenate([x, x[hub] + reach * np.cos(angle)])
+    y = np.concatenate([y, y[hub] + reach * np.sin(angle)])
+    u, v = np.concatenate([u, hub]), np.concatenate([v, end])
+    level = np.concatenate([level, np.full(len(hub), 3, dtype=np.int8)])
+
+    # drop some local streets, then pick road types per level
+    keep = (level < 3) | (rng.random(len(u)) >= DROP_LOCAL_FRAC)
+    u, v, level = u[keep], v[keep], level[keep]
+    road_type = np.empty(len(u), dtype=object)
+    for lvl, mix in enumerate(LEVEL_ROAD_TYPES):
+        at = np.flatnonzero(level == lvl)
+        road_type[at] = _draw(rng, mix, len(at))
+
+    # one-way streets keep one random direction, two-way streets get both
+    one_way = rng.random(len(u)) < _lookup(road_type, ONE_WAY_RATIO, 0.1).astype(float)
+    flip = one_way & (rng.random(len(u)) < 0.5)
+    u, v = np.where(flip, v, u), np.where(flip, u, v)
+    x, y, piece_u, piece_v, piece_street = _add_shape_nodes(rng, x, y, u, v)
+    two_way = ~one_way[piece_street]
+    street = np.concatenate([piece_street, piece_street[two_way]])
+    src = np.concatenate([piece_u, piece_v[two_way]])
+    dst = np.concatenate([piece_v, piece_u[two_way]])
+
+    # only nodes that carry an edge, renumbered densely
+    used, inverse = np.unique(np.concatenate([src, dst]), return_inverse=True)
+    src, dst = inverse[:len(src)], inverse[len(src):]
+    lat, lon = _to_lat_lon(x[used], y[used])
+    n_scc, scc = _components(len(used), src, dst, "strong")
+    n_wcc, wcc = _components(len(used), src, dst, "weak")
+
+    # street-level attributes (shared by both directions), datalink heuristics
+    rt = road_type
+    lo_hi = np.array([LANES.get(t, (1, 1)) for t in LEVEL_ROAD_TYPES_ORDER], dtype=np.int64)
+    type_code = pd.Series(rt).map({t: i for i, t in enumerate(LEVEL_ROAD_TYPES_ORDER)}).to_numpy()
+    lanes = rng.integers(lo_hi[type_code, 0], lo_hi[type_code, 1] + 1)
+    speed = _lookup(rt, SPEED_KPH, 40).astype(np.int64)
+    toll = (rng.random(len(rt)) < _lookup(rt, TOLL_PROB, 0.0).astype(float)).astype(np.int64)
+    quality = _lookup(rt, BASE_QUALITY, 4).astype(float) + lanes
+    surface = _draw(rng, SURFACE_MIX, len(rt))
+    footway = rt == "footway"
+    surface[footway] = _draw(rng, FOOTWAY_SURFACE_MIX, int(footway.sum()))
+    surface_quality = _lookup(surface, SURFACE_QUALITY, 0.5).astype(float)
+    lit = rng.random(len(rt)) < np.asarray(LIT_PROB)[level]
+    foot = np.minimum(_lookup(rt, FOOT_TRAFFIC_BASE, 0.4).astype(float) * (0.8 + 0.05 * lanes), 1.0)
+    spd_factor = np.minimum(speed, 120) / 120.0
+    congestion = _lookup(rt, CONGESTION_BASE, 0.5).astype(float) * (0.7 + 0.6 * spd_factor)
+    congestion = np.clip(congestion + rng.uniform(-CONGESTION_NOISE, CONGESTION_NOISE, len(rt)), 0.0, 1.0)
+    pothole = np.clip((1.0 - surface_quality) * 0.6 + np.maximum(12 - quality, 0) / 12.0 * 0.4, 0.0, 1.0)
+    accident = np.clip(0.2 + 0.5 * spd_factor + 0.3 * congestion, 0.0, 1.0)
+
+    streets = {
+        "road_type": rt, "lane_count": lanes, "speed_limit_kph": speed, "toll": toll,
+        "road_quality": quality, "surface_type": surface, "surface_quality": surface_quality,
+        "lit": lit, "one_way": one_way, "foot_traffic_score": foot, "historical_congestion": congestion,
+        "pothole_risk": pothole, "accident_risk": accident,
+    }
+    return {
+        "layout": layout, "seed": seed,
+        "nodes": {"lat": lat, "lon": lon, "component_id": scc, "weak_component_id": wcc},
+        "edges": {"src": src, "dst": dst, "street": street,
+                  "length_m": _haversine_m(lat[src], lon[src], lat[dst], lon[dst]),
+                  "component_id": np.where(scc[src] == scc[dst], scc[src], -1),
+                  "weak_component_id": wcc[src],
+                  **{name: col[street] for name, col in streets.items()}},
+        "n_scc": n_scc, "n_wcc": n_wcc,
+    }
+
+
+def _edge_frame(city: Dict, node_ids: np.ndarray, lat_s: np.ndarray, lon_s: np.ndarray,
+                rows: slice, ts: str) -> pd.DataFrame:
+    e = city["edges"]
+    src, dst = e["src"][rows], e["dst"][rows]
+    n = len(src)
+    false = np.zeros(n, dtype=bool)
+    wkt = "LINESTRING (" + lon_s[src] + " " + lat_s[src] + ", " + lon_s[dst] + " " + lat_s[dst] + ")"
+    out = {
+        "segment_id": e["street"][rows],
+        "road_name": np.full(n, "", dtype=object),
+        "geometry_wkt": wkt,
+        "event_blocked": false, "vip_blocked": false, "closed_for_construction": false,
+        "provenance": np.full(n, "synthetic", dtype=object),
+        "normalized_ts": np.full(n, ts, dtype=object),
+        "from_node": node_ids[src], "to_node": node_ids[dst],
+    }
+    for name in EDGE_COLUMNS:
+        if name not in out:
+            out[name] = e[name][rows]
+    return pd.DataFrame(out, columns=EDGE_COLUMNS)
+
+
+def write_city(city: Dict, out_dir: str = OUT_DIR, edges_file: str = EDGES_FILE,
+               chunk_rows: int = CHUNK_ROWS) -> Dict[str, str]:
+    """Writes the edge table (in chunks) and nodes.csv in the datalink_pipeline layout."""
+    os.makedirs(out_dir, exist_ok=True)
+    nodes = city["nodes"]
+    lat_s = nodes["lat"].astype(str).astype(object)
+    lon_s = nodes["lon"].astype(str).astype(object)
+    node_ids = lat_s + "_" + lon_s   # "<lat>_<lon>", like the Overpass node ids
+    if len(pd.unique(node_ids)) != len(node_ids):
+        raise ValueError("node ids collide after rounding; increase SPACING_M")
+
+    nodes_path = os.path.join(out_dir, NODES_FILE)
+    pd.DataFrame({"node_id": node_ids, **nodes}).to_csv(nodes_path, index=False)
+
+    edges_path = os.path.join(out_dir, edges_file)
+    ts = datetime.utcnow().isoformat() + "Z"
+    n_rows = len(city["edges"]["src"])
+    for start in range(0, n_rows, chunk_rows):
+        frame = _edge_frame(city, node_ids, lat_s, lon_s, slice(start, start + chunk_rows), ts)
+        frame.to_csv(edges_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return {"edges": edges_path, "nodes": nodes_path}
+
+
+def summarize(city: Dict) -> str:
+    e = city["edges"]
+    n_nodes, n_rows = len(city["nodes"]["lat"]), len(e["src"])
+    degree = np.bincount(np.concatenate([e["src"], e["dst"]]), minlength=n_nodes)
+    # undirected degree: a two-way street counts once at each end
+    pairs = np.unique(np.sort(np.stack([e["src"], e["dst"]], axis=1), axis=1), axis=0)
+    und = np.bincount(pairs.ravel(), minlength=n_nodes)
+    hist = np.bincount(np.minimum(und, 6))[1:]
+    types = pd.Series(e["road_type"]).value_counts(normalize=True)
+    lines = [
+        f"{city['layout']} city: {n_nodes:,} nodes, {n_rows:,} directed edges "
+        f"({n_rows / max(n_nodes, 1):.2f} per node, mean directed degree {degree.mean():.2f})",
+        f"one-way rows: {e['one_way'].mean():.1%}; {city['n_scc']:,} strongly / {city['n_wcc']:,} weakly "
+        f"connected components, largest SCC {np.mean(city['nodes']['component_id'] == 0):.1%} of nodes",
+        "street degree: " + ", ".join(f"{d}{'+' if d == 6 else ''}: {c / n_nodes:.1%}"
+                                      for d, c in enumerate(hist, start=1) if c),
+        "road types: " + ", ".join(f"{t} {p:.1%}" for t, p in types.items()),
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+
+    def option(flag, default):
+        return args[args.index(flag) + 1] if flag in args else default
+
+    n_edges = int(float(option("--edges", DEFAULT_EDGES)))
+    layout = option("--layout", "grid")
+    out_dir = option("--out", OUT_DIR)
+    t0 = time.perf_counter()
+    try:
+        city = generate_city(n_edges, layout, int(option("--seed", SEED)))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    t1 = time.perf_counter()
+    paths = write_city(city, out_dir, ROUTING_EDGES_FILE if "--routing" in args else EDGES_FILE)
+    t2 = time.perf_counter()
+    print(summarize(city))
+    print(f"Generated in {t1 - t0:.1f} s, written in {t2 - t1:.1f} s")
+    print("Exported CSV:", paths["edges"])
+    print("Exported nodes:", paths["nodes"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+time_profiles.py
+
+Time-of-day edge weight profiles for departure-time-aware routing.
+
+historical_congestion is one static number per segment, so every hour of the day
+costs the same. A profile gives every routed edge a weight per 15-minute bucket
+(96 per day) without storing 96 numbers per edge:
+
+  multiplier(e, b) = 1 + amp[e] * SHAPES[class[e], b]      (shape rows have zero mean)
+  weight(e, b)     = base_weight[e] * multiplier(e, b)
+  travel_s(e, b)   = base_travel_s[e] * multiplier(e, b)
+
+- A small set of shared daily shapes (commuter arterial, local street,
+  commercial / nightlife, flat) is stored once as a K x 96 float32 matrix.
+- Per edge only base_weight (float32), base_travel_s (float32, free-flow time),
+  class (uint16) and amp (float16) are stored: 12 bytes per edge.
+- The class comes from the road type (busy pedestrian areas become commercial),
+  the amplitude from historical_congestion. As the shapes have zero mean over
+  the day, the daily average weight is the model's static weight.
+
+save_profiles() writes one .npy per array plus manifest.json to a directory
+named after the arrays' content version and publishes it by swapping a symlink,
+as model bundles are (compiled_forest.publish_versioned). ensure_profiles()
+writes only when the published version differs, so worker processes building
+the same graph from the same model just load the profiles one of them wrote.
+EdgeProfiles.load() memory-maps them. bucket_arrays(bucket) materializes one
+bucket for all edges at once (cached), so the time-dependent search does plain
+list lookups per relaxed edge.
+
+Usage:
+  profiles = EdgeProfiles.load("datalink_output/weight_profiles")
+  b = profiles.bucket(parse_depart_at("2025-11-24T09:15"))
+  mult, travel = profiles.bucket_arrays(b)
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from compiled_forest import publish_versioned
+from incident_store import parse_time
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+PROFILE_DIR = "datalink_output/weight_profiles"
+BUCKET_S = 15 * 60
+N_BUCKETS = 24 * 3600 // BUCKET_S
+UTC_OFFSET_S = int(5.5 * 3600)   # profiles are in local (IST) time of day
+PEAK_AMPLITUDE = 1.2             # amp = PEAK_AMPLITUDE * historical_congestion ...
+MAX_AMPLITUDE = 0.9              # ... capped, so a multiplier never drops below ~0.1
+BUCKET_CACHE = 8                 # materialized buckets kept per process
+
+# daily shapes as (hour, width in hours, height) bumps, scaled to a peak of 1
+SHAPE_PEAKS = {
+    "flat": [],
+    "commuter": [(9.0, 1.2, 1.0), (18.5, 1.5, 1.0)],
+    "local": [(8.5, 1.0, 0.6), (13.0, 1.5, 0.3), (18.0, 1.5, 0.7)],
+    "commercial": [(12.5, 1.5, 0.6), (19.5, 2.0, 1.0)],
+}
+SHAPE_CLASSES = list(SHAPE_PEAKS)
+
+ROAD_TYPE_CLASS = {
+    "motorway": "commuter", "motorway_link": "commuter", "trunk": "commuter", "trunk_link": "commuter",
+    "primary": "commuter", "primary_link": "commuter", "secondary": "commuter", "secondary_link": "commuter",
+    "tertiary": "local", "tertiary_link": "local", "residential": "local", "unclassified": "local",
+    "living_street": "local", "service": "local",
+}
+DEFAULT_CLASS = "flat"                # footways, paths, steps, ...
+COMMERCIAL_FOOT_TRAFFIC = 0.6         # foot_traffic_score above which a street counts as commercial
+DEFAULT_SPEED_KPH = 30.0
+# -----------------------------
+
+PROFILE_ARRAYS = ("base_weight", "base_travel_s", "shape_class", "amp", "shapes")
+
+
+def daily_shapes() -> np.ndarray:
+    """K x N_BUCKETS float32, each row with zero mean over the day."""
+    hours = (np.arange(N_BUCKETS) + 0.5) * BUCKET_S / 3600.0
+    shapes = np.zeros((len(SHAPE_CLASSES), N_BUCKETS), dtype=np.float64)
+    for k, name in enumerate(SHAPE_CLASSES):
+        for hour, width, height in SHAPE_PEAKS[name]:
+            # circular distance, so late-evening bumps wrap past midnight
+            d = np.abs(hours - hour)
+            d = np.minimum(d, 24.0 - d)
+            shapes[k] += height * np.exp(-0.5 * (d / width) ** 2)
+        if shapes[k].max() > 0:
+            shapes[k] /= shapes[k].max()
+        shapes[k] -= shapes[k].mean()
+    return shapes.astype(np.float32)
+
+
+def parse_depart_at(value) -> Optional[float]:
+    """Epoch seconds; ISO strings without a UTC offset are read as local (UTC_OFFSET_S) time."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    text = str(value).strip()
+    naive = not (text.endswith("Z") or "+" in text[10:] or "-" in text[10:])
+    ts = parse_time(text)
+    if ts is None:
+        return None
+    return ts - UTC_OFFSET_S if naive else ts
+
+
+def edge_classes(df: pd.DataFrame) -> np.ndarray:
+    road_type = df["road_type"].astype(str) if "road_type" in df.columns else pd.Series("", index=df.index)
+    names = road_type.map(ROAD_TYPE_CLASS).fillna(DEFAULT_CLASS)
+    if "foot_traffic_score" in df.columns:
+        busy = (df["foot_traffic_score"].to_numpy(dtype=float) >= COMMERCIAL_FOOT_TRAFFIC) & (names != DEFAULT_CLASS)
+        names = names.where(~busy, "commercial")
+    index = {name: k for k, name in enumerate(SHAPE_CLASSES)}
+    return names.map(index).to_numpy(dtype=np.uint16)
+
+
+def build_profiles(df: pd.DataFrame, weights) -> Dict[str, np.ndarray]:
+    """Profile arrays for the routed edges in df's row order, around the static weights."""
+    congestion = df["historical_congestion"].to_numpy(dtype=float) if "historical_congestion" in df.columns \
+        else np.zeros(len(df))
+    length = df["length_m"].to_numpy(dtype=float) if "length_m" in df.columns else np.zeros(len(df))
+    speed = df["speed_limit_kph"].to_numpy(dtype=float) if "speed_limit_kph" in df.columns \
+        else np.full(len(df), DEFAULT_SPEED_KPH)
+    speed = np.where(speed > 0, speed, DEFAULT_SPEED_KPH)
+    return {
+        "base_weight": np.asarray(weights, dtype=np.float32),
+        "base_travel_s": (length / (speed / 3.6)).astype(np.float32),
+        "shape_class": edge_classes(df),
+        "amp": np.clip(PEAK_AMPLITUDE * congestion, 0.0, MAX_AMPLITUDE).astype(np.float16),
+        "shapes": daily_shapes(),
+    }
+
+
+def profile_version(arrays: Dict[str, np.ndarray]) -> str:
+    """Short digest of the profile arrays; equal for the same graph and model in any process."""
+    digest = hashlib.sha256()
+    for name in PROFILE_ARRAYS:
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def save_profiles(arrays: Dict[str, np.ndarray], path: str = PROFILE_DIR, version: str = "") -> Dict:
+    """Publish the profiles as a new versioned directory behind the path symlink; returns its manifest."""
+    version = version or profile_version(arrays)
+    n_edges = len(arrays["base_weight"])
+    per_edge = sum(arrays[k].itemsize for k in ("base_weight", "base_travel_s", "shape_class", "amp"))
+    manifest = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "version": version, "n_edges": n_edges, "bucket_s": BUCKET_S, "n_buckets": N_BUCKETS,
+        "utc_offset_s": UTC_OFFSET_S, "classes": SHAPE_CLASSES, "bytes_per_edge": per_edge,
+        "arrays": {k: {"dtype": str(arrays[k].dtype), "shape": list(arrays[k].shape)} for k in PROFILE_ARRAYS},
+    }
+    path = path.rstrip("/\\")
+    target = f"{path}.{version}"
+    if not os.path.isdir(target):
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in PROFILE_ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), arrays[name])
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        try:
+            os.rename(tmp, target)
+        except OSError:  # another process published the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+    publish_versioned(path, target)
+    return manifest
+
+
+def ensure_profiles(arrays: Dict[str, np.ndarray], path: str = PROFILE_DIR) -> Tuple["EdgeProfiles", bool]:
+    """(profiles, written): loads the published profiles if they are this version, else publishes them first."""
+    version = profile_version(arrays)
+    try:
+        profiles = EdgeProfiles.load(path)
+        if profiles.manifest.get("version") == version:
+            return profiles, False
+    except (OSError, ValueError, KeyError):
+        pass
+    save_profiles(arrays, path, version)
+    return EdgeProfiles.load(path), True
+
+
+class EdgeProfiles:
+    def __init__(self, arrays: Dict[str, np.ndarray], manifest: Optional[Dict] = None):
+        self.base_weight = arrays["base_weight"]
+        self.base_travel_s = arrays["base_travel_s"]
+        self.shape_class = arrays["shape_class"]
+        self.amp = arrays["amp"]
+        self.shapes = arrays["shapes"]
+        self.manifest = manifest or {}
+        self.bucket_s = int(self.manifest.get("bucket_s", BUCKET_S))
+        self.n_buckets = int(self.manifest.get("n_buckets", N_BUCKETS))
+        self.utc_offset_s = int(self.manifest.get("utc_offset_s", UTC_OFFSET_S))
+        self._buckets: Dict[int, Tuple[List[float], List[float]]] = {}
+
+    def __len__(self):
+        return len(self.base_weight)
+
+    @classmethod
+    def load(cls, path: str = PROFILE_DIR, mmap: bool = True) -> "EdgeProfiles":
+        path = os.path.realpath(path)  # one version throughout, even if a new one is published meanwhile
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None,
+                                allow_pickle=False) for name in PROFILE_ARRAYS}
+        if any(len(arrays[k]) != manifest["n_edges"] for k in ("base_weight", "base_travel_s", "shape_class", "amp")):
+            raise ValueError(f"{path}: array lengths do not match n_edges={manifest['n_edges']}")
+        return cls(arrays, manifest)
+
+    def bucket(self, ts: float) -> int:
+        return int(((ts + self.utc_offset_s) % 86400) // self.bucket_s) % self.n_buckets
+
+    def multiplier(self, bucket: int) -> np.ndarray:
+        """Weight multiplier of every edge in one bucket (float32)."""
+        column = self.shapes[:, bucket % self.n_buckets]
+        return (1.0 + self.amp.astype(np.float32) * column[self.shape_class]).astype(np.float32)
+
+    def min_multiplier(self) -> float:
+        """Lowest multiplier of any edge in any bucket (a lower bound for time-dependent costs)."""
+        if len(self.amp) == 0:
+            return 1.0
+        lowest_shape = self.shapes.min(axis=1)[self.shape_class]
+        return float(min(1.0, np.min(1.0 + self.amp.astype(np.float32) * lowest_shape)))
+
+    def bucket_arrays(self, bucket: int) -> Tuple[List[float], List[float]]:
+        """(multiplier, travel seconds) per edge for one bucket, as lists for fast scalar lookups."""
+        bucket %= self.n_buckets
+        cached = self._buckets.get(bucket)
+        if cached is None:
+            mult = self.multiplier(bucket)
+            cached = (mult.tolist(), (self.base_travel_s * mult).tolist())
+            if len(self._buckets) >= BUCKET_CACHE:
+                self._buckets.pop(next(iter(self._buckets)))
+            self._buckets[bucket] = cached
+        return cached
+
+    def weight_at(self, edge_idx: int, ts: float) -> float:
+        b = self.bucket(ts)
+        return float(self.base_weight[edge_idx]) * self.bucket_arrays(b)[0][edge_idx]
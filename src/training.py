@@ -1,77 +1,266 @@
-# trainer_real.py
+"""
+training.py
+
+Single training entry point for the congestion and weight models.
+
+- The ColumnTransformer (StandardScaler on the numeric columns, OneHotEncoder on
+  the categorical ones) is fitted once and the feature matrix is computed once;
+  both forests are fitted on that matrix and each saved Pipeline wraps the same
+  fitted preprocessor. Only a weight model that takes predicted_congestion as an
+  input (weight.py's variant) gets its own preprocessor, with that extra column.
+- The two forests train concurrently in threads (sklearn's tree building releases
+  the GIL), each with half of N_JOBS for its own trees; random_state is fixed, so
+  runs are reproducible.
+- --warm-start retrains on appended data: if the rows the current models were
+  trained on are an unchanged prefix of the data file, the saved preprocessors
+  are kept and WARM_START_TREES trees fitted on all rows are added to each
+  forest. Otherwise it falls back to a full retrain. Out-of-bag R^2 is not
+  defined for such a forest (sklearn would redraw the old trees' bootstrap
+  samples over the longer data, counting rows they trained on as out-of-bag), so
+  a warm run records oob_r2 as null and instead the R^2 of the previous forest
+  on the appended rows, which it never saw (appended_r2).
+- Each saved pipeline is also exported as a memory-mapped model bundle
+  (compiled_forest.save_bundle), which is what predict.py / routing_logic.py load.
+- model/manifest.json records the data hash, row count, timings and metrics
+  (out-of-bag R^2, train MAE) of every run.
+
+Usage:
+  python training.py [--warm-start] [--only congestion|weight] [--weight-uses-congestion] [data.csv]
+"""
 import os
+import sys
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
 import pandas as pd
 import joblib
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.pipeline import Pipeline
+from sklearn.metrics import r2_score
+
+from compiled_forest import compile_pipeline, save_bundle
 
 # --------------------------
 # Paths
 # --------------------------
-DATA_PATH = "data/sample.csv"          
+DATA_PATH = "data/sample.csv"
 MODEL_DIR = "model"
 CONGESTION_MODEL_PATH = os.path.join(MODEL_DIR, "congestion.joblib")
 WEIGHT_MODEL_PATH = os.path.join(MODEL_DIR, "weight.joblib")
+MANIFEST_PATH = os.path.join(MODEL_DIR, "manifest.json")
 
-os.makedirs(MODEL_DIR, exist_ok=True)
-
-# --------------------------
-# Load data
 # --------------------------
-df = pd.read_csv(DATA_PATH)
-print(f"Loaded {len(df)} rows from {DATA_PATH}")
-
+# Training config
 # --------------------------
-# Targets
-# --------------------------
-y_cong = df["predicted_congestion"]
-y_weight = df["weight"]
-
-# Features (drop the targets)
-features = df.drop(columns=["predicted_congestion", "weight", "source", "destination"])
+N_ESTIMATORS = 200
+RANDOM_STATE = 42
+N_JOBS = os.cpu_count() or 1       # shared by the two forests
+WARM_START_TREES = 50               # trees added per --warm-start run
 
-# --------------------------
-# Preprocessing
-# --------------------------
-numeric_features = [
+NUMERIC_FEATURES = [
     "distance", "road_quality", "lane_count", "speed_limit",
     "tolls", "foot_traffic", "historical_congestion",
     "pothole_reports"
 ]
 
-categorical_features = [
+CATEGORICAL_FEATURES = [
     "road_type", "event", "vehicle_type", "accident"
 ]
 
-preprocessor = ColumnTransformer([
-    ("num", StandardScaler(), numeric_features),
-    ("cat", OneHotEncoder(handle_unknown="ignore"), categorical_features)
-])
-
+TARGETS = {"congestion": "predicted_congestion", "weight": "weight"}
+MODEL_PATHS = {"congestion": CONGESTION_MODEL_PATH, "weight": WEIGHT_MODEL_PATH}
+# memory-mapped bundles the serving processes load (see compiled_forest.py)
+BUNDLE_PATHS = {"congestion": os.path.join(MODEL_DIR, "congestion_bundle"),
+                "weight": os.path.join(MODEL_DIR, "weight_bundle")}
 # --------------------------
-# Train Congestion Model
-# --------------------------
-cong_model = Pipeline([
-    ("preprocess", preprocessor),
-    ("regressor", RandomForestRegressor(n_estimators=200, random_state=42))
-])
 
-print("Training congestion model...")
-cong_model.fit(features, y_cong)
-joblib.dump(cong_model, CONGESTION_MODEL_PATH)
-print(f"✅ Congestion model saved at {CONGESTION_MODEL_PATH}")
 
-# --------------------------
-# Train Weight Model
-# --------------------------
-weight_model = Pipeline([
-    ("preprocess", preprocessor),
-    ("regressor", RandomForestRegressor(n_estimators=200, random_state=42))
-])
-
-print("Training weight model...")
-weight_model.fit(features, y_weight)
-joblib.dump(weight_model, WEIGHT_MODEL_PATH)
-print(f"✅ Weight model saved at {WEIGHT_MODEL_PATH}")
\ No newline at end of file
+def data_hash(df: pd.DataFrame, rows: Optional[int] = None) -> str:
+    """Content hash of the first `rows` rows (all by default), independent of the index."""
+    part = df if rows is None else df.iloc[:rows]
+    return hashlib.sha256(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def make_preprocessor(numeric: Sequence[str] = NUMERIC_FEATURES,
+                      categorical: Sequence[str] = CATEGORICAL_FEATURES) -> ColumnTransformer:
+    return ColumnTransformer([
+        ("num", StandardScaler(), list(numeric)),
+        ("cat", OneHotEncoder(handle_unknown="ignore"), list(categorical))
+    ])
+
+
+def make_forest(n_jobs: int) -> RandomForestRegressor:
+    return RandomForestRegressor(n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE,
+                                 n_jobs=n_jobs, oob_score=True)
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _fit(name: str, forest: RandomForestRegressor, X, y: np.ndarray, appended_from: Optional[int] = None) -> Dict:
+    """Fits forest; appended_from (warm start) is the first row the existing trees were not trained on."""
+    appended_r2 = None
+    if appended_from is not None and len(y) - appended_from >= 2:
+        appended_r2 = round(float(r2_score(y[appended_from:], forest.predict(X[appended_from:]))), 5)
+    t0 = time.perf_counter()
+    forest.fit(X, y)
+    elapsed = time.perf_counter() - t0
+    pred = forest.predict(X)
+    if not forest.oob_score:  # drop a stale score left over from the forest's first fit
+        forest.__dict__.pop("oob_score_", None)
+        forest.__dict__.pop("oob_prediction_", None)
+    metrics = {
+        "seconds": round(elapsed, 3),
+        "n_estimators": forest.n_estimators,
+        "oob_r2": round(float(forest.oob_score_), 5) if forest.oob_score else None,
+        "train_mae": round(float(np.mean(np.abs(pred - y))), 5),
+    }
+    if appended_from is not None:
+        metrics["appended_r2"] = appended_r2
+    return metrics
+
+
+def _warm_start_models(df: pd.DataFrame, names: List[str], manifest: Dict) -> Optional[Dict[str, Pipeline]]:
+    """Existing pipelines if the rows each was trained on are an unchanged prefix of df, else None."""
+    pipelines = {}
+    for name in names:
+        entry = manifest.get("models", {}).get(name, {})
+        rows = entry.get("rows")
+        if not rows or rows > len(df) or entry.get("data_hash") != data_hash(df, rows):
+            print(f"Warm start not possible for {name} (no manifest entry, or earlier rows changed); "
+                  "training from scratch.")
+            return None
+        if not os.path.exists(MODEL_PATHS[name]):
+            print(f"Warm start not possible ({MODEL_PATHS[name]} missing); training from scratch.")
+            return None
+        pipelines[name] = joblib.load(MODEL_PATHS[name])
+    return pipelines
+
+
+def train(data_path: str = DATA_PATH, names: Sequence[str] = ("congestion", "weight"),
+          warm_start: bool = False, weight_uses_congestion: bool = False, n_jobs: int = N_JOBS) -> Dict:
+    """Fits the requested models, saves them and the manifest; returns the manifest."""
+    t_start = time.perf_counter()
+    timings = {}
+    names = list(names)
+
+    df = pd.read_csv(data_path)
+    print(f"Loaded {len(df)} rows from {data_path}")
+    features = df.drop(columns=[c for c in ("predicted_congestion", "weight", "source", "destination")
+                                if c in df.columns])
+    timings["load"] = round(time.perf_counter() - t_start, 3)
+
+    previous = load_manifest()
+    pipelines = _warm_start_models(df, names, previous) if warm_start else None
+    warm = pipelines is not None
+
+    # --------------------------
+    # Preprocessing: fitted once, matrix computed once
+    # --------------------------
+    t0 = time.perf_counter()
+    weight_uses_congestion = "weight" in names and (
+        "predicted_congestion" in pipelines["weight"].feature_names_in_ if warm else weight_uses_congestion)
+    if warm:
+        # the trees already fitted depend on these exact encodings, so they are kept as they are
+        preprocessors = {name: pipelines[name].steps[0][1] for name in names}
+    else:
+        shared = make_preprocessor().fit(features)
+        preprocessors = {name: shared for name in names}
+        if weight_uses_congestion:
+            preprocessors["weight"] = make_preprocessor(NUMERIC_FEATURES + ["predicted_congestion"]).fit(
+                features.assign(predicted_congestion=df["predicted_congestion"]))
+    inputs = {}
+    for name in names:
+        uses_congestion = name == "weight" and weight_uses_congestion
+        frame = features.assign(predicted_congestion=df["predicted_congestion"]) if uses_congestion else features
+        # pipelines sharing one fitted preprocessor reuse its matrix
+        same = next((n for n in inputs if preprocessors[n] is preprocessors[name]), None)
+        inputs[name] = inputs[same] if same else preprocessors[name].transform(frame)
+    timings["preprocess"] = round(time.perf_counter() - t0, 3)
+
+    # --------------------------
+    # Forests, trained concurrently
+    # --------------------------
+    per_model_jobs = max(1, n_jobs // len(names))
+    forests = {}
+    for name in names:
+        if warm:
+            forest = pipelines[name].steps[-1][1]
+            forest.set_params(warm_start=True, n_jobs=per_model_jobs, oob_score=False,
+                              n_estimators=forest.n_estimators + WARM_START_TREES)
+        else:
+            forest = make_forest(per_model_jobs)
+        forests[name] = forest
+
+    print(f"Training {', '.join(names)} ({'warm start' if warm else 'from scratch'}, "
+          f"{per_model_jobs} job(s) per model)...")
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        futures = {name: pool.submit(_fit, name, forests[name], inputs[name], df[TARGETS[name]].to_numpy(),
+                                     previous["models"][name]["rows"] if warm else None)
+                   for name in names}
+        metrics = {name: f.result() for name, f in futures.items()}
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    manifest_hash = data_hash(df)
+    models = dict(previous.get("models", {}))  # models not retrained this run keep their entries
+    for name in names:
+        forests[name].set_params(warm_start=False)
+        pipeline = Pipeline([("preprocess", preprocessors[name]), ("regressor", forests[name])])
+        joblib.dump(pipeline, MODEL_PATHS[name])
+        bundle = save_bundle(compile_pipeline(pipeline), BUNDLE_PATHS[name])
+        timings[name] = metrics[name].pop("seconds")
+        models[name] = {"path": MODEL_PATHS[name], "bundle": BUNDLE_PATHS[name],
+                        "bundle_version": bundle["version"], "schema_hash": bundle["schema_hash"],
+                        "target": TARGETS[name],
+                        "rows": len(df), "data_hash": manifest_hash,
+                        "features": [str(c) for c in pipeline.feature_names_in_], **metrics[name]}
+        score = (f"R^2 on appended rows {metrics[name]['appended_r2']}" if warm
+                 else f"OOB R^2 {metrics[name]['oob_r2']}")
+        print(f"✅ {name.capitalize()} model saved at {MODEL_PATHS[name]} "
+              f"({metrics[name]['n_estimators']} trees, {score}, {timings[name]} s)")
+    timings["total"] = round(time.perf_counter() - t_start, 3)
+
+    manifest = {
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "data_path": data_path,
+        "rows": len(df),
+        "data_hash": manifest_hash,
+        "warm_start": warm,
+        "random_state": RANDOM_STATE,
+        "n_jobs": n_jobs,
+        "timings_s": timings,
+        "models": models,
+    }
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest written to {MANIFEST_PATH} (total {timings['total']} s)")
+    return manifest
+
+
+def main():
+    args = sys.argv[1:]
+    names = list(TARGETS)
+    if "--only" in args:
+        names = [args[args.index("--only") + 1]]
+        if names[0] not in TARGETS:
+            print(f"Error: --only expects one of {list(TARGETS)}")
+            sys.exit(1)
+    positional = [a for i, a in enumerate(args) if not a.startswith("--")
+                  and not (i > 0 and args[i - 1] == "--only")]
+    train(positional[0] if positional else DATA_PATH, names,
+          warm_start="--warm-start" in args,
+          weight_uses_congestion="--weight-uses-congestion" in args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+tweet_classifier.py
+
+Batch tweet classification and location extraction for traffic police accounts.
+
+- Incident keywords are flattened into one (flag, keyword) table scanned with C
+  substring search over the lowercased text once; tweets with no keyword are
+  dropped before any location work.
+- Location hints come first from a gazetteer of road names taken from the OSM way
+  names in the segment table (road_name column): names, with their abbreviated
+  spellings, are tokenized into a trie and matched leftmost-longest over the
+  tweet's tokens. When the road name is the whole location, the hit carries the
+  road's coordinates and needs no geocoding. When the capitalized-words heuristic
+  (two compiled regexes) finds a more precise place, e.g. a junction on that
+  road, the place is geocoded and snap() moves it onto the nearest node of the
+  named road; the road's own location is then only a fallback.
+- process_jsonl() streams a JSONL tweet archive (one tweet object with "id",
+  "text" and optionally "created_at" per line) and writes one JSONL incident per
+  classified tweet, without holding the archive in memory.
+
+Usage:
+  python tweet_classifier.py tweets.jsonl [incidents.jsonl] [segments.csv]
+  python tweet_classifier.py --bench
+"""
+import os
+import re
+import sys
+import time
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional fast parser
+    orjson = None
+    import json
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+SEGMENTS_CSV = "datalink_output/segments_features.csv"
+OUTPUT_JSONL = "datalink_output/tweet_incidents.jsonl"
+
+# flag -> keywords (matched as substrings of the lowercased text)
+KEYWORDS = {
+    "construction": ["road work", "construction", "repair", "maintenance"],
+    "vip": ["vip", "movement", "procession", "rally"],
+    "event": ["closure", "block", "diversion", "accident", "jampacked"],
+}
+
+# words after which a capitalized sequence is taken as a place name
+LOCATION_KEYWORDS = ["near", "at", "road", "street", "junction", "signal", "circle", "flyover"]
+
+# token spellings folded together in both road names and tweets
+ABBREVIATIONS = {
+    "rd": "road", "st": "street", "jn": "junction", "jct": "junction", "jnc": "junction",
+    "cir": "circle", "ave": "avenue", "ln": "lane", "mn": "main", "blvd": "boulevard",
+}
+
+# names made only of these (or numbers) are too generic to match on
+GENERIC_TOKENS = {"road", "street", "main", "cross", "lane", "junction", "circle", "service", "avenue"}
+# -----------------------------
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# a flat table: `k in text` is a C-level search, faster here than an alternation regex
+_KEYWORD_TABLE = [(flag, k) for flag, words in KEYWORDS.items() for k in words]
+
+_SPELLINGS = {}
+for _short, _full in ABBREVIATIONS.items():
+    _SPELLINGS.setdefault(_full, [_full]).append(_short)
+
+_CAP_WORD = r"(?:[A-Z0-9][^\s]*)"
+_HINT_AFTER_KEYWORD_RE = re.compile(
+    r"(?<!\S)(?i:" + "|".join(LOCATION_KEYWORDS) + r")\s+(" + _CAP_WORD + r"(?:\s+" + _CAP_WORD + r")*)"
+)
+_TITLE_WORD = r"(?:[A-Z][^\sA-Z]*)"
+_HINT_TITLE_RUN_RE = re.compile(r"(?<!\S)(" + _TITLE_WORD + r"(?:\s+" + _TITLE_WORD + r")+)")
+
+_END = ""  # trie terminal key (tokens are never empty)
+
+
+def classify_flags(text: str) -> Dict[str, bool]:
+    """Which flags have at least one keyword occurring in the lowercased text."""
+    lowered = text.lower()
+    found = {flag for flag, k in _KEYWORD_TABLE if k in lowered}
+    return {flag: flag in found for flag in KEYWORDS}
+
+
+def extract_location_hint(text: str) -> Optional[str]:
+    """Capitalized words after a location keyword, else the first run of 2+ title-case words."""
+    m = _HINT_AFTER_KEYWORD_RE.search(text)
+    if m:
+        return m.group(1)
+    m = _HINT_TITLE_RUN_RE.search(text)
+    if m:
+        return m.group(1)
+    return None
+
+
+def name_tokens(text: str) -> List[str]:
+    return [ABBREVIATIONS.get(t, t) for t in _TOKEN_RE.findall(text.lower())]
+
+
+class Gazetteer:
+    """Road names -> coordinates (and the road's graph nodes), matched as token sequences through a trie."""
+
+    def __init__(self, places: Dict[str, Tuple[float, float]],
+                 nodes: Optional[Dict[str, np.ndarray]] = None):
+        self.places = {}
+        self.nodes: Dict[str, np.ndarray] = {}  # name -> (k, 2) lat/lon of the road's segment ends
+        self.trie: Dict = {}
+        for name, coord in places.items():
+            tokens = name_tokens(name)
+            if not tokens or all(t in GENERIC_TOKENS or t.isdigit() for t in tokens):
+                continue
+            self._insert(self.trie, tokens, name)
+            self.places[name] = coord
+            if nodes is not None and name in nodes:
+                self.nodes[name] = nodes[name]
+
+    def _insert(self, node: Dict, tokens: List[str], name: str):
+        """Adds the name under every combination of its tokens' spellings."""
+        if not tokens:
+            node.setdefault(_END, name)
+            return
+        for spelling in _SPELLINGS.get(tokens[0], (tokens[0],)):
+            self._insert(node.setdefault(spelling, {}), tokens[1:], name)
+
+    def __len__(self):
+        return len(self.places)
+
+    @classmethod
+    def from_segments(cls, df: pd.DataFrame, name_col: str = "road_name") -> "Gazetteer":
+        """
+        One entry per distinct way name, located at the mean of its segments'
+        midpoints, with the distinct segment end nodes kept for nearest().
+        """
+        if name_col not in df.columns:
+            return cls({})
+        named = df[df[name_col].notna() & (df[name_col].astype(str).str.strip() != "")]
+        if named.empty:
+            return cls({})
+        ends = pd.concat([named["from_node"], named["to_node"]], ignore_index=True).str.split("_", expand=True)
+        lat = ends[0].astype(float).to_numpy()
+        lon = ends[1].astype(float).to_numpy()
+        n = len(named)
+        names = named[name_col].astype(str).str.strip().to_numpy()
+        mid = pd.DataFrame({
+            "name": names,
+            "lat": (lat[:n] + lat[n:]) / 2.0,
+            "lon": (lon[:n] + lon[n:]) / 2.0,
+        })
+        means = mid.groupby("name")[["lat", "lon"]].mean()
+        points = pd.DataFrame({"name": np.concatenate([names, names]), "lat": lat, "lon": lon}).drop_duplicates()
+        nodes = {name: g[["lat", "lon"]].to_numpy() for name, g in points.groupby("name")}
+        return cls({name: (float(r.lat), float(r.lon)) for name, r in means.iterrows()}, nodes)
+
+    def nearest(self, name: str, lat: float, lon: float) -> Tuple[float, float]:
+        """The node of road `name` closest to (lat, lon); (lat, lon) itself if the road's nodes are unknown."""
+        pts = self.nodes.get(name)
+        if pts is None or not len(pts):
+            return lat, lon
+        d2 = (pts[:, 0] - lat) ** 2 + ((pts[:, 1] - lon) * np.cos(np.radians(lat))) ** 2
+        i = int(np.argmin(d2))
+        return float(pts[i, 0]), float(pts[i, 1])
+
+    def find(self, text: str) -> Optional[str]:
+        """Leftmost-longest road name occurring in text, or None."""
+        tokens = _TOKEN_RE.findall(text.lower())
+        trie = self.trie
+        for i in range(len(tokens)):
+            node = trie.get(tokens[i])
+            if node is None:
+                continue
+            best = node.get(_END)
+            for t in tokens[i + 1:]:
+                node = node.get(t)
+                if node is None:
+                    break
+                best = node.get(_END, best)
+            if best is not None:
+                return best
+        return None
+
+
+class TweetClassifier:
+    def __init__(self, gazetteer: Optional[Gazetteer] = None):
+        self.gazetteer = gazetteer if gazetteer is not None else Gazetteer({})
+        self.stats = {"tweets": 0, "incidents": 0, "gazetteer_hits": 0, "heuristic_hints": 0, "no_location": 0}
+
+    def classify(self, text: str) -> Optional[Dict]:
+        """
+        Returns None for tweets with no incident keywords, else
+        {"flags": {...}, "location_hint": str|None, "road": str|None, "place": str|None, "lat", "lon"}.
+        road is a gazetteer road name found in the tweet; place/lat/lon are set
+        when that road is the whole location (no more precise hint), so no
+        geocoding is needed. Otherwise location_hint is geocoded and passed
+        through snap().
+        """
+        self.stats["tweets"] += 1
+        lowered = text.lower()
+        found = {flag for flag, k in _KEYWORD_TABLE if k in lowered}
+        if not found:
+            return None
+        self.stats["incidents"] += 1
+        out = {"flags": {flag: flag in found for flag in KEYWORDS},
+               "location_hint": None, "road": None, "place": None, "lat": None, "lon": None}
+        road = self.gazetteer.find(lowered) if self.gazetteer.places else None
+        hint = extract_location_hint(text)
+        out["road"] = road
+        if road is not None and (hint is None or name_tokens(hint) == name_tokens(road)):
+            self.stats["gazetteer_hits"] += 1
+            out["location_hint"] = out["place"] = road
+            out["lat"], out["lon"] = self.gazetteer.places[road]
+            return out
+        self.stats["heuristic_hints" if hint else "no_location"] += 1
+        out["location_hint"] = hint
+        return out
+
+    def snap(self, result: Dict, geo: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+        """
+        A geocoded hint moved onto the nearest node of the road the tweet names;
+        without a geocode, the road's own location (None if the tweet named no road).
+        """
+        road = result.get("road")
+        if road is None or result.get("place"):
+            return geo
+        if geo is None:
+            return self.gazetteer.places[road]
+        return self.gazetteer.nearest(road, geo[0], geo[1])
+
+    def classify_many(self, texts: Iterable[str]) -> List[Optional[Dict]]:
+        return [self.classify(t) for t in texts]
+
+    def iter_incidents(self, tweets: Iterable[Dict]) -> Iterator[Dict]:
+        for tweet in tweets:
+            result = self.classify(tweet.get("text", ""))
+            if result is None:
+                continue
+            result["id"] = tweet.get("id")
+            result["created_at"] = tweet.get("created_at")
+            yield result
+
+
+def _loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def _dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield _loads(line)
+                except ValueError:
+                    continue
+
+
+def process_jsonl(in_path: str, out_path: str, classifier: TweetClassifier) -> int:
+    """Stream a tweet archive through the classifier; returns the number of incidents written."""
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    n = 0
+    with open(out_path, "wb") as out:
+        for incident in classifier.iter_incidents(iter_jsonl(in_path)):
+            out.write(_dumps(incident) + b"\n")
+            n += 1
+    return n
+
+
+def benchmark(n: int = 200_000, seed: int = 42):
+    """Throughput on a synthetic archive resembling the traffic police account."""
+    rng = random.Random(seed)
+    roads = [f"{w} Road" for w in ("Kasturba", "Hosur", "Bannerghatta", "Old Airport", "Infantry",
+                                     "Cunningham", "Residency", "Richmond", "Lalbagh", "Mysore")]
+    gazetteer = Gazetteer({r: (12.97 + i * 0.001, 77.59 + i * 0.001) for i, r in enumerate(roads)})
+    templates = [
+        "Road closure near {road} due to {what}, kindly take alternate routes",
+        "Slow moving traffic at {place} Junction owing to vehicle breakdown",
+        "VIP movement from {road} towards {place} between 10:00 and 11:00 hrs",
+        "Good morning Bengaluru! Please follow lane discipline",
+        "Diversion in place at {place} Circle for metro construction work",
+        "Traffic is moving smoothly on {road}",
+    ]
+    places = ["Silk Board", "Hudson", "Trinity", "Anil Kumble", "Mekhri", "KR Puram"]
+    tweets = [{"id": str(i), "text": rng.choice(templates).format(
+        road=rng.choice(roads), place=rng.choice(places), what=rng.choice(["rally", "repair", "accident"]))}
+        for i in range(n)]
+
+    classifier = TweetClassifier(gazetteer)
+    t0 = time.perf_counter()
+    hits = sum(1 for _ in classifier.iter_incidents(tweets))
+    elapsed = time.perf_counter() - t0
+    print(f"classify: {n} tweets in {elapsed:.2f} s ({n / elapsed:,.0f} tweets/s), {hits} incidents")
+    print("stats:", classifier.stats)
+
+    lines = b"".join(_dumps(t) + b"\n" for t in tweets)
+    t0 = time.perf_counter()
+    hits = sum(1 for _ in classifier.iter_incidents(_loads(line) for line in lines.splitlines()))
+    elapsed = time.perf_counter() - t0
+    print(f"parse + classify: {n / elapsed:,.0f} tweets/s")
+
+
+def main():
+    if "--bench" in sys.argv:
+        benchmark()
+        return
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print(__doc__)
+        return
+    in_path = args[0]
+    out_path = args[1] if len(args) > 1 else OUTPUT_JSONL
+    segments_csv = args[2] if len(args) > 2 else SEGMENTS_CSV
+
+    gazetteer = Gazetteer({})
+    if os.path.exists(segments_csv):
+        gazetteer = Gazetteer.from_segments(pd.read_csv(segments_csv, usecols=lambda c: c in (
+            "from_node", "to_node", "road_name")))
+    print(f"Gazetteer: {len(gazetteer)} road names")
+
+    classifier = TweetClassifier(gazetteer)
+    t0 = time.perf_counter()
+    n = process_jsonl(in_path, out_path, classifier)
+    elapsed = time.perf_counter() - t0
+    print(f"Wrote {n} incidents to {out_path} in {elapsed:.2f} s")
+    print("Stats:", classifier.stats)
+
+
+if __name__ == "__main__":
+    main()
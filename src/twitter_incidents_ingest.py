@@ -3,24 +3,43 @@ twitter_incidents_ingest.py
 
 Reads datalink_output/segments_features.csv,
 fetches recent tweets from a traffic police Twitter account,
-detects closure / VIP / event tweets, geocodes their locations,
-finds nearest road segments, and flips:
+detects closure / VIP / event tweets (tweet_classifier.py), locates them by the
+road names in the segment table where possible and otherwise geocodes them
+(through the persistent cache in geocode_cache.py, so repeated junction names
+cost no network calls), finds nearest road segments, and flips:
   - event_blocked
   - vip_blocked
   - closed_for_construction
 
+Only tweets newer than each account's since_id watermark
+(datalink_output/twitter_watermarks.json) are fetched, paging through all of them,
+and several accounts are fetched concurrently. A watermark only moves after its
+tweets were processed and the CSV written, and not at all if paging failed. A
+tweet whose geocoding failed (network error, so nothing was cached) holds its
+account's watermark just below it, so it is fetched and retried next run.
+Because each run only sees the new tweets, the flags of the previous enriched
+CSV are carried over onto the base table first (by from_node/to_node), so
+incidents from earlier runs are kept.
+
 Usage:
   python twitter_incidents_ingest.py
 """
 
 import os
-import math
+import json
 import time
+import asyncio
 from typing import Optional, Tuple, List, Dict
 
 import requests
 import pandas as pd
 
+from segment_index import SegmentIndex, apply_incident_flags
+from http_client import get_client
+from geocode_cache import GeocodeCache, RateLimitedGeocoder, NOMINATIM_URL
+from tweet_classifier import Gazetteer, TweetClassifier, classify_flags
+from tweet_classifier import extract_location_hint as _extract_location_hint
+
 # -----------------------------
 # CONFIG - EDIT THIS
 # -----------------------------
@@ -29,83 +48,32 @@ import pandas as pd
 # *** MANDATORY: Insert your valid Twitter/X Bearer Token here ***
 TWITTER_BEARER_TOKEN = "AAAAAAAAAAAAAAAAAAAAAEVH5gEAAAAAucmSX1QQGjA8SohcNIdEr2FJ3nk%3DhuWtYGqxWzHvvQhFXMK4ESbnoORpumbsKBxJ24mVx6DRz7qZZL"
 
-# 2) Traffic police account username
+# 2) Traffic police account username(s)
 TRAFFIC_USERNAME = "blrcitytraffic"  # change if you want another city
+TRAFFIC_USERNAMES = [TRAFFIC_USERNAME]
 
 # 3) Input/Output files
 INPUT_CSV = "datalink_output/segments_features.csv"
 OUTPUT_CSV = "datalink_output/segments_features_enriched.csv"
+WATERMARK_FILE = "datalink_output/twitter_watermarks.json"
 
-# 4) Nominatim (OpenStreetMap) base URL for geocoding
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+# 4) Nominatim (OpenStreetMap) base URL for geocoding: NOMINATIM_URL from geocode_cache.py
+#    (override with the NOMINATIM_URL env var, e.g. to point at stub_server.py)
+GEOCODE_CITY = "Bengaluru"
 # -----------------------------
 
 # Twitter API Endpoints
-TWITTER_BASE_URL = "https://api.twitter.com/2"
-
-
-def haversine_meters(lat1, lon1, lat2, lon2):
-    """Calculate the great-circle distance between two points on the Earth."""
-    R = 6371000  # Earth's radius in meters
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
-def build_node_table(df: pd.DataFrame) -> Dict[int, Tuple[float, float]]:
-    """Builds a dictionary mapping node_id to (lat, lon)."""
-    nodes = {}
-    # Extract 'from' nodes
-    from_nodes = df[['from_node', 'from_lat', 'from_lon']].drop_duplicates()
-    for _, row in from_nodes.iterrows():
-        nodes[row['from_node']] = (row['from_lat'], row['from_lon'])
-        
-    # Extract 'to' nodes (to catch all nodes)
-    to_nodes = df[['to_node', 'to_lat', 'to_lon']].drop_duplicates()
-    for _, row in to_nodes.iterrows():
-        if row['to_node'] not in nodes:
-             nodes[row['to_node']] = (row['to_lat'], row['to_lon'])
-
-    return nodes
-
-
-def find_nearest_node(nodes: Dict[int, Tuple[float, float]], lat: float, lon: float) -> Optional[int]:
-    """Finds the graph node ID closest to the given (lat, lon)."""
-    min_dist = float('inf')
-    nearest_node_id = None
-
-    for node_id, (n_lat, n_lon) in nodes.items():
-        dist = haversine_meters(lat, lon, n_lat, n_lon)
-        if dist < min_dist:
-            min_dist = dist
-            nearest_node_id = node_id
-
-    # Use a reasonable threshold (e.g., 50 meters) to match incidents to roads
-    if min_dist < 50:
-        return nearest_node_id
-    return None
-
-
-def apply_incident_to_segments(df: pd.DataFrame, node_id: int, flags: Dict[str, bool]):
-    """Sets the incident flags to True for all segments connected to node_id."""
-    
-    # Segments starting or ending at the node
-    mask = (df['from_node'] == node_id) | (df['to_node'] == node_id)
-    
-    if flags.get("construction"):
-        df.loc[mask, 'closed_for_construction'] = True
-    if flags.get("vip"):
-        df.loc[mask, 'vip_blocked'] = True
-    if flags.get("event"):
-        df.loc[mask, 'event_blocked'] = True
-        
-    # Ensure boolean columns are treated as boolean (important for CSV export)
-    df['closed_for_construction'] = df['closed_for_construction'].astype(bool)
-    df['vip_blocked'] = df['vip_blocked'].astype(bool)
-    df['event_blocked'] = df['event_blocked'].astype(bool)
+TWITTER_BASE_URL = os.environ.get("TWITTER_BASE_URL", "https://api.twitter.com/2")
+TWEETS_PER_PAGE = 100              # API maximum for the user timeline
+MAX_PAGES_PER_RUN = 32             # the timeline only reaches back 3200 tweets anyway
+INITIAL_LOOKBACK_S = 24 * 3600     # first run for an account, before any watermark exists
+
+# classify_tweet_type() keys -> segment flag columns
+FLAG_COLUMNS = {
+    "construction": "closed_for_construction",
+    "vip": "vip_blocked",
+    "event": "event_blocked",
+}
 
 
 def get_user_id(username: str) -> Optional[str]:
@@ -117,7 +85,7 @@ def get_user_id(username: str) -> Optional[str]:
     
     print(f"Looking up User ID for @{username}...")
     try:
-        response = requests.get(url, headers=headers)
+        response = get_client().get(url, headers=headers, timeout=10)
         if response.status_code == 200:
             return response.json().get("data", {}).get("id")
         else:
@@ -129,25 +97,15 @@ def get_user_id(username: str) -> Optional[str]:
         return None
 
 
-def get_recent_tweets(user_id: str, max_results: int = 20) -> List[Dict]:
-    """Fetches recent tweets for a user ID."""
-    if not TWITTER_BEARER_TOKEN:
-        print("\n--- ERROR ---\nTwitter/X Bearer Token is empty. Please set TWITTER_BEARER_TOKEN in the script.\n--- END ERROR ---")
-        return []
-
+def get_tweets_page(user_id: str, params: Dict) -> Optional[Dict]:
+    """One page of a user's timeline (the full JSON body), or None on any error."""
     url = f"{TWITTER_BASE_URL}/users/{user_id}/tweets"
     headers = {"Authorization": f"Bearer {TWITTER_BEARER_TOKEN}"}
-    params = {
-        "max_results": max_results,
-        "tweet.fields": "created_at"
-    }
-    
-    print(f"Fetching {max_results} recent tweets...")
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        
+        response = get_client().get(url, headers=headers, params=params, timeout=10)
+
         if response.status_code == 200:
-            return response.json().get("data", [])
+            return response.json()
         else:
             print(f"\n--- ERROR ---\nTwitter API Request Failed.")
             print(f"Status Code: {response.status_code}")
@@ -158,81 +116,172 @@ def get_recent_tweets(user_id: str, max_results: int = 20) -> List[Dict]:
                 print(f"Response Body: {response.text}")
             print(f"URL: {url}")
             print("--- END ERROR ---")
-            return []
+            return None
 
     except requests.exceptions.RequestException as e:
         print(f"\n--- ERROR ---\nNetwork or Connection Error when fetching Twitter/X incidents: {e}\n--- END ERROR ---")
+        return None
+
+
+def get_recent_tweets(user_id: str, max_results: int = 20) -> List[Dict]:
+    """Fetches recent tweets for a user ID."""
+    if not TWITTER_BEARER_TOKEN:
+        print("\n--- ERROR ---\nTwitter/X Bearer Token is empty. Please set TWITTER_BEARER_TOKEN in the script.\n--- END ERROR ---")
         return []
 
+    print(f"Fetching {max_results} recent tweets...")
+    body = get_tweets_page(user_id, {"max_results": max_results, "tweet.fields": "created_at"})
+    return body.get("data", []) if body else []
+
+
+def fetch_new_tweets(user_id: str, since_id: Optional[str] = None,
+                     max_pages: int = MAX_PAGES_PER_RUN) -> Tuple[List[Dict], Optional[str], bool]:
+    """
+    Pages through every tweet newer than since_id (or, without a watermark, from the
+    last INITIAL_LOOKBACK_S seconds). Returns (tweets oldest first, newest id seen,
+    complete). complete is False if a page failed or max_pages was hit, in which
+    case the caller must not advance its watermark past since_id.
+    """
+    if not TWITTER_BEARER_TOKEN:
+        print("\n--- ERROR ---\nTwitter/X Bearer Token is empty. Please set TWITTER_BEARER_TOKEN in the script.\n--- END ERROR ---")
+        return [], None, False
+
+    params = {"max_results": TWEETS_PER_PAGE, "tweet.fields": "created_at"}
+    if since_id:
+        params["since_id"] = since_id
+    else:
+        params["start_time"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - INITIAL_LOOKBACK_S))
+
+    tweets, newest_id = [], None
+    for _ in range(max_pages):
+        body = get_tweets_page(user_id, params)
+        if body is None:
+            return tweets[::-1], newest_id, False
+        page = body.get("data", [])
+        tweets.extend(page)
+        for tw in page:
+            if newest_id is None or int(tw["id"]) > int(newest_id):
+                newest_id = tw["id"]
+        next_token = body.get("meta", {}).get("next_token")
+        if not next_token or not page:
+            return tweets[::-1], newest_id, True
+        params["pagination_token"] = next_token
+    print(f"Stopped after {max_pages} pages; the rest is fetched next run.")
+    return tweets[::-1], newest_id, False
+
+
+def load_watermarks(path: str = WATERMARK_FILE) -> Dict[str, Dict]:
+    """username -> {"user_id", "since_id", "updated"}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks: Dict[str, Dict], path: str = WATERMARK_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(tmp, path)
+
+
+def fetch_account(username: str, watermarks: Dict[str, Dict]) -> Dict:
+    """
+    New tweets for one account since its watermark. Returns
+    {"username", "user_id", "tweets", "newest_id", "complete"}; the watermark itself
+    is only moved by advance_watermark(), after the tweets have been processed.
+    """
+    mark = watermarks.get(username, {})
+    user_id = mark.get("user_id") or get_user_id(username)
+    if not user_id:
+        print(f"Could not retrieve User ID for @{username}.")
+        return {"username": username, "user_id": None, "tweets": [], "newest_id": None, "complete": False}
+    tweets, newest_id, complete = fetch_new_tweets(user_id, mark.get("since_id"))
+    print(f"@{username}: {len(tweets)} new tweets" + ("" if complete else " (incomplete)"))
+    return {"username": username, "user_id": user_id, "tweets": tweets,
+            "newest_id": newest_id, "complete": complete}
+
+
+async def fetch_accounts(usernames: List[str], watermarks: Dict[str, Dict]) -> List[Dict]:
+    """fetch_account() for every account concurrently."""
+    return await asyncio.gather(*(asyncio.to_thread(fetch_account, u, watermarks) for u in usernames))
+
+
+def advance_watermark(watermarks: Dict[str, Dict], result: Dict, hold_below: Optional[int] = None):
+    """
+    Record the account's user id, and its newest tweet id if the fetch was complete.
+    With hold_below (the oldest tweet id that must be retried), the watermark only
+    moves up to the newest fetched tweet older than it.
+    """
+    if not result["user_id"]:
+        return
+    mark = watermarks.setdefault(result["username"], {})
+    mark["user_id"] = result["user_id"]
+    newest = result["newest_id"]
+    if hold_below is not None:
+        older = [int(tw["id"]) for tw in result["tweets"] if int(tw["id"]) < hold_below]
+        newest = str(max(older)) if older else None
+    if result["complete"] and newest:
+        old = mark.get("since_id")
+        if old is None or int(newest) > int(old):
+            mark["since_id"] = newest
+    mark["updated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
 
 def classify_tweet_type(text: str) -> Dict[str, bool]:
     """Determines incident flags based on tweet text keywords."""
-    text = text.lower()
-    flags = {
-        "construction": any(k in text for k in ["road work", "construction", "repair", "maintenance"]),
-        "vip": any(k in text for k in ["vip", "movement", "procession", "rally"]),
-        "event": any(k in text for k in ["closure", "block", "diversion", "accident", "jampacked"])
-    }
-    return flags
+    return classify_flags(text)
 
 
 def extract_location_hint(text: str) -> Optional[str]:
     """Simple heuristic to find a location name in the tweet text."""
-    # Look for common road-related keywords near capitalized words
-    keywords = ["near", "at", "road", "street", "junction", "signal", "circle", "flyover"]
-    words = text.split()
-    
-    # Simple strategy: look for sequences of capitalized words that follow a keyword
-    # This is highly dependent on the target city/twitter style
-    for i, word in enumerate(words):
-        if word.lower() in keywords and i + 1 < len(words):
-            location_parts = []
-            # Start gathering capitalized words after the keyword
-            for j in range(i + 1, len(words)):
-                if words[j].istitle() or words[j].isupper() or words[j].isdigit():
-                    location_parts.append(words[j])
-                else:
-                    break
-            if location_parts:
-                return " ".join(location_parts)
-    
-    # Fallback: Just return the first sequence of two or more capitalized words
-    for i in range(len(words) - 1):
-        if words[i].istitle() and words[i+1].istitle():
-            loc = [words[i], words[i+1]]
-            for j in range(i + 2, len(words)):
-                 if words[j].istitle():
-                    loc.append(words[j])
-                 else:
-                    break
-            return " ".join(loc)
-            
-    return None
+    return _extract_location_hint(text)
+
+
+_GEOCODE_CACHE = None
+_GEOCODER = None
+
+
+def get_geocode_cache() -> GeocodeCache:
+    global _GEOCODE_CACHE
+    if _GEOCODE_CACHE is None:
+        _GEOCODE_CACHE = GeocodeCache()
+    return _GEOCODE_CACHE
+
+
+def get_geocoder() -> RateLimitedGeocoder:
+    """The process-wide geocoder, so every lookup shares one 1 request/second budget."""
+    global _GEOCODER
+    if _GEOCODER is None:
+        _GEOCODER = RateLimitedGeocoder(get_geocode_cache(), url=NOMINATIM_URL)
+    return _GEOCODER
 
 
 def geocode_place(query: str, city: str) -> Optional[Tuple[float, float]]:
-    """Geocodes a location query using OpenStreetMap Nominatim API."""
-    params = {
-        "q": f"{query}, {city}, India",  # Geocode within the context of the city
-        "format": "json",
-        "limit": 1
-    }
-    
-    print(f"Geocoding query: '{query}'...")
-    try:
-        response = requests.get(NOMINATIM_URL, params=params, timeout=10)
-        response.raise_for_status()
-        results = response.json()
-        
-        if results:
-            lat = float(results[0].get('lat'))
-            lon = float(results[0].get('lon'))
-            return lat, lon
-        return None
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Geocoding error: {e}")
-        return None
+    """Geocodes a location query using OpenStreetMap Nominatim API (cache first, rate-limited)."""
+    return asyncio.run(get_geocoder().geocode(query, city))
+
+
+def carry_over_flags(df: pd.DataFrame, previous_csv: str = OUTPUT_CSV) -> int:
+    """OR the flags of the previous enriched CSV into df (matched by from_node/to_node); returns rows carried."""
+    if not os.path.exists(previous_csv):
+        return 0
+    flag_cols = list(FLAG_COLUMNS.values())
+    prev = pd.read_csv(previous_csv)
+    cols = [c for c in flag_cols if c in prev.columns]
+    if not cols or not {"from_node", "to_node"} <= set(prev.columns):
+        return 0
+    prev = prev.groupby(["from_node", "to_node"])[cols].max()
+    pos = prev.index.get_indexer(pd.MultiIndex.from_frame(df[["from_node", "to_node"]]))
+    found = pos >= 0
+    carried = pd.Series(False, index=df.index)
+    for col in cols:
+        old = pd.Series(False, index=df.index)
+        old[found] = prev[col].to_numpy()[pos[found]].astype(bool)
+        df[col] = df[col].astype(bool) | old
+        carried |= old
+    return int(carried.sum())
 
 
 def main():
@@ -248,51 +297,71 @@ def main():
     if 'vip_blocked' not in df.columns: df['vip_blocked'] = False
     if 'closed_for_construction' not in df.columns: df['closed_for_construction'] = False
 
-    # 1) Get User ID
-    user_id = get_user_id(TRAFFIC_USERNAME)
-    if not user_id:
-        print(f"Could not retrieve User ID for @{TRAFFIC_USERNAME}. Cannot proceed with tweet ingestion.")
-        df.to_csv(OUTPUT_CSV, index=False)
-        print(f"Data saved without Twitter enrichment to: {OUTPUT_CSV}")
-        return
-    print(f"Successfully retrieved User ID: {user_id}")
+    # Keep the incidents of earlier runs: this run only sees tweets newer than the watermark
+    carried = carry_over_flags(df, OUTPUT_CSV)
+    if carried:
+        print(f"Carried over flags on {carried} segments from: {OUTPUT_CSV}")
 
-    # 2) Build node table for nearest neighbor search
-    print("Building node table...")
-    nodes = build_node_table(df)
-    print("Unique nodes:", len(nodes))
+    # 1) Fetch every account's new tweets since its watermark, concurrently
+    watermarks = load_watermarks()
+    results = asyncio.run(fetch_accounts(TRAFFIC_USERNAMES, watermarks))
+    tweets = [(r["username"], tw) for r in results for tw in r["tweets"]]
+
+    # 2) Build node table + node -> edge incidence index for nearest neighbor search
+    print("Building segment index...")
+    index = SegmentIndex(df)
+    print("Unique nodes:", len(index.nodes))
+    classifier = TweetClassifier(Gazetteer.from_segments(df))
+    print("Gazetteer road names:", len(classifier.gazetteer))
 
-    # 3) Fetch recent tweets
-    tweets = get_recent_tweets(user_id, max_results=20)
-    
     if not tweets:
-        print("No tweets fetched or API error. Saving base copy as:", OUTPUT_CSV)
+        print("No new tweets (or API error). Saving previous flags as:", OUTPUT_CSV)
         df.to_csv(OUTPUT_CSV, index=False)
+        for r in results:
+            advance_watermark(watermarks, r)
+        save_watermarks(watermarks)
         return
 
-    # 4) Process and map tweets
-    incidents_applied_count = 0
-    for tw in tweets:
+    # 4) Classify tweets and extract location hints (a road name that is the whole location carries coordinates)
+    candidates = []
+    for username, tw in tweets:
         text = tw.get("text", "")
         created_at = tw.get("created_at", "")
         print("\nTweet:", created_at)
         print(text)
 
-        flags = classify_tweet_type(text)
-        if not any(flags.values()):
+        result = classifier.classify(text)
+        if result is None:
             print(" -> No closure/VIP/event keywords, skipping.")
             continue
 
-        loc_hint = extract_location_hint(text)
+        flags, loc_hint = result["flags"], result["location_hint"]
         if not loc_hint:
             print(" -> Could not find location in tweet, skipping.")
             continue
 
         print(" -> Detected incident type:", flags, "location hint:", loc_hint)
-        
-        # Geocode the location hint
-        geo = geocode_place(loc_hint, city="Bengaluru")
-        
+        candidates.append((username, int(tw["id"]), result))
+
+    # 5) Geocode the remaining hints at once: cache first, misses rate-limited to 1 request/second
+    to_geocode = [r["location_hint"] for *_, r in candidates if not r["place"]]
+    geocoder = get_geocoder()
+    geocoded = iter(asyncio.run(geocoder.geocode_many([(hint, GEOCODE_CITY) for hint in to_geocode])))
+    geos = [(r["lat"], r["lon"]) if r["place"] else next(geocoded) for *_, r in candidates]
+    print("\nGazetteer matches:", len(candidates) - len(to_geocode), "geocoding:", geocoder.stats)
+
+    # 6) Map incidents to graph nodes
+    incidents_applied_count = 0
+    matches = []
+    hold_below = {}  # username -> oldest tweet id whose geocoding must be retried
+    for (username, tweet_id, result), geo in zip(candidates, geos):
+        flags, loc_hint = result["flags"], result["location_hint"]
+        if not geo and geocoder.lookup_failed(loc_hint, GEOCODE_CITY):
+            hold_below[username] = min(hold_below.get(username, tweet_id), tweet_id)
+            print(" -> Geocoding error for location:", loc_hint, "(retried next run)")
+            continue
+        # a place on a road the tweet names is moved onto that road
+        geo = classifier.snap(result, geo)
         if not geo:
             print(" -> Geocoding failed for location:", loc_hint)
             continue
@@ -300,20 +369,27 @@ def main():
         lat, lon = geo
         print(f" -> Geocoded to ({lat:.5f}, {lon:.5f})")
 
-        node_id = find_nearest_node(nodes, lat, lon)
+        node_id = index.nearest_node(lat, lon)
         if not node_id:
             print(" -> No nearest node found (closest point > 50m), skipping.")
             continue
 
         print(" -> Nearest graph node:", node_id)
-        apply_incident_to_segments(df, node_id, flags)
+        matches.extend((node_id, FLAG_COLUMNS[k]) for k, on in flags.items() if on)
         incidents_applied_count += 1
-        print(" -> Applied incident flags to connected segments.")
-
 
-    print(f"\nSuccessfully applied {incidents_applied_count} Twitter incidents to the graph data.")
+    # 7) Apply all incidents at once: one scatter write per flag column
+    applied = apply_incident_flags(df, index, matches)
+    print("\nFlagged segments per flag:", applied)
+    print(f"Successfully applied {incidents_applied_count} Twitter incidents to the graph data.")
     df.to_csv(OUTPUT_CSV, index=False)
     print(f"Final enriched data saved to: {OUTPUT_CSV}")
+
+    # 8) Only now move the watermarks past the processed tweets (not past failed geocodes)
+    for r in results:
+        advance_watermark(watermarks, r, hold_below.get(r["username"]))
+    save_watermarks(watermarks)
+    print("Watermarks:", {u: m.get("since_id") for u, m in watermarks.items()})
     print("Done.")
 
 if __name__ == "__main__":
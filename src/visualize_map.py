@@ -4,9 +4,14 @@ visualize_map.py
 Visualises the road graph on an interactive map (Leaflet via folium).
 
 - Reads the MOST enriched CSV it can find:
-    1) segments_features_enriched_tomtom.csv
-    2) segments_features_enriched.csv
-    3) segments_features.csv
+    1) segments_features_enriched_fused.csv
+    2) segments_features_enriched_tomtom.csv
+    3) segments_features_enriched.csv
+    4) segments_features.csv
+
+- If incident ingestion has written an event log (see incident_log.py), the
+  incident flags are replaced by the currently active incidents, so expired
+  closures are not drawn.
 
 - Draws each road segment as a polyline.
 - Colors segments based on:
@@ -26,6 +31,8 @@ import pandas as pd
 from shapely import wkt
 import folium
 
+from incident_log import EVENT_LOG, SNAPSHOT_FILE, load_current_store
+
 # -----------------------------
 # CONFIG
 # -----------------------------
@@ -33,6 +40,7 @@ import folium
 OUT_DIR = "datalink_output"
 
 CANDIDATE_CSVS = [
+    os.path.join(OUT_DIR, "segments_features_enriched_fused.csv"),
     os.path.join(OUT_DIR, "segments_features_enriched_tomtom.csv"),
     os.path.join(OUT_DIR, "segments_features_enriched.csv"),
     os.path.join(OUT_DIR, "segments_features.csv"),
@@ -118,6 +126,11 @@ def main():
     df = pd.read_csv(csv_path)
     print("Rows:", len(df))
 
+    if os.path.exists(EVENT_LOG) or os.path.exists(SNAPSHOT_FILE):
+        store = load_current_store()
+        store.apply_to_df(df)
+        print(f"Incident flags from {SNAPSHOT_FILE} + {EVENT_LOG}: {len(store)} active incidents")
+
     if "geometry_wkt" in df.columns:
         geom_col = "geometry_wkt"
     elif "geometry" in df.columns:
@@ -1,48 +1,18 @@
-import pandas as pd
-import numpy as np
-import joblib
-import os
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.pipeline import Pipeline
+"""
+weight.py
 
-df = pd.read_csv("data/sample.csv")
+Trains only the weight model, with predicted_congestion as an input feature (the
+two-stage variant served by predict.FusedPredictor); see training.py.
 
-y = df["weight"]
+Usage:
+  python weight.py [--warm-start] [data.csv]
+"""
+import sys
 
-features = df.drop(columns=["weight"])
+from training import DATA_PATH, train
 
-numeric = [
-    "distance", "road_quality", "lane_count", "speed_limit",
-    "tolls", "foot_traffic", "historical_congestion",
-    "pothole_reports", "predicted_congestion"
-]
-
-categorical = [
-    "road_type", "event", "vehicle_type", "accident"
-]
-
-preprocess = ColumnTransformer(
-    transformers=[
-        ("num", StandardScaler(), numeric),
-        ("cat", OneHotEncoder(handle_unknown="ignore"), categorical)
-    ]
-)
-
-model = RandomForestRegressor(
-    n_estimators=200,
-    random_state=42
-)
-
-pipeline = Pipeline([
-    ("preprocess", preprocess),
-    ("model", model)
-])
-
-pipeline.fit(features, y)
-
-os.makedirs("model", exist_ok=True)
-joblib.dump(pipeline, "model/weight.joblib")
-
-print("Weight model saved successfully!")
\ No newline at end of file
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    train(args[0] if args else DATA_PATH, ["weight"], warm_start="--warm-start" in sys.argv,
+          weight_uses_congestion=True)
+    print("Weight model saved successfully!")
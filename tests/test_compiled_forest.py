@@ -0,0 +1,65 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from compiled_forest import (CompiledForest, compile_pipeline, expected_schema_hash, load_model,
+                             save_bundle)
+
+
+def _pipeline(categories=("urban", "rural"), seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"distance": rng.uniform(1, 50, 200),
+                       "road_type": rng.choice(list(categories), 200)})
+    y = df["distance"] * np.where(df["road_type"] == categories[0], 1.0, 2.0)
+    pre = ColumnTransformer([("num", StandardScaler(), ["distance"]),
+                             ("cat", OneHotEncoder(handle_unknown="ignore"), ["road_type"])])
+    model = Pipeline([("pre", pre), ("rf", RandomForestRegressor(n_estimators=5, random_state=seed))])
+    return model.fit(df, y), df
+
+
+def test_publishing_a_bundle_swaps_a_symlink(tmp_path):
+    path = str(tmp_path / "weight_bundle")
+    first = save_bundle(compile_pipeline(_pipeline(seed=0)[0]), path)
+    second = save_bundle(compile_pipeline(_pipeline(seed=1)[0]), path)
+    third = save_bundle(compile_pipeline(_pipeline(seed=2)[0]), path)
+    assert os.path.islink(path)
+    assert os.readlink(path) == f"weight_bundle.{third['version']}-{third['schema_hash'][:8]}"
+    assert CompiledForest.load_bundle(path).version == third["version"]
+    # the live version and the previous one are kept
+    kept = sorted(n for n in os.listdir(tmp_path) if n.startswith("weight_bundle."))
+    assert kept == sorted(f"weight_bundle.{m['version']}-{m['schema_hash'][:8]}" for m in (second, third))
+    assert first["version"] not in "".join(kept)
+
+
+def test_load_model_refuses_a_schema_other_than_the_trained_one(tmp_path):
+    pipeline, df = _pipeline()
+    bundle = str(tmp_path / "weight_bundle")
+    manifest = save_bundle(compile_pipeline(pipeline), bundle)
+    training_manifest = tmp_path / "manifest.json"
+    training_manifest.write_text(json.dumps({"models": {"weight": {
+        "path": str(tmp_path / "weight.joblib"), "bundle": bundle, "schema_hash": manifest["schema_hash"]}}}))
+    expected = expected_schema_hash(str(tmp_path / "weight.joblib"), bundle, str(training_manifest))
+    assert expected == manifest["schema_hash"]
+
+    model = load_model(str(tmp_path / "weight.joblib"), None, bundle, expected_schema=expected)
+    assert np.allclose(model.predict(df), pipeline.predict(df))
+
+    save_bundle(compile_pipeline(_pipeline(categories=("urban", "highway"))[0]), bundle)
+    with pytest.raises(ValueError, match="schema"):
+        load_model(str(tmp_path / "weight.joblib"), None, bundle, expected_schema=expected)
+
+
+def test_unknown_categories_encode_as_zeros_like_sklearn():
+    pipeline, df = _pipeline()
+    model = CompiledForest.from_pipeline(pipeline)
+    rows = pd.DataFrame({"distance": [5.0, 20.0, 40.0], "road_type": ["urban", "motorway", None]})
+    X = model.transform(rows)
+    assert X[:, 1:].tolist() == [[0.0, 1.0], [0.0, 0.0], [0.0, 0.0]]
+    assert np.allclose(model.predict(rows), pipeline.predict(rows))
@@ -0,0 +1,69 @@
+import io
+
+import networkx as nx
+import pandas as pd
+
+from datalink_pipeline import diff_edge_tables, keep_largest_component, tag_components
+
+
+def _graph(edges):
+    G = nx.DiGraph()
+    for u, v, one_way in edges:
+        G.add_edge(u, v, one_way=one_way, segment_id="1")
+    return G
+
+
+def test_two_way_roads_form_one_strong_component():
+    # a two-way street exported in way order only, plus a one-way exit to a dead end
+    G = _graph([("a", "b", False), ("b", "c", False), ("c", "d", True)])
+    n_scc, n_wcc = tag_components(G)
+    assert (n_scc, n_wcc) == (2, 1)
+    assert {G.nodes[n]["component_id"] for n in "abc"} == {0}
+    assert G.edges["a", "b"]["component_id"] == 0
+    assert G.edges["c", "d"]["component_id"] == -1
+    assert set(keep_largest_component(G).nodes) == {"a", "b", "c"}
+
+
+def test_csv_round_trip_is_not_a_change():
+    df = pd.DataFrame({
+        "from_node": ["a", "b"], "to_node": ["b", "c"],
+        "lane_count": [3, 2], "length_m": [12.5, 7.0], "lit": [True, False],
+        "road_name": ["MG Road", None], "segment_id": ["10", "11"],
+    })
+    buf = io.StringIO()
+    df.assign(lane_count=df["lane_count"].astype(float)).to_csv(buf, index=False)
+    buf.seek(0)
+    prev = pd.read_csv(buf, dtype={"segment_id": str})
+    removed, upserts = diff_edge_tables(prev, df)
+    assert removed == [] and upserts.empty
+
+    df.loc[1, "lane_count"] = 4
+    removed, upserts = diff_edge_tables(prev, df)
+    assert upserts[["from_node", "to_node"]].values.tolist() == [["b", "c"]]
+
+
+def _overpass():
+    geometry = [{"lat": 12.9700, "lon": 77.5900}, {"lat": 12.9705, "lon": 77.5905},
+                {"lat": 12.9710, "lon": 77.5910}]
+    return {"elements": [{"type": "way", "id": 7, "geometry": geometry,
+                          "tags": {"highway": "residential", "name": "Test Road"}}]}
+
+
+def test_pipeline_version_change_forces_full_rebuild(tmp_path, monkeypatch):
+    import json
+    import datalink_pipeline as dp
+
+    monkeypatch.setattr(dp, "OUT_DIR", str(tmp_path))
+    monkeypatch.setattr(dp, "fetch_osm_roads", lambda bbox: _overpass())
+
+    def delta():
+        with open(tmp_path / dp.DELTA_FILE, encoding="utf-8") as f:
+            return json.load(f)
+
+    dp.run_pipeline(dp.BBOX)
+    assert delta()["full"]
+    dp.run_pipeline(dp.BBOX)
+    assert not delta()["full"]
+    monkeypatch.setattr(dp, "PIPELINE_VERSION", dp.PIPELINE_VERSION + 1)
+    dp.run_pipeline(dp.BBOX)
+    assert delta()["full"]
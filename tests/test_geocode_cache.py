@@ -0,0 +1,62 @@
+import time
+import asyncio
+
+from geocode_cache import GeocodeCache, RateLimitedGeocoder, normalize_key
+from stub_server import PLACES, StubServer, nominatim_route, static_route
+
+
+def _cache(tmp_path, **kwargs):
+    return GeocodeCache(str(tmp_path / "geocode.sqlite"), **kwargs)
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+    cache = _cache(tmp_path, ttl_s=100, negative_ttl_s=10)
+    cache.put("found", (12.9, 77.6))
+    cache.put("missing", None)
+    assert cache.get("found") == (True, (12.9, 77.6))
+    assert cache.get("missing") == (True, None)
+
+    cache.conn.execute("UPDATE geocode SET ts = ts - 50")  # past the negative TTL only
+    assert cache.get("found") == (True, (12.9, 77.6))
+    assert cache.get("missing") == (False, None)
+    assert cache.purge_expired() == 1
+
+    cache.conn.execute("UPDATE geocode SET ts = ts - 100")
+    assert cache.get("found") == (False, None)
+
+
+def test_unknown_place_is_cached_negatively(tmp_path):
+    with StubServer({"/search": nominatim_route(PLACES)}) as server:
+        geocoder = RateLimitedGeocoder(_cache(tmp_path), url=server.url + "/search", min_interval_s=0)
+        assert asyncio.run(geocoder.geocode("Nowhere Junction", "Bengaluru")) is None
+        assert asyncio.run(geocoder.geocode("Nowhere Junction", "Bengaluru")) is None
+        assert server.requests["/search"] == 1
+        assert geocoder.stats["negative_hits"] == 1
+        assert not geocoder.lookup_failed("Nowhere Junction", "Bengaluru")
+
+
+def test_errors_are_not_cached(tmp_path):
+    with StubServer({"/search": static_route({"error": "bad request"}, status=400)}) as server:
+        cache = _cache(tmp_path)
+        geocoder = RateLimitedGeocoder(cache, url=server.url + "/search", min_interval_s=0)
+        assert asyncio.run(geocoder.geocode("MG Road", "Bengaluru")) is None
+        assert geocoder.lookup_failed("MG Road", "Bengaluru")
+        assert cache.get(normalize_key("MG Road", "Bengaluru")) == (False, None)
+
+
+def test_misses_are_spaced_to_the_request_interval(tmp_path):
+    hints = ["Silk Board Junction", "MG Road", "Kasturba Road", "Hudson Circle"]
+    with StubServer({"/search": nominatim_route(PLACES)}) as server:
+        geocoder = RateLimitedGeocoder(_cache(tmp_path), url=server.url + "/search", min_interval_s=0.2)
+        t0 = time.monotonic()
+        # the repeated hint shares the in-flight request
+        results = asyncio.run(geocoder.geocode_many([(h, "Bengaluru") for h in hints + ["MG Road"]]))
+        elapsed = time.monotonic() - t0
+        assert all(results)
+        assert server.requests["/search"] == len(hints)
+        assert elapsed >= 0.2 * (len(hints) - 1)
+
+        t0 = time.monotonic()
+        asyncio.run(geocoder.geocode_many([(h, "Bengaluru") for h in hints]))
+        assert time.monotonic() - t0 < 0.2  # all cache hits: no waiting, no requests
+        assert server.requests["/search"] == len(hints)
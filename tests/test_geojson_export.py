@@ -0,0 +1,50 @@
+import json
+
+import numpy as np
+import pytest
+
+import geojson_export
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_nan_is_written_as_null(backend, monkeypatch):
+    if backend == "json":
+        monkeypatch.setattr(geojson_export, "orjson", None)
+        monkeypatch.setattr(geojson_export, "json", json, raising=False)
+    elif geojson_export.orjson is None:
+        pytest.skip("orjson not installed")
+    feature = {"type": "Feature",
+               "properties": {"lane_count": float("nan"), "speed": np.float32(np.nan),
+                              "risk": np.float64(0.25), "lanes": np.int64(2), "name": "MG Road"},
+               "geometry": {"type": "LineString", "coordinates": [[77.59, 12.97], [77.6, 12.98]]}}
+    out = json.loads(geojson_export.dumps(feature))
+    assert out["properties"] == {"lane_count": None, "speed": None, "risk": 0.25, "lanes": 2, "name": "MG Road"}
+    assert out["geometry"]["coordinates"] == [[77.59, 12.97], [77.6, 12.98]]
+
+
+def _chain_graph():
+    import networkx as nx
+    # a primary road split into two-point edges, with a ~1 m wiggle
+    G = nx.DiGraph()
+    lats = [12.97, 12.97001, 12.97, 12.97001, 12.97]
+    for k, lat in enumerate(lats):
+        G.add_node(k, lat=lat, lon=77.59 + k * 0.0002)
+    for k in range(len(lats) - 1):
+        G.add_edge(k, k + 1, road_type="primary", segment_id="1", length_m=22.0)
+    return G
+
+
+def _features(tile_root, z):
+    feats = []
+    for path in tile_root.glob(f"{z}/*/*.geojson"):
+        feats.extend(json.loads(path.read_text())["features"])
+    return feats
+
+
+def test_chains_are_simplified_at_low_zoom(tmp_path):
+    geojson_export.export_geojson_tiles(_chain_graph(), str(tmp_path), zooms=[13, 17])
+    low = _features(tmp_path, 13)
+    assert len(low) == 1
+    assert low[0]["geometry"]["coordinates"] == [[77.59, 12.97], [77.5908, 12.97]]
+    high = _features(tmp_path, 17)
+    assert len(high) == 1 and len(high[0]["geometry"]["coordinates"]) == 5
@@ -0,0 +1,48 @@
+import networkx as nx
+
+from graph_simplify import simplify_graph, expand_route
+
+ATTRS = {"road_type": "residential", "lane_count": 1, "speed_limit_kph": 30, "toll": 0,
+         "surface_type": "asphalt", "lit": False, "one_way": True, "event_blocked": False,
+         "vip_blocked": False, "closed_for_construction": False, "length_m": 10.0,
+         "road_quality": 4.0, "segment_id": "1"}
+
+
+def _graph(edges):
+    G = nx.DiGraph()
+    for i, (u, v) in enumerate(edges):
+        for n in (u, v):
+            G.add_node(n, lat=12.97 + 0.001 * len(G), lon=77.59)
+        G.add_edge(u, v, **dict(ATTRS, segment_id=str(i)))
+    return G
+
+
+def _covered_segments(H):
+    segments = set()
+    for u, v, data in H.edges(data=True):
+        segments.update(expand_route([u, v], {(u, v): data["node_path"]}))
+    return segments
+
+
+def test_parallel_chains_between_the_same_junctions_are_both_kept():
+    G = _graph([("X", "J1"), ("J1", "a"), ("a", "J2"), ("J1", "b"), ("b", "J2"), ("J2", "Y")])
+    H = simplify_graph(G)
+    assert _covered_segments(H) == set(G.edges)
+    paths = sorted(d["node_path"] for _, _, d in H.edges(data=True))
+    assert ["J1", "a", "J2"] in paths or (["J1", "a"] in paths and ["a", "J2"] in paths)
+    assert ["J1", "b", "J2"] in paths or (["J1", "b"] in paths and ["b", "J2"] in paths)
+
+
+def test_direct_edge_parallel_to_a_chain_is_kept():
+    G = _graph([("X", "J1"), ("J1", "a"), ("a", "J2"), ("J1", "J2"), ("J2", "Y")])
+    H = simplify_graph(G)
+    assert _covered_segments(H) == set(G.edges)
+    assert H.has_edge("J1", "J2") and H.edges["J1", "J2"]["node_path"] == ["J1", "J2"]
+
+
+def test_chain_is_contracted():
+    G = _graph([("X", "a"), ("a", "b"), ("b", "Y")])
+    H = simplify_graph(G)
+    assert list(H.edges) == [("X", "Y")]
+    assert H.edges["X", "Y"]["node_path"] == ["X", "a", "b", "Y"]
+    assert H.edges["X", "Y"]["length_m"] == 30.0
@@ -0,0 +1,103 @@
+import time
+import threading
+
+from http_client import HttpClient
+from stub_server import StubServer, flaky, static_route
+
+
+def _client(**kwargs):
+    kwargs.setdefault("backoff_base_s", 0.01)
+    kwargs.setdefault("retry_min_interval_s", 0.2)
+    return HttpClient(**kwargs)
+
+
+def _timed(route, times):
+    def handle(params, body):
+        times.append(time.monotonic())
+        return route(params, body)
+    return handle
+
+
+def test_retries_5xx_until_success():
+    with StubServer({"/x": flaky(static_route({"ok": True}), failures=2)}) as server:
+        client = _client()
+        resp = client.get(server.url + "/x")
+        assert resp.status_code == 200 and resp.json() == {"ok": True}
+        assert server.requests["/x"] == 3
+        m = client.metrics()[server.url.split("//")[1]]
+        assert m["retries"] == 2 and m["statuses"] == {503: 2, 200: 1}
+
+
+def test_gives_up_after_max_retries():
+    with StubServer({"/x": static_route({"error": "down"}, status=503)}) as server:
+        resp = _client(max_retries=2, retry_min_interval_s=0.01).get(server.url + "/x")
+        assert resp.status_code == 503
+        assert server.requests["/x"] == 3
+
+
+def test_no_retry_on_client_errors():
+    with StubServer({"/x": static_route({"error": "bad"}, status=400)}) as server:
+        assert _client().get(server.url + "/x").status_code == 400
+        assert server.requests["/x"] == 1
+
+
+def test_refused_request_waits_at_least_the_minimum_interval():
+    times = []
+    with StubServer({"/x": _timed(flaky(static_route({}), failures=2, status=429), times)}) as server:
+        assert _client(retry_min_interval_s=0.2).get(server.url + "/x").status_code == 200
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert len(gaps) == 2 and min(gaps) >= 0.2
+
+
+def test_retry_after_is_honoured():
+    times = []
+    with StubServer({"/x": _timed(flaky(static_route({}), failures=1, status=429, retry_after="1"), times)}) as server:
+        assert _client().get(server.url + "/x").status_code == 200
+    assert times[1] - times[0] >= 1.0
+
+
+def test_long_retry_after_is_returned_not_shortened():
+    with StubServer({"/x": flaky(static_route({}), failures=1, status=429, retry_after="60")}) as server:
+        t0 = time.monotonic()
+        assert _client(backoff_max_s=1.0).get(server.url + "/x").status_code == 429
+        assert time.monotonic() - t0 < 1.0
+        assert server.requests["/x"] == 1
+
+
+def test_refusal_holds_back_other_requests_to_the_host():
+    x_times, y_times = [], []
+    with StubServer({"/x": _timed(flaky(static_route({}), failures=1, status=503), x_times),
+                     "/y": _timed(static_route({}), y_times)}) as server:
+        client = _client(retry_min_interval_s=0.3)
+        refused = threading.Thread(target=client.get, args=(server.url + "/x",))
+        refused.start()
+        while not x_times:
+            time.sleep(0.005)
+        time.sleep(0.05)  # let the 503 arrive
+        assert client.get(server.url + "/y").status_code == 200
+        refused.join()
+    assert y_times[0] - x_times[0] >= 0.3
+
+
+def test_per_host_concurrency_limit():
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def slow(params, body):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return 200, {}
+
+    with StubServer({"/x": slow}) as server:
+        client = _client(per_host_concurrency=2)
+        threads = [threading.Thread(target=client.get, args=(server.url + "/x",)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert server.requests["/x"] == 8
+        assert state["peak"] == 2
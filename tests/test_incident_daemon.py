@@ -0,0 +1,67 @@
+import json
+import time
+import asyncio
+
+import pandas as pd
+
+import incident_daemon
+from incident_daemon import DeltaPublisher, FakeSource, IncidentDaemon
+from incident_log import read_events
+from segment_index import SegmentIndex
+
+# a two-way road and, 1 km north, a one-way road, both stored west -> east
+ROAD = ("12.9700_77.5900", "12.9700_77.5920")
+ONE_WAY = ("12.9800_77.5900", "12.9800_77.5920")
+EAST = [(12.9701, 77.5905), (12.9701, 77.5915)]
+EAST_ONE_WAY = [(12.9801, 77.5905), (12.9801, 77.5915)]
+
+
+def _daemon(tmp_path, monkeypatch, batches):
+    monkeypatch.setattr(incident_daemon, "SNAPSHOT_FILE", str(tmp_path / "snapshot.json"))
+    df = pd.DataFrame([ROAD + (False,), ONE_WAY + (True,)], columns=["from_node", "to_node", "one_way"])
+    source = FakeSource(batches=batches)
+    daemon = IncidentDaemon(SegmentIndex(df), [source], DeltaPublisher(str(tmp_path / "deltas.jsonl")),
+                            metrics_path=str(tmp_path / "metrics.json"), compact_interval_s=None)
+    return daemon, source
+
+
+def test_fake_source_polls_publish_refresh_and_expire(tmp_path, monkeypatch):
+    clock = [float(int(time.time()))]  # whole seconds, as the deltas are written
+    monkeypatch.setattr(incident_daemon.time, "time", lambda: clock[0])
+    t0 = clock[0]
+    jam = {"id": "a", "flags": ["event_blocked"], "points": EAST[::-1]}  # implicit 6 h TTL
+    vip = {"id": "v", "flags": ["vip_blocked"], "points": EAST_ONE_WAY,
+           "end": incident_daemon.format_time(t0 + 600)}
+    wrong_way = {"id": "w", "flags": ["vip_blocked"], "points": EAST_ONE_WAY[::-1]}
+    daemon, source = _daemon(tmp_path, monkeypatch, [[jam, vip, wrong_way], [jam]])
+
+    assert asyncio.run(daemon.poll_once(source)) == 2
+    assert daemon.store.blocked_edges() == {ROAD, ONE_WAY}
+
+    # 4 h later the VIP movement is over and the jam is past half its TTL: it is re-published
+    clock[0] = t0 + 4 * 3600
+    assert asyncio.run(daemon.poll_once(source)) == 1
+    assert daemon.store.blocked_edges() == {ROAD}
+
+    records, _ = read_events(str(tmp_path / "deltas.jsonl"))
+    assert [(r["source"], r["incident_id"]) for r in records] == [
+        ("fusion", "fake/a"), ("fusion", "fake/v"), ("fusion", "fake/a")]
+    assert [r["edges"] for r in records] == [[list(ROAD)], [list(ONE_WAY)], [list(ROAD)]]
+    assert incident_daemon.parse_time(records[2]["end"]) == t0 + 10 * 3600
+
+    m = daemon.metrics["fake"]
+    assert (m["polls"], m["poll_errors"]) == (2, 0)
+    assert (m["incidents_seen"], m["incidents_applied"], m["incidents_refreshed"]) == (3, 2, 1)
+    assert m["edges_flagged"] == 3
+    with open(tmp_path / "metrics.json", encoding="utf-8") as f:
+        written = json.load(f)
+    assert written["active_incidents"] == 1 and written["sources"]["fake"]["polls"] == 2
+
+
+def test_restart_resumes_without_republishing(tmp_path, monkeypatch):
+    jam = {"id": "a", "flags": ["closed_for_construction"], "points": EAST}
+    daemon, source = _daemon(tmp_path, monkeypatch, [[jam]])
+    assert asyncio.run(daemon.poll_once(source)) == 1
+    daemon, source = _daemon(tmp_path, monkeypatch, [[jam]])
+    assert asyncio.run(daemon.poll_once(source)) == 0
+    assert daemon.store.blocked_edges() == {ROAD}
@@ -0,0 +1,17 @@
+from incident_fusion import fuse_incidents
+
+
+def _inc(source, iid, t, rows, flags=("event_blocked",)):
+    return {"source": source, "id": iid, "flags": list(flags), "rows": rows, "t": t, "end": None}
+
+
+def test_merged_cluster_is_keyed_by_earliest_member():
+    # b's cluster is larger, so a's cluster is merged into it when c bridges both
+    incidents = [_inc("twitter:acct", "a", 0.0, [1, 2]),
+                 _inc("tomtom", "b", 10.0, [5, 6, 7]),
+                 _inc("tomtom", "c", 20.0, [1, 2, 5, 6, 7])]
+    fused = fuse_incidents(incidents)
+    assert len(fused) == 1
+    assert fused[0]["members"] == [("twitter:acct", "a"), ("tomtom", "b"), ("tomtom", "c")]
+    assert fused[0]["start"] == 0.0
+    assert list(fused[0]["rows"]) == [1, 2, 5, 6, 7]
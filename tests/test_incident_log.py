@@ -0,0 +1,45 @@
+import json
+
+from incident_log import IncidentLogReader, append_events, compact, load_current_store, read_events
+from incident_store import format_time
+
+T0 = 1_800_000_000
+
+
+def _record(incident_id, edge, end, start=T0):
+    return {"ts": format_time(start), "source": "tomtom", "incident_id": incident_id, "flags": ["event_blocked"],
+            "start": format_time(start), "end": format_time(end), "edges": [list(edge)]}
+
+
+def test_compact_folds_log_into_snapshot(tmp_path):
+    log, snapshot = str(tmp_path / "deltas.jsonl"), str(tmp_path / "snapshot.json")
+    append_events([_record("a", ("u", "v"), T0 + 100), _record("b", ("v", "w"), T0 + 10),
+                   _record("a", ("u", "v"), T0 + 200)], log)
+
+    stats = compact(log, snapshot, now=T0 + 50)
+    assert stats == {"generation": 1, "log_records": 3, "snapshot_before": 0, "snapshot_after": 1}
+    assert read_events(log) == ([], 0)
+    with open(snapshot, encoding="utf-8") as f:
+        kept = json.load(f)["incidents"]
+    assert [(r["incident_id"], r["end"]) for r in kept] == [("a", format_time(T0 + 200))]
+    assert load_current_store(log, snapshot, now=T0 + 50).blocked_edges() == {("u", "v")}
+
+
+def test_reader_tails_log_across_compaction(tmp_path):
+    log, snapshot = str(tmp_path / "deltas.jsonl"), str(tmp_path / "snapshot.json")
+    reader = IncidentLogReader(log, snapshot)
+    append_events([_record("a", ("u", "v"), T0 + 100)], log)
+    assert reader.refresh() == 1
+    assert reader.refresh() == 0  # nothing new: only the tail is read
+
+    append_events([_record("b", ("v", "w"), T0 + 100)], log)
+    compact(log, snapshot, now=T0 + 1)
+    append_events([_record("c", ("w", "x"), T0 + 100)], log)
+    # the new snapshot replaces the store; the truncated log is read from its start
+    assert reader.refresh() == 3
+    assert reader.generation == 1
+    assert reader.store.blocked_edges(now=T0 + 1) == {("u", "v"), ("v", "w"), ("w", "x")}
+
+    append_events([_record("d", ("x", "y"), T0 + 100)], log)
+    assert reader.refresh() == 1
+    assert reader.store.blocked_edges(now=T0 + 1) == {("u", "v"), ("v", "w"), ("w", "x"), ("x", "y")}
@@ -0,0 +1,27 @@
+from incident_store import IncidentStore, FLAG_BITS
+
+
+def test_entries_activate_and_expire_in_time_order():
+    store = IncidentStore()
+    store.add("tomtom", "early", ["event_blocked"], [("a", "b")], start=0, end=50)
+    store.add("tomtom", "late", ["vip_blocked"], [("a", "b"), ("b", "c")], start=20, end=100)
+    store.add("tomtom", "gone", ["event_blocked"], [("c", "d")], start=0, end=10)
+
+    assert store.effective_masks(now=15) == {("a", "b"): FLAG_BITS["event_blocked"]}
+    assert len(store) == 2
+    assert store.effective_masks(now=30) == {("a", "b"): FLAG_BITS["event_blocked"] | FLAG_BITS["vip_blocked"],
+                                             ("b", "c"): FLAG_BITS["vip_blocked"]}
+    assert store.next_change() == 50
+    assert store.advance(60) == (0, 1)
+    assert store.blocked_edges(now=60) == {("a", "b"), ("b", "c")}
+    assert store.advance(100) == (0, 1)
+    assert not store.effective_masks(now=100) and not len(store)
+
+
+def test_readding_an_incident_replaces_it():
+    store = IncidentStore()
+    store.add("twitter", "x", ["event_blocked"], [("a", "b")], start=0, end=10)
+    store.add("twitter", "x", ["event_blocked"], [("b", "c")], start=0, end=30)
+    # the superseded heap item at t=10 is skipped, not expired
+    assert store.advance(20) == (0, 0)
+    assert store.blocked_edges(now=20) == {("b", "c")}
@@ -0,0 +1,28 @@
+from incident_store import IncidentStore
+from routing_logic import a_star
+from tomtom_incidents_ingest import incident_type_from_icon_category
+
+
+def test_only_closures_block_edges():
+    store = IncidentStore()
+    store.add("tomtom", "jam", ["slowdown"], [("a", "b")], start=0, end=100)
+    store.add("tomtom", "closed", ["event_blocked"], [("b", "c")], start=0, end=100)
+    store.add("tomtom", "both", ["slowdown", "closed_for_construction"], [("c", "d")], start=0, end=100)
+    assert store.blocked_edges(now=10) == {("b", "c"), ("c", "d")}
+    assert store.slowed_edges(now=10) == {("a", "b")}
+
+
+def test_jams_and_weather_do_not_close_roads():
+    assert incident_type_from_icon_category(6, "Stationary traffic") == "slowdown"
+    assert incident_type_from_icon_category(2, "Fog") == "slowdown"
+    assert incident_type_from_icon_category(8, "Closed") == "event_blocked"
+    assert incident_type_from_icon_category(9, "Roadworks") == "closed_for_construction"
+
+
+def test_penalised_edge_is_avoided_but_still_usable():
+    # 1 -> 2 -> 4 is shorter than 1 -> 3 -> 4
+    graph = {1: [(2, 1.0, 0), (3, 1.5, 1)], 2: [(4, 1.0, 2)], 3: [(4, 1.5, 3)], 4: []}
+    assert a_star(graph, 1, 4)[0] == [1, 2, 4]
+    assert a_star(graph, 1, 4, penalty={0: 3.0})[0] == [1, 3, 4]
+    path, cost = a_star(graph, 1, 4, blocked={1, 3}, penalty={0: 3.0})
+    assert path == [1, 2, 4] and cost == 4.0
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from segment_index import SegmentIndex
+
+
+def _index():
+    # two parallel east-west roads, stored west -> east: a two-way one and a one-way one
+    rows = [("12.9700_77.5900", "12.9700_77.5920", False),
+            ("12.9800_77.5900", "12.9800_77.5920", True)]
+    return SegmentIndex(pd.DataFrame(rows, columns=["from_node", "to_node", "one_way"]))
+
+
+def test_two_way_road_matches_both_directions():
+    index = _index()
+    east = [(12.9701, 77.5905), (12.9701, 77.5915)]
+    assert list(index.match_polyline(east)) == [0]
+    assert list(index.match_polyline(east[::-1])) == [0]
+
+
+def test_one_way_road_rejects_opposite_direction():
+    index = _index()
+    east = [(12.9801, 77.5905), (12.9801, 77.5915)]
+    assert list(index.match_polyline(east)) == [1]
+    assert not len(index.match_polyline(east[::-1]))
+    assert list(index.match_polyline(east[::-1], directional=False)) == [1]
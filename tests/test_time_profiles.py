@@ -0,0 +1,28 @@
+import os
+
+import pandas as pd
+
+from time_profiles import build_profiles, ensure_profiles
+
+
+def _segments(congestion):
+    return pd.DataFrame({"road_type": ["primary", "residential", "footway"],
+                         "historical_congestion": congestion,
+                         "length_m": [100.0, 50.0, 20.0], "speed_limit_kph": [60, 30, 10]})
+
+
+def test_profiles_are_written_once_per_version(tmp_path):
+    path = str(tmp_path / "weight_profiles")
+    arrays = build_profiles(_segments([0.5, 0.2, 0.0]), [3.0, 2.0, 1.0])
+    first, written = ensure_profiles(arrays, path)
+    assert written and os.path.islink(path)
+    mtime = os.path.getmtime(os.path.join(path, "manifest.json"))
+
+    again, written = ensure_profiles(build_profiles(_segments([0.5, 0.2, 0.0]), [3.0, 2.0, 1.0]), path)
+    assert not written
+    assert again.manifest["version"] == first.manifest["version"]
+    assert os.path.getmtime(os.path.join(path, "manifest.json")) == mtime
+
+    changed, written = ensure_profiles(build_profiles(_segments([0.9, 0.2, 0.0]), [3.0, 2.0, 1.0]), path)
+    assert written and changed.manifest["version"] != first.manifest["version"]
+    assert float(changed.amp[0]) > float(first.amp[0])  # the old mapping is untouched
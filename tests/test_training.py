@@ -0,0 +1,22 @@
+import numpy as np
+
+import generate_sample
+import training
+
+
+def test_warm_start_reports_r2_on_appended_rows_not_oob(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(training, "N_ESTIMATORS", 10)
+    monkeypatch.setattr(training, "WARM_START_TREES", 5)
+    generate_sample.generate_sample_data(1000, "data/sample.csv", seed=1)
+    cold = training.train("data/sample.csv", n_jobs=2)
+    assert cold["models"]["weight"]["oob_r2"] is not None
+
+    generate_sample.generate_chunk(np.random.default_rng(7), 300).to_csv(
+        "data/sample.csv", mode="a", header=False, index=False)
+    warm = training.train("data/sample.csv", warm_start=True, n_jobs=2)
+    assert warm["warm_start"]
+    for entry in warm["models"].values():
+        assert entry["n_estimators"] == 15
+        assert entry["oob_r2"] is None
+        assert 0.0 < entry["appended_r2"] <= 1.0
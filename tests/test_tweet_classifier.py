@@ -0,0 +1,37 @@
+import pandas as pd
+
+from tweet_classifier import Gazetteer, TweetClassifier
+
+
+def _segments():
+    # Hosur Road runs south from 12.95 to 12.90; Kasturba Road is a short road elsewhere
+    rows = [("12.95_77.62", "12.93_77.62", "Hosur Road"),
+            ("12.93_77.62", "12.917_77.623", "Hosur Road"),
+            ("12.917_77.623", "12.90_77.63", "Hosur Road"),
+            ("12.974_77.596", "12.975_77.597", "Kasturba Road")]
+    return pd.DataFrame(rows, columns=["from_node", "to_node", "road_name"])
+
+
+def test_road_name_alone_uses_gazetteer():
+    classifier = TweetClassifier(Gazetteer.from_segments(_segments()))
+    r = classifier.classify("Road closure near Kasturba Road due to repair")
+    assert r["place"] == "Kasturba Road"
+    assert r["lat"] is not None
+
+
+def test_precise_hint_wins_over_road_and_is_snapped_onto_it():
+    classifier = TweetClassifier(Gazetteer.from_segments(_segments()))
+    r = classifier.classify("Diversion at Silk Board Junction on Hosur Road for metro work")
+    assert r["place"] is None
+    assert r["road"] == "Hosur Road"
+    assert r["location_hint"] == "Silk Board Junction"
+    # the geocoded junction lands on the nearest Hosur Road node, not the road's centroid
+    assert classifier.snap(r, (12.9177, 77.6238)) == (12.917, 77.623)
+    assert classifier.snap(r, None) == classifier.gazetteer.places["Hosur Road"]
+
+
+def test_unknown_road_keeps_heuristic_hint():
+    classifier = TweetClassifier(Gazetteer.from_segments(_segments()))
+    r = classifier.classify("VIP movement near Hudson Circle")
+    assert r["road"] is None and r["location_hint"] == "Hudson Circle"
+    assert classifier.snap(r, (12.9667, 77.587)) == (12.9667, 77.587)
@@ -0,0 +1,81 @@
+import pandas as pd
+
+from twitter_incidents_ingest import advance_watermark, carry_over_flags
+
+
+def _result(ids, complete=True):
+    tweets = [{"id": str(i), "text": ""} for i in ids]
+    return {"username": "acct", "user_id": "1", "tweets": tweets,
+            "newest_id": str(max(ids)) if ids else None, "complete": complete}
+
+
+def test_watermark_moves_to_newest_tweet():
+    marks = {"acct": {"since_id": "100"}}
+    advance_watermark(marks, _result([101, 105, 103]))
+    assert marks["acct"]["since_id"] == "105"
+
+
+def test_watermark_held_below_failed_geocode():
+    marks = {"acct": {"since_id": "100"}}
+    advance_watermark(marks, _result([101, 103, 105]), hold_below=103)
+    assert marks["acct"]["since_id"] == "101"
+
+
+def test_watermark_kept_when_oldest_tweet_failed():
+    marks = {"acct": {"since_id": "100"}}
+    advance_watermark(marks, _result([101, 103]), hold_below=101)
+    assert marks["acct"]["since_id"] == "100"
+
+
+def test_previous_flags_carried_onto_base_table(tmp_path):
+    prev = pd.DataFrame({"from_node": [1, 2], "to_node": [2, 3], "event_blocked": [True, False],
+                         "vip_blocked": [False, False], "closed_for_construction": [False, True]})
+    path = tmp_path / "enriched.csv"
+    prev.to_csv(path, index=False)
+    base = pd.DataFrame({"from_node": [2, 1, 3], "to_node": [3, 2, 4]})
+    for col in ("event_blocked", "vip_blocked", "closed_for_construction"):
+        base[col] = False
+    assert carry_over_flags(base, str(path)) == 2
+    assert base["event_blocked"].tolist() == [False, True, False]
+    assert base["closed_for_construction"].tolist() == [True, False, False]
+
+
+class _FlakyGeocoder:
+    """Geocodes every hint except those in `down`, which fail with a network error."""
+
+    def __init__(self, down):
+        self.down = set(down)
+
+    async def geocode(self, hint, city):
+        return None if hint in self.down else (12.97, 77.59)
+
+    def lookup_failed(self, hint, city):
+        return hint in self.down
+
+
+def test_daemon_holds_watermark_below_failed_geocode(monkeypatch):
+    import asyncio
+    import twitter_incidents_ingest as tw
+    from incident_daemon import TwitterSource
+
+    tweets = [{"id": "101", "text": "VIP movement near Hudson Circle"},
+              {"id": "103", "text": "VIP movement near Cubbon Park"},
+              {"id": "105", "text": "VIP movement near Hudson Circle"}]
+    marks = {"acct": {"user_id": "1", "since_id": "100"}}
+    monkeypatch.setattr(tw, "load_watermarks", lambda: {u: dict(m) for u, m in marks.items()})
+    monkeypatch.setattr(tw, "save_watermarks", lambda m: marks.update(m))
+    monkeypatch.setattr(tw, "fetch_account", lambda username, watermarks: {
+        "username": username, "user_id": "1", "tweets": tweets, "newest_id": "105", "complete": True})
+
+    source = TwitterSource("acct")
+    source.geocoder = _FlakyGeocoder(down={"Cubbon Park"})
+    incidents = asyncio.run(source.poll())
+    assert [i["id"] for i in incidents] == ["101", "105"]
+    source.commit()
+    assert marks["acct"]["since_id"] == "101"
+
+    # once the geocoder is back, the held tweet is fetched again and the watermark moves on
+    source.geocoder = _FlakyGeocoder(down=())
+    asyncio.run(source.poll())
+    source.commit()
+    assert marks["acct"]["since_id"] == "105"